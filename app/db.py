@@ -1,14 +1,13 @@
 # app/db.py
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker, declarative_base
-import os
-from dotenv import load_dotenv
+from sqlalchemy.orm import Session, sessionmaker, declarative_base
+from app.utils.clients import get_engine
 
-load_dotenv()
+_session_factory = sessionmaker(autocommit=False, autoflush=False)
 
-DATABASE_URL = os.getenv("DATABASE_URL")
 
-engine = create_engine(DATABASE_URL, pool_pre_ping=True)
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+def SessionLocal() -> Session:
+    """New session bound to the shared engine (created on first use)."""
+    return _session_factory(bind=get_engine())
+
 
 Base = declarative_base()
@@ -1,5 +1,6 @@
 # app/main.py
-from fastapi import FastAPI, Request
+from fastapi import Depends, FastAPI, Request
+from fastapi.concurrency import run_in_threadpool
 from fastapi.responses import HTMLResponse, FileResponse, StreamingResponse, JSONResponse
 from fastapi.staticfiles import StaticFiles
 from fastapi.middleware.cors import CORSMiddleware
@@ -10,6 +11,13 @@ from jinja2 import Environment, FileSystemLoader, select_autoescape
 from pathlib import Path
 from app.db import SessionLocal
 from app import repo
+from app.utils.page_cache import PageCache
+from app.utils.assets import ASSETS_DIR, ASSETS_URL_PREFIX, ImmutableStaticFiles, asset_url
+from app.utils import clients
+from app.utils.rate_limit import RateLimit, acquire_sse_slot, release_sse_slot, renew_sse_slot
+from app.utils.queue_estimate import estimate_wait
+from contextlib import asynccontextmanager
+from functools import lru_cache
 import asyncio
 import json
 import os
@@ -26,12 +34,24 @@ from app.routes import (
     update_email,
     admin_auth,
     admin,
+    batch,
 )
 
 # ────────────────────────────────
 # Initialize FastAPI
 # ────────────────────────────────
-app = FastAPI(title="MailSized API")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Redis / S3 / DB / Stripe clients are created lazily on first use
+    # (see app/utils/clients.py); release whatever was opened on shutdown.
+    stripe_consumer = asyncio.create_task(stripe_webhook.consume_stripe_events())
+    yield
+    stripe_consumer.cancel()
+    await clients.close_async_clients()
+    clients.close_all()
+
+
+app = FastAPI(title="MailSized API", lifespan=lifespan)
 
 # --- add this block ---
 @app.api_route("/healthz", methods=["GET", "HEAD"], include_in_schema=False)
@@ -48,6 +68,8 @@ env = Environment(
     loader=FileSystemLoader(str(TEMPLATES_DIR)),
     autoescape=select_autoescape(["html", "xml"])
 )
+env.globals["asset_url"] = asset_url
+page_cache = PageCache(env)
 
 # ────────────────────────────────
 # Middleware
@@ -82,6 +104,9 @@ app.mount("/static", StaticFiles(directory=STATIC_DIR), name="static")
 # Mount admin portal static assets (CSS/JS)
 app.mount("/admin_portal", StaticFiles(directory=ADMIN_PORTAL_DIR), name="admin_portal")
 
+# Fingerprinted build output from build_assets.py (cached forever)
+app.mount(ASSETS_URL_PREFIX, ImmutableStaticFiles(directory=ASSETS_DIR, check_dir=False), name="assets")
+
 # ────────────────────────────────
 # Register Routers
 # ────────────────────────────────
@@ -93,20 +118,20 @@ app.include_router(devtest.router)
 app.include_router(download.router)
 app.include_router(admin_auth.router)
 app.include_router(admin.router)
+app.include_router(batch.router)
 
 # ────────────────────────────────
 # Template Renderer
 # ────────────────────────────────
 def render(template_name: str, request: Request, **context):
-    template = env.get_template(template_name)
-    return HTMLResponse(template.render(**context))
+    # Marketing pages are static per configuration → render once, serve
+    # precompressed bytes (or 304) afterwards.
+    return page_cache.response(request, template_name, **context)
 
-# ────────────────────────────────
-# Basic Routes (HTML Pages)
-# ────────────────────────────────
-@app.get("/", response_class=HTMLResponse)
-def home(request: Request):
-    # Pull AdSense + Analytics info from env
+
+@lru_cache(maxsize=1)
+def home_context() -> dict:
+    """AdSense + Analytics info from env (fixed for the life of the process)."""
     enable_adsense = os.getenv("ENABLE_ADSENSE", "0") == "1"
     adsense_client_id = os.getenv("ADSENSE_CLIENT_ID", "")
     adsense_sidebar_slot = os.getenv("ADSENSE_SIDEBAR_SLOT", "")
@@ -118,15 +143,21 @@ def home(request: Request):
         <script async src="https://pagead2.googlesyndication.com/pagead/js/adsbygoogle.js?client=ca-{adsense_client_id}" crossorigin="anonymous"></script>
         '''
 
-    template = env.get_template("index.html")
-    return HTMLResponse(template.render(
-        adsense_tag=adsense_tag,
-        adsense_client_id=f"ca-{adsense_client_id}",
-        adsense_sidebar_slot=adsense_sidebar_slot,
-        ga_measurement_id=ga_id,
-        paid=False,
-        job_id="",
-    ))
+    return {
+        "adsense_tag": adsense_tag,
+        "adsense_client_id": f"ca-{adsense_client_id}",
+        "adsense_sidebar_slot": adsense_sidebar_slot,
+        "ga_measurement_id": ga_id,
+        "paid": False,
+        "job_id": "",
+    }
+
+# ────────────────────────────────
+# Basic Routes (HTML Pages)
+# ────────────────────────────────
+@app.get("/", response_class=HTMLResponse)
+def home(request: Request):
+    return render("index.html", request, **home_context())
 
 @app.get("/how-it-works", response_class=HTMLResponse)
 def how_it_works(request: Request):
@@ -155,41 +186,77 @@ def contact(request: Request):
 # ────────────────────────────────
 # SSE Route: /events/{job_id}
 # ────────────────────────────────
-@app.get("/events/{job_id}")
+def _job_outputs(job_id: str) -> dict:
+    db = SessionLocal()
+    try:
+        return repo.get_job_outputs(db, job_id)
+    finally:
+        db.close()
+
+
+@app.get(
+    "/events/{job_id}",
+    dependencies=[
+        Depends(RateLimit("events", 30, 10)),
+        Depends(RateLimit("events", 10, 5, per="job_id")),
+    ],
+)
 async def stream_job_progress(request: Request, job_id: str):
     """
     Server-Sent Events endpoint that streams live job progress to the frontend.
     Keeps a fresh DB session each tick to avoid stale cache.
     """
+    sse_slot = await run_in_threadpool(acquire_sse_slot, request)
+
     async def event_generator():
-        while True:
-            if await request.is_disconnected():
-                break
-
-            db = SessionLocal()
-            try:
-                job = repo.get_job_by_upload_id(db, job_id)
-            finally:
-                db.close()
-
-            if not job:
-                yield "data: " + json.dumps({"status": "error", "message": "Job not found"}) + "\n\n"
-                break
-
-            payload = {
-                "status": job.status,
-                "progress": job.progress,
-                "message": "Processing…" if job.status == "queued" else job.status.capitalize(),
-            }
-
-            if job.output_url:
-                payload["download_url"] = job.output_url
-                payload["message"] = "Compression complete ✅"
-                yield "data: " + json.dumps(payload) + "\n\n"
-                break
+        try:
+            while True:
+                if await request.is_disconnected():
+                    break
+                if sse_slot is not None and sse_slot.renew_due():
+                    await run_in_threadpool(renew_sse_slot, sse_slot)
+
+                db = SessionLocal()
+                try:
+                    job = repo.get_job_by_upload_id(db, job_id)
+                finally:
+                    db.close()
+
+                if not job:
+                    yield "data: " + json.dumps({"status": "error", "message": "Job not found"}) + "\n\n"
+                    break
 
-            yield "data: " + json.dumps(payload) + "\n\n"
-            await asyncio.sleep(2)
+                payload = {
+                    "status": job.status,
+                    "progress": job.progress,
+                    "message": "Processing…" if job.status == "queued" else job.status.capitalize(),
+                }
+                if job.status == "queued" and job.enqueued_at:
+                    estimate = await run_in_threadpool(estimate_wait, job_id, job.duration_sec)
+                    if estimate:
+                        payload["estimate"] = estimate
+                        minutes = round(estimate["start_in_sec"] / 60)
+                        if minutes >= 1:
+                            payload["message"] = f"In queue — starting in about {minutes} min"
+                if job.status == "processing" and job.progress_detail:
+                    detail = json.loads(job.progress_detail)
+                    payload.update({
+                        key: detail.get(key)
+                        for key in ("speed", "eta_sec", "size_bytes", "target_bytes", "projected_bytes")
+                    })
+
+                if job.output_url:
+                    payload["download_url"] = job.output_url
+                    if job.extra_providers:
+                        payload["outputs"] = await run_in_threadpool(_job_outputs, job_id)
+                    payload["message"] = "Compression complete ✅"
+                    yield "data: " + json.dumps(payload) + "\n\n"
+                    break
+
+                yield "data: " + json.dumps(payload) + "\n\n"
+                await asyncio.sleep(2)
+        finally:
+            await run_in_threadpool(release_sse_slot, sse_slot)
 
     return StreamingResponse(event_generator(), media_type="text/event-stream")
 
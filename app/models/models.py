@@ -1,6 +1,6 @@
 # app/models/models.py
 
-from sqlalchemy import Column, String, Integer, Boolean, DateTime, Float, Text, ForeignKey
+from sqlalchemy import Column, String, Integer, Boolean, DateTime, Float, Text, ForeignKey, Index, text
 from sqlalchemy.sql import func
 from ..db import Base
 import uuid
@@ -32,6 +32,190 @@ class Job(Base):
     output_url = Column(Text, nullable=True)
     token_used = Column(Text, ForeignKey("tokens.code"), nullable=True)
 
+    # Set exactly once, by the request that pushes the job onto the Redis queue
+    enqueued_at = Column(DateTime(timezone=False), nullable=True)
+    batch_id = Column(String, ForeignKey("batches.id"), nullable=True)
+    # Latest structured encode progress from the worker (JSON: speed, eta_sec, sizes…)
+    progress_detail = Column(Text, nullable=True)
+    # S3 housekeeping (run_s3_sweeper.py)
+    output_size_bytes = Column(Integer, nullable=True)
+    input_deleted_at = Column(DateTime(timezone=False), nullable=True)
+    # Comma-separated providers also encoded in the same run (see JobOutput)
+    extra_providers = Column(Text, nullable=True)
+    # Latest Stripe Checkout Session; only its expiry gives back the code in token_used
+    checkout_session_id = Column(String, nullable=True)
+    # S3 UploadId of the multipart upload started for this job; the part and
+    # complete endpoints only accept this one
+    s3_upload_id = Column(String, nullable=True)
+
+    __table_args__ = (
+        # Keyset pagination for /admin/jobs walks (created_at, id) newest-first;
+        # every filter gets a composite index with the same trailing sort key.
+        Index("ix_jobs_created_at_id", "created_at", "id"),
+        Index("ix_jobs_status_created_at_id", "status", "created_at", "id"),
+        Index("ix_jobs_provider_created_at_id", "provider", "created_at", "id"),
+        Index("ix_jobs_email_created_at_id", "email", "created_at", "id"),
+        Index("ix_jobs_batch_id", "batch_id"),
+        # Small partial index for the rows support actually hunts for.
+        Index(
+            "ix_jobs_active_created_at_id",
+            "status", "created_at", "id",
+            postgresql_where=text("status IN ('queued', 'processing', 'error')"),
+        ),
+    )
+
+
+class Batch(Base):
+    """Many uploads paid for together, queued together and summarised in one email."""
+    __tablename__ = "batches"
+
+    id = Column(String, primary_key=True, default=lambda: str(uuid.uuid4()))
+    email = Column(String, nullable=False)
+    provider = Column(String, nullable=False, default="pending")
+    priority = Column(Boolean, nullable=False, default=False)
+    file_count = Column(Integer, nullable=False)
+    price_cents = Column(Integer, nullable=False, default=0)
+    status = Column(String, nullable=False, default="pending")  # pending | queued | done
+    token_used = Column(Text, ForeignKey("tokens.code"), nullable=True)
+    checkout_session_id = Column(String, nullable=True)
+
+    created_at = Column(DateTime(timezone=False), server_default=func.now(), nullable=False)
+    completed_at = Column(DateTime(timezone=False), nullable=True)
+    summary_sent_at = Column(DateTime(timezone=False), nullable=True)
+
+
+class JobStage(Base):
+    """
+    One row per stage transition of a job (uploaded, paid, enqueued, dequeued,
+    download_done, encode_done, upload_done, notified) for latency analysis.
+    """
+    __tablename__ = "job_stages"
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    upload_id = Column(String, nullable=False)
+    stage = Column(String(16), nullable=False)
+    at = Column(DateTime(timezone=False), nullable=False)
+
+    __table_args__ = (
+        Index("ix_job_stages_upload_id", "upload_id"),
+        Index("ix_job_stages_at", "at"),
+    )
+
+
+class JobOutput(Base):
+    """An extra provider target encoded in the same run as the job's main output."""
+    __tablename__ = "job_outputs"
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    upload_id = Column(String, nullable=False)
+    provider = Column(String, nullable=False)
+    output_path = Column(Text, nullable=False)
+    output_url = Column(Text, nullable=True)
+    size_bytes = Column(Integer, nullable=True)
+    created_at = Column(DateTime(timezone=False), server_default=func.now(), nullable=False)
+
+    __table_args__ = (
+        Index("ix_job_outputs_upload_id", "upload_id"),
+        Index("ix_job_outputs_created_at", "created_at"),
+    )
+
+
+class EncodeOutcome(Base):
+    """
+    Predicted vs actual output size of one encoded target, with the content
+    features the worker's bitrate calibration groups by.
+    """
+    __tablename__ = "encode_outcomes"
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    upload_id = Column(String, nullable=False)
+    provider = Column(String, nullable=False)
+    encoder = Column(String, nullable=True)
+    target_bytes = Column(Integer, nullable=False)
+    predicted_bytes = Column(Integer, nullable=False)
+    actual_bytes = Column(Integer, nullable=False)
+    safety_factor = Column(Float, nullable=False)
+    video_kbps = Column(Integer, nullable=False)
+    duration_sec = Column(Float, nullable=False)
+    output_duration_sec = Column(Float, nullable=True)
+    truncated = Column(Boolean, nullable=False, default=False)
+    source_width = Column(Integer, nullable=True)
+    source_height = Column(Integer, nullable=True)
+    source_fps = Column(Float, nullable=True)
+    source_kbps = Column(Integer, nullable=True)
+    output_width = Column(Integer, nullable=True)
+    output_height = Column(Integer, nullable=True)
+    output_fps = Column(Float, nullable=True)
+    created_at = Column(DateTime(timezone=False), server_default=func.now(), nullable=False)
+
+    __table_args__ = (
+        Index("ix_encode_outcomes_created_at", "created_at"),
+    )
+
+
+class JobArchive(Base):
+    """Finished and abandoned jobs moved out of `jobs` by the archiver."""
+    __tablename__ = "jobs_archive"
+
+    id = Column(String, primary_key=True)
+    upload_id = Column(String, nullable=False)
+    email = Column(String, nullable=False)
+    provider = Column(String, nullable=False)
+
+    priority = Column(Boolean, nullable=False, default=False)
+    transcript = Column(Boolean, nullable=False, default=False)
+    size_bytes = Column(Integer, nullable=False)
+    duration_sec = Column(Float, nullable=False)
+    price_cents = Column(Integer, nullable=False, default=0)
+    status = Column(String, nullable=False)
+    progress = Column(Float, nullable=False, default=0.0)
+    error = Column(Text, nullable=True)
+    input_path = Column(Text, nullable=False)
+    output_path = Column(Text, nullable=True)
+
+    created_at = Column(DateTime(timezone=False), nullable=False)
+    updated_at = Column(DateTime(timezone=False), nullable=False)
+    completed_at = Column(DateTime(timezone=True), nullable=True)
+
+    filename = Column(Text, nullable=True)
+    output_url = Column(Text, nullable=True)
+    token_used = Column(Text, nullable=True)
+    enqueued_at = Column(DateTime(timezone=False), nullable=True)
+    batch_id = Column(String, nullable=True)
+    progress_detail = Column(Text, nullable=True)
+    output_size_bytes = Column(Integer, nullable=True)
+    input_deleted_at = Column(DateTime(timezone=False), nullable=True)
+    extra_providers = Column(Text, nullable=True)
+    checkout_session_id = Column(String, nullable=True)
+    s3_upload_id = Column(String, nullable=True)
+
+    archived_at = Column(DateTime(timezone=False), server_default=func.now(), nullable=False)
+
+    __table_args__ = (
+        Index("ix_jobs_archive_created_at_id", "created_at", "id"),
+        Index("ix_jobs_archive_upload_id", "upload_id"),
+    )
+
+
+class StripeEvent(Base):
+    """Ledger of received Stripe webhook events, keyed by Stripe's event ID."""
+    __tablename__ = "stripe_events"
+
+    id = Column(String, primary_key=True)
+    type = Column(String, nullable=False)
+    payload = Column(Text, nullable=False)
+    status = Column(String, nullable=False, default="received")  # received | processing | processed | failed
+    attempts = Column(Integer, nullable=False, default=0)
+    error = Column(Text, nullable=True)
+
+    received_at = Column(DateTime(timezone=False), server_default=func.now(), nullable=False)
+    claimed_at = Column(DateTime(timezone=False), nullable=True)
+    processed_at = Column(DateTime(timezone=False), nullable=True)
+
+    __table_args__ = (
+        Index("ix_stripe_events_status_received_at", "status", "received_at"),
+    )
+
 
 class Token(Base):
     __tablename__ = "tokens"
@@ -1,7 +1,10 @@
 # app/repo.py
+from sqlalchemy import and_, or_, case, delete, func, insert, select, update
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
-from .models.models import Job, Token
+from .models.models import Batch, Job, JobArchive, JobOutput, JobStage, StripeEvent, Token
 from datetime import datetime
+import base64
 
 
 # ─────────── Jobs ───────────
@@ -37,6 +40,7 @@ def create_job(
         status="queued"
     )
     db.add(job)
+    add_job_stages(db, [upload_id], "uploaded")
     db.commit()
     db.refresh(job)
     return job
@@ -53,6 +57,15 @@ def update_job_email(db: Session, upload_id: str, email: str):
     return job
 
 
+def set_job_s3_upload_id(db: Session, upload_id: str, s3_upload_id: str):
+    """Remember the multipart upload started for this job."""
+    db.execute(
+        update(Job).where(Job.upload_id == upload_id).values(s3_upload_id=s3_upload_id)
+        .execution_options(synchronize_session=False)
+    )
+    db.commit()
+
+
 def update_job_status(db: Session, job_id: str, status: str, output_url: str = None):
     job = db.query(Job).filter(Job.id == job_id).first()
     if not job:
@@ -65,6 +78,16 @@ def update_job_status(db: Session, job_id: str, status: str, output_url: str = N
     return job
 
 
+def get_job_outputs(db: Session, upload_id: str) -> dict[str, str]:
+    """{provider: download URL} for a job's extra targets."""
+    rows = db.execute(
+        select(JobOutput.provider, JobOutput.output_url).where(
+            JobOutput.upload_id == upload_id, JobOutput.output_url.is_not(None)
+        )
+    ).all()
+    return {provider: url for provider, url in rows}
+
+
 def get_job_by_id(db: Session, job_id: str):
     return db.query(Job).filter(Job.id == job_id).first()
 
@@ -73,6 +96,476 @@ def get_job_by_upload_id(db: Session, upload_id: str):
     return db.query(Job).filter(Job.upload_id == upload_id).first()
 
 
+def mark_job_enqueued(db: Session, upload_id: str, price_cents: int | None = None) -> Job | None:
+    """
+    Atomically flag a job as queued for the worker. Returns the job only for
+    the single caller that won the transition; duplicate payment events or
+    retries get None and must not push to Redis again.
+    """
+    values = {"status": "queued", "enqueued_at": datetime.utcnow()}
+    if price_cents is not None:
+        values["price_cents"] = price_cents
+
+    result = db.execute(
+        update(Job)
+        .where(Job.upload_id == upload_id, Job.enqueued_at.is_(None))
+        .values(**values)
+        .execution_options(synchronize_session=False)
+    )
+    if result.rowcount != 1:
+        db.commit()
+        return None
+    add_job_stages(db, [upload_id], "paid")
+    db.commit()
+    return get_job_by_upload_id(db, upload_id)
+
+
+def clear_job_enqueued(db: Session, upload_ids: list[str]):
+    """
+    Undo mark_job_enqueued()/mark_batch_enqueued() when the Redis push failed,
+    so the next attempt (ledger retry, client retry) can win the transition again.
+    """
+    if not upload_ids:
+        return
+    db.execute(
+        update(Job)
+        .where(Job.upload_id.in_(upload_ids))
+        .values(enqueued_at=None)
+        .execution_options(synchronize_session=False)
+    )
+    db.commit()
+
+
+def encode_job_cursor(job: Job) -> str:
+    """Opaque keyset cursor pointing just after `job` in (created_at, id) order."""
+    raw = f"{job.created_at.isoformat()}|{job.id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+
+def decode_job_cursor(cursor: str) -> tuple[datetime, str]:
+    raw = base64.urlsafe_b64decode(cursor.encode()).decode()
+    created_at, job_id = raw.split("|", 1)
+    return datetime.fromisoformat(created_at), job_id
+
+
+def list_jobs(
+    db: Session,
+    limit: int = 100,
+    cursor: str | None = None,
+    status: str | None = None,
+    provider: str | None = None,
+    email: str | None = None,
+    created_from: datetime | None = None,
+    created_to: datetime | None = None,
+) -> tuple[list[Job], str | None]:
+    """
+    Newest-first page of jobs using keyset pagination on (created_at, id).
+    Returns (jobs, next_cursor); next_cursor is None on the last page.
+    """
+    q = db.query(Job)
+    if status:
+        q = q.filter(Job.status == status)
+    if provider:
+        q = q.filter(Job.provider == provider)
+    if email:
+        q = q.filter(Job.email == email)
+    if created_from:
+        q = q.filter(Job.created_at >= created_from)
+    if created_to:
+        q = q.filter(Job.created_at < created_to)
+    if cursor:
+        after_created_at, after_id = decode_job_cursor(cursor)
+        q = q.filter(
+            or_(
+                Job.created_at < after_created_at,
+                and_(Job.created_at == after_created_at, Job.id < after_id),
+            )
+        )
+
+    rows = q.order_by(Job.created_at.desc(), Job.id.desc()).limit(limit + 1).all()
+    jobs = rows[:limit]
+    next_cursor = encode_job_cursor(jobs[-1]) if len(rows) > limit else None
+    return jobs, next_cursor
+
+
+# ─────────── Batches ───────────
+
+def create_batch(db: Session, email: str, files: list[dict]) -> tuple[Batch, list[Job]]:
+    """
+    Create a batch and one pending job per file in a single transaction.
+    Each `files` item has upload_id, filename, size_bytes and duration_sec.
+    """
+    batch = Batch(email=email, file_count=len(files))
+    db.add(batch)
+    db.flush()
+
+    jobs = [
+        Job(
+            upload_id=f["upload_id"],
+            filename=f["filename"],
+            email=email,
+            provider="pending",
+            size_bytes=f["size_bytes"],
+            duration_sec=f["duration_sec"],
+            price_cents=0,
+            progress=0.0,
+            input_path=f"{f['upload_id']}/{f['filename']}",
+            status="queued",
+            batch_id=batch.id,
+        )
+        for f in files
+    ]
+    db.add_all(jobs)
+    add_job_stages(db, [f["upload_id"] for f in files], "uploaded")
+    db.commit()
+    db.refresh(batch)
+    return batch, jobs
+
+
+def get_batch(db: Session, batch_id: str):
+    return db.query(Batch).filter(Batch.id == batch_id).first()
+
+
+def get_batch_jobs(db: Session, batch_id: str) -> list[Job]:
+    return db.query(Job).filter(Job.batch_id == batch_id).order_by(Job.created_at, Job.id).all()
+
+
+def update_batch_for_payment(
+    db: Session,
+    batch: Batch,
+    email: str,
+    provider: str,
+    priority: bool,
+    price_cents: int,
+):
+    """Apply checkout choices to the batch and all of its jobs with one UPDATE."""
+    batch.email = email
+    batch.provider = provider
+    batch.priority = priority
+    batch.price_cents = price_cents
+
+    # Spread the batch price over its jobs so revenue stats stay per-job
+    per_job, remainder = divmod(price_cents, max(1, batch.file_count))
+    first_id = db.execute(
+        select(Job.id).where(Job.batch_id == batch.id).order_by(Job.created_at, Job.id).limit(1)
+    ).scalar()
+    db.execute(
+        update(Job)
+        .where(Job.batch_id == batch.id)
+        .values(
+            email=email,
+            provider=provider,
+            priority=priority,
+            price_cents=case((Job.id == first_id, per_job + remainder), else_=per_job),
+        )
+        .execution_options(synchronize_session=False)
+    )
+    db.commit()
+
+
+def mark_batch_enqueued(db: Session, batch_id: str) -> list[Job]:
+    """
+    Atomically flag every not-yet-queued job of a batch as queued and return
+    only those, so duplicate payment events never enqueue a job twice.
+    """
+    rows = db.execute(
+        update(Job)
+        .where(Job.batch_id == batch_id, Job.enqueued_at.is_(None))
+        .values(status="queued", enqueued_at=datetime.utcnow())
+        .returning(Job.id, Job.upload_id)
+        .execution_options(synchronize_session=False)
+    ).all()
+    add_job_stages(db, [upload_id for _, upload_id in rows], "paid")
+    db.execute(
+        update(Batch).where(Batch.id == batch_id).values(status="queued")
+        .execution_options(synchronize_session=False)
+    )
+    db.commit()
+    if not rows:
+        return []
+    ids = [job_id for job_id, _ in rows]
+    return db.query(Job).filter(Job.id.in_(ids)).order_by(Job.created_at, Job.id).all()
+
+
+def batch_progress(db: Session, batch_id: str) -> dict:
+    """Aggregate status of a batch, computed in one query."""
+    total, done, failed, progress = db.query(
+        func.count(Job.id),
+        func.count(Job.id).filter(Job.status == "done"),
+        func.count(Job.id).filter(Job.status == "error"),
+        func.coalesce(func.avg(Job.progress), 0.0),
+    ).filter(Job.batch_id == batch_id).one()
+    return {
+        "total": total,
+        "done": done,
+        "failed": failed,
+        "progress": round(float(progress), 1),
+    }
+
+
+# ─────────── Job Timeline ───────────
+
+# Consecutive stages whose gap is reported, plus end-to-end spans
+STAGE_ORDER = (
+    "uploaded", "paid", "enqueued", "dequeued",
+    "download_done", "encode_done", "upload_done", "notified",
+)
+STAGE_SPANS = tuple(zip(STAGE_ORDER, STAGE_ORDER[1:])) + (
+    ("enqueued", "upload_done"),
+    ("paid", "notified"),
+)
+
+
+def add_job_stages(db: Session, upload_ids: list[str], stage: str, at: datetime | None = None):
+    """Stage rows for the caller's transaction (not committed here)."""
+    at = at or datetime.utcnow()
+    db.add_all(JobStage(upload_id=u, stage=stage, at=at) for u in upload_ids)
+
+
+def record_job_stages(db: Session, upload_ids: list[str], stage: str):
+    add_job_stages(db, upload_ids, stage)
+    db.commit()
+
+
+def _percentile(sorted_values: list[float], pct: float) -> float:
+    """Linear-interpolated percentile of an already sorted list."""
+    k = (len(sorted_values) - 1) * pct
+    lo = int(k)
+    hi = min(lo + 1, len(sorted_values) - 1)
+    return sorted_values[lo] + (sorted_values[hi] - sorted_values[lo]) * (k - lo)
+
+
+def stage_latency_percentiles(db: Session, since: datetime) -> dict:
+    """
+    p50/p95/p99 seconds for each stage span, over jobs that reached the
+    span's end stage after `since`. One query pivots stage times per job.
+    """
+    pivot = (
+        select(
+            JobStage.upload_id,
+            *[func.min(JobStage.at).filter(JobStage.stage == s).label(s) for s in STAGE_ORDER],
+        )
+        .where(JobStage.upload_id.in_(select(JobStage.upload_id).where(JobStage.at >= since)))
+        .group_by(JobStage.upload_id)
+    )
+    rows = db.execute(pivot).mappings().all()
+
+    report = {}
+    for start, end in STAGE_SPANS:
+        durations = sorted(
+            (r[end] - r[start]).total_seconds()
+            for r in rows
+            if r[start] is not None and r[end] is not None and r[end] >= since
+        )
+        if not durations:
+            continue
+        report[f"{start}→{end}"] = {
+            "count": len(durations),
+            "p50": round(_percentile(durations, 0.50), 2),
+            "p95": round(_percentile(durations, 0.95), 2),
+            "p99": round(_percentile(durations, 0.99), 2),
+        }
+    return report
+
+
+def prune_job_stages(db: Session, before: datetime) -> int:
+    result = db.execute(delete(JobStage).where(JobStage.at < before))
+    db.commit()
+    return result.rowcount
+
+
+# ─────────── Archive ───────────
+
+FINISHED_STATUSES = ("done", "error")
+
+
+def archive_jobs_batch(
+    db: Session,
+    finished_before: datetime,
+    abandoned_before: datetime,
+    batch_size: int = 1000,
+) -> int:
+    """
+    Move one batch of old jobs into jobs_archive and delete them from jobs.
+
+    Archived rows are finished jobs (done/error) created before `finished_before`
+    and abandoned uploads (never paid for, so never pushed to the Redis queue)
+    created before `abandoned_before`. Paid jobs still waiting in the queue, or
+    put back by a draining worker, have enqueued_at set and are never touched
+    (run_db_setup.py backfilled it for jobs that predate the column).
+    Returns rows moved.
+    """
+    expired = or_(
+        and_(Job.status.in_(FINISHED_STATUSES), Job.created_at < finished_before),
+        and_(
+            Job.status == "queued",
+            Job.progress == 0,
+            Job.enqueued_at.is_(None),
+            Job.created_at < abandoned_before,
+        ),
+    )
+    id_query = select(Job.id).where(expired).order_by(Job.created_at).limit(batch_size)
+    if db.bind.dialect.name == "postgresql":
+        id_query = id_query.with_for_update(skip_locked=True)
+
+    ids = db.execute(id_query).scalars().all()
+    if not ids:
+        return 0
+
+    columns = [c.name for c in Job.__table__.columns]
+    db.execute(
+        insert(JobArchive).from_select(
+            columns,
+            select(*[Job.__table__.c[name] for name in columns]).where(Job.id.in_(ids)),
+        )
+    )
+    db.execute(delete(Job).where(Job.id.in_(ids)))
+    db.commit()
+    return len(ids)
+
+
+# ─────────── S3 Sweeper ───────────
+
+def expired_outputs(db: Session, completed_before: datetime, limit: int = 1000):
+    """Done jobs whose download window has passed but whose output is still stored."""
+    return db.execute(
+        select(Job.id, Job.output_path, Job.output_size_bytes)
+        .where(
+            Job.status == "done",
+            Job.output_path.is_not(None),
+            Job.completed_at < completed_before,
+        )
+        .order_by(Job.completed_at)
+        .limit(limit)
+    ).all()
+
+
+def clear_outputs(db: Session, job_ids: list[str]):
+    db.execute(
+        update(Job).where(Job.id.in_(job_ids)).values(output_path=None, output_url=None)
+    )
+    db.commit()
+
+
+def expired_job_outputs(db: Session, created_before: datetime, limit: int = 1000):
+    return db.execute(
+        select(JobOutput.id, JobOutput.output_path, JobOutput.size_bytes)
+        .where(JobOutput.created_at < created_before)
+        .order_by(JobOutput.created_at)
+        .limit(limit)
+    ).all()
+
+
+def delete_job_outputs(db: Session, output_ids: list[int]):
+    db.execute(delete(JobOutput).where(JobOutput.id.in_(output_ids)))
+    db.commit()
+
+
+def expired_inputs(db: Session, finished_before: datetime, unpaid_before: datetime, limit: int = 1000):
+    """
+    Jobs whose original upload can go: finished before `finished_before`, or
+    never paid for (not enqueued) and created before `unpaid_before`. Jobs
+    that predate enqueued_at were backfilled by run_db_setup.py, so a queued
+    legacy job's upload is never taken for an unpaid one.
+    """
+    return db.execute(
+        select(Job.id, Job.upload_id, Job.size_bytes)
+        .where(
+            Job.input_deleted_at.is_(None),
+            or_(
+                and_(
+                    Job.status.in_(FINISHED_STATUSES),
+                    func.coalesce(Job.completed_at, Job.created_at) < finished_before,
+                ),
+                and_(Job.enqueued_at.is_(None), Job.created_at < unpaid_before),
+            ),
+        )
+        .order_by(Job.created_at)
+        .limit(limit)
+    ).all()
+
+
+def mark_inputs_deleted(db: Session, job_ids: list[str]):
+    db.execute(
+        update(Job).where(Job.id.in_(job_ids)).values(input_deleted_at=datetime.utcnow())
+    )
+    db.commit()
+
+
+# ─────────── Stripe Events ───────────
+
+def record_stripe_event(db: Session, event_id: str, event_type: str, payload: str) -> bool:
+    """Store a webhook event; False if this event ID was already recorded."""
+    db.add(StripeEvent(id=event_id, type=event_type, payload=payload, status="received"))
+    try:
+        db.commit()
+        return True
+    except IntegrityError:
+        db.rollback()
+        return False
+
+
+def claim_stripe_event(db: Session, event_id: str, stale_before: datetime) -> StripeEvent | None:
+    """
+    Take ownership of an event for processing. Unprocessed events, and events
+    whose previous claim is older than `stale_before` (crashed consumer), can
+    be claimed; the conditional UPDATE makes sure only one consumer wins.
+    """
+    result = db.execute(
+        update(StripeEvent)
+        .where(
+            StripeEvent.id == event_id,
+            or_(
+                StripeEvent.status == "received",
+                and_(StripeEvent.status == "processing", StripeEvent.claimed_at < stale_before),
+            ),
+        )
+        .values(
+            status="processing",
+            claimed_at=datetime.utcnow(),
+            attempts=StripeEvent.attempts + 1,
+        )
+        .execution_options(synchronize_session=False)
+    )
+    db.commit()
+    if result.rowcount != 1:
+        return None
+    return db.get(StripeEvent, event_id)
+
+
+def finish_stripe_event(db: Session, event_id: str, error: str | None = None, retry: bool = False):
+    """Record the outcome; `retry` puts a failed event back for the next sweep."""
+    if retry:
+        status = "received"
+    else:
+        status = "failed" if error else "processed"
+    db.execute(
+        update(StripeEvent)
+        .where(StripeEvent.id == event_id)
+        .values(
+            status=status,
+            error=error,
+            processed_at=datetime.utcnow(),
+        )
+        .execution_options(synchronize_session=False)
+    )
+    db.commit()
+
+
+def pending_stripe_event_ids(db: Session, stale_before: datetime, limit: int = 100) -> list[str]:
+    return db.execute(
+        select(StripeEvent.id)
+        .where(
+            or_(
+                StripeEvent.status == "received",
+                and_(StripeEvent.status == "processing", StripeEvent.claimed_at < stale_before),
+            )
+        )
+        .order_by(StripeEvent.received_at)
+        .limit(limit)
+    ).scalars().all()
+
+
 # ─────────── Tokens ───────────
 
 def get_token(db: Session, code: str):
@@ -80,14 +573,32 @@ def get_token(db: Session, code: str):
 
 
 def use_token(db: Session, code: str):
-    token = db.query(Token).filter(Token.code == code).first()
-    if not token:
-        return None
-    if token.usage_count >= token.usage_limit:
-        return None
-    token.usage_count += 1
+    """
+    Consume one use of a token in a single conditional UPDATE, so concurrent
+    redemptions can never push usage_count past usage_limit. Returns the row
+    after the increment (code, discount_percent, usage_limit, usage_count),
+    or None when the code is unknown or exhausted.
+    """
+    row = db.execute(
+        update(Token)
+        .where(Token.code == code, Token.usage_count < Token.usage_limit)
+        .values(usage_count=Token.usage_count + 1)
+        .returning(Token.code, Token.discount_percent, Token.usage_limit, Token.usage_count)
+        .execution_options(synchronize_session=False)
+    ).first()
+    db.commit()
+    return row
+
+
+def release_token(db: Session, code: str):
+    """Give back a use taken by use_token() whose redemption did not go through."""
+    db.execute(
+        update(Token)
+        .where(Token.code == code, Token.usage_count > 0)
+        .values(usage_count=Token.usage_count - 1)
+        .execution_options(synchronize_session=False)
+    )
     db.commit()
-    return token
 
 
 def create_token(db: Session, code: str, discount_percent: int = 100, usage_limit: int = 1):
@@ -96,3 +607,67 @@ def create_token(db: Session, code: str, discount_percent: int = 100, usage_limi
     db.commit()
     db.refresh(token)
     return token
+
+
+# A job or batch going through checkout holds its reserved promo code in
+# token_used and its latest session in checkout_session_id, so a customer who
+# comes back to checkout reuses that reservation instead of taking another use.
+
+def _holder(model, key: str):
+    return Job.upload_id == key if model is Job else Batch.id == key
+
+
+def _unpaid(model):
+    if model is Job:
+        return Job.enqueued_at.is_(None)
+    return ~select(Job.id).where(Job.batch_id == Batch.id, Job.enqueued_at.is_not(None)).exists()
+
+
+def held_token(db: Session, model, key: str) -> str | None:
+    return db.execute(select(model.token_used).where(_holder(model, key))).scalar()
+
+
+def hold_token(db: Session, model, key: str, code: str) -> bool:
+    """Record `code` as held by the job/batch; False when it already holds a code."""
+    result = db.execute(
+        update(model)
+        .where(_holder(model, key), model.token_used.is_(None))
+        .values(token_used=code)
+        .execution_options(synchronize_session=False)
+    )
+    db.commit()
+    return result.rowcount == 1
+
+
+def drop_token_hold(db: Session, model, key: str, code: str, session_id: str | None = None) -> bool:
+    """
+    Clear the hold on `code`. True only for the call that cleared it, which
+    then gives the use back. With `session_id`, only while that is still the
+    latest checkout session and nothing has been paid.
+    """
+    conditions = [_holder(model, key), model.token_used == code]
+    if session_id is not None:
+        conditions += [model.checkout_session_id == session_id, _unpaid(model)]
+    result = db.execute(
+        update(model).where(*conditions).values(token_used=None)
+        .execution_options(synchronize_session=False)
+    )
+    db.commit()
+    return result.rowcount == 1
+
+
+def set_token_used(db: Session, model, key: str, code: str | None):
+    """Record the promo code a job/batch was paid with."""
+    db.execute(
+        update(model).where(_holder(model, key)).values(token_used=code)
+        .execution_options(synchronize_session=False)
+    )
+    db.commit()
+
+
+def set_checkout_session(db: Session, model, key: str, session_id: str):
+    db.execute(
+        update(model).where(_holder(model, key)).values(checkout_session_id=session_id)
+        .execution_options(synchronize_session=False)
+    )
+    db.commit()
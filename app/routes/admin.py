@@ -1,13 +1,16 @@
 # app/routes/admin.py
-from fastapi import APIRouter, Request, Depends, Form
+from fastapi import APIRouter, Request, Depends, Form, HTTPException, Query
 from fastapi.responses import HTMLResponse, JSONResponse, RedirectResponse
 from fastapi.templating import Jinja2Templates
+from sqlalchemy import func
 from sqlalchemy.orm import Session
 from app.db import SessionLocal
 from app import repo
+from app.utils.clients import pool_stats
+from app.utils.queue_estimate import current_schedule
 from dotenv import load_dotenv
 import os
-from datetime import datetime
+from datetime import date, datetime, timedelta
 
 load_dotenv()
 
@@ -39,18 +42,28 @@ def admin_dashboard(request: Request):
 # ────────────────────────────────
 @router.get("/admin/summary")
 def get_summary(db: Session = Depends(get_db)):
-    jobs = db.query(repo.Job).all()
-    tokens = db.query(repo.Token).all()
+    # Aggregate in SQL over live + archived jobs so archiving doesn't shrink the totals
+    total_jobs = completed_jobs = revenue_cents = 0
+    for model in (repo.Job, repo.JobArchive):
+        count, done, revenue = db.query(
+            func.count(model.id),
+            func.count(model.id).filter(model.status == "done"),
+            func.coalesce(func.sum(model.price_cents).filter(model.status == "done"), 0),
+        ).one()
+        total_jobs += count
+        completed_jobs += done
+        revenue_cents += revenue
 
-    total_jobs = len(jobs)
-    completed_jobs = sum(1 for j in jobs if j.status == "done")
-    total_revenue = sum(j.price_cents for j in jobs if j.status == "done") / 100
-    active_tokens = sum(1 for t in tokens if t.usage_count < t.usage_limit)
+    active_tokens = (
+        db.query(func.count(repo.Token.code))
+        .filter(repo.Token.usage_count < repo.Token.usage_limit)
+        .scalar()
+    )
 
     return {
         "total_jobs": total_jobs,
         "completed_jobs": completed_jobs,
-        "total_revenue": round(total_revenue, 2),
+        "total_revenue": round(revenue_cents / 100, 2),
         "active_tokens": active_tokens,
     }
 
@@ -59,22 +72,54 @@ def get_summary(db: Session = Depends(get_db)):
 # Jobs List
 # ────────────────────────────────
 @router.get("/admin/jobs")
-def get_jobs(db: Session = Depends(get_db)):
-    jobs = db.query(repo.Job).order_by(repo.Job.created_at.desc()).limit(100).all()
-    return [
-        {
-            "id": j.id,
-            "filename": j.filename,
-            "email": j.email,
-            "status": j.status,
-            "provider": j.provider,
-            "price": j.price_cents / 100,
-            "created_at": j.created_at.strftime("%Y-%m-%d %H:%M:%S"),
-            "completed_at": j.completed_at.strftime("%Y-%m-%d %H:%M:%S") if j.completed_at else None,
-            "token_used": j.token_used,
-        }
-        for j in jobs
-    ]
+def get_jobs(
+    limit: int = Query(100, ge=1, le=500),
+    cursor: str | None = None,
+    status: str | None = None,
+    provider: str | None = None,
+    email: str | None = None,
+    start_date: date | None = None,
+    end_date: date | None = None,
+    db: Session = Depends(get_db),
+):
+    """
+    Newest-first jobs page. Pass back `next_cursor` as `cursor` for the next page.
+    `end_date` is inclusive (whole day).
+    """
+    created_from = datetime.combine(start_date, datetime.min.time()) if start_date else None
+    created_to = datetime.combine(end_date + timedelta(days=1), datetime.min.time()) if end_date else None
+
+    try:
+        jobs, next_cursor = repo.list_jobs(
+            db,
+            limit=limit,
+            cursor=cursor,
+            status=status or None,
+            provider=provider or None,
+            email=email.strip() if email else None,
+            created_from=created_from,
+            created_to=created_to,
+        )
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+    return {
+        "jobs": [
+            {
+                "id": j.id,
+                "filename": j.filename,
+                "email": j.email,
+                "status": j.status,
+                "provider": j.provider,
+                "price": j.price_cents / 100,
+                "created_at": j.created_at.strftime("%Y-%m-%d %H:%M:%S"),
+                "completed_at": j.completed_at.strftime("%Y-%m-%d %H:%M:%S") if j.completed_at else None,
+                "token_used": j.token_used,
+            }
+            for j in jobs
+        ],
+        "next_cursor": next_cursor,
+    }
 
 
 # ────────────────────────────────
@@ -111,3 +156,41 @@ def create_token(
         db, code=code, discount_percent=discount_percent, usage_limit=usage_limit
     )
     return {"ok": True, "code": token.code}
+
+
+# ────────────────────────────────
+# Connection Pool Utilisation
+# ────────────────────────────────
+@router.get("/admin/pools")
+def get_pools():
+    return pool_stats()
+
+
+# ────────────────────────────────
+# Per-Stage Latency Percentiles
+# ────────────────────────────────
+@router.get("/admin/stages")
+def get_stage_latencies(hours: float = Query(24, gt=0, le=24 * 90), db: Session = Depends(get_db)):
+    """p50/p95/p99 seconds spent between job stages over the last `hours`."""
+    since = datetime.utcnow() - timedelta(hours=hours)
+    return {
+        "since": since.strftime("%Y-%m-%d %H:%M:%S"),
+        "stages": repo.stage_latency_percentiles(db, since),
+    }
+
+
+# ────────────────────────────────
+# Queue Estimate (autoscaling signal)
+# ────────────────────────────────
+@router.get("/admin/queue")
+def get_queue_estimate():
+    """Backlog, live workers, wait for a new job and the worker count to drain it in time."""
+    schedule = current_schedule()
+    return {
+        "queue_depth": schedule.depth,
+        "workers": len(schedule.worker_free_at),
+        "backlog_media_sec": round(schedule.backlog_media_sec),
+        "sec_per_media_sec": round(schedule.sec_per_media_sec, 3),
+        "new_job_wait_sec": round(schedule.tail_wait_sec()),
+        "recommended_workers": schedule.recommended_workers(),
+    }
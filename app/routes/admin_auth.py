@@ -2,10 +2,12 @@
 from fastapi import APIRouter, Request, Form
 from fastapi.responses import HTMLResponse, JSONResponse, RedirectResponse
 from fastapi.templating import Jinja2Templates
+from app.utils.assets import asset_url
 import os
 
 router = APIRouter()
 templates = Jinja2Templates(directory="admin_portal")
+templates.env.globals["asset_url"] = asset_url
 
 ADMIN_EMAIL = os.getenv("ADMIN_EMAIL", "admin@mailsized.com")
 ADMIN_PASSWORD = os.getenv("ADMIN_PASSWORD", "admin123")
@@ -0,0 +1,292 @@
+# app/routes/batch.py
+from fastapi import APIRouter, Depends, HTTPException, Request
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel
+from uuid import uuid4
+import asyncio
+import json
+from app.db import SessionLocal
+from app import repo
+from app.routes.upload import UploadRequest, presign_upload, validate_upload
+from app.utils.external import ServiceUnavailable
+from app.utils.stripe_utils import create_checkout_session_async
+from app.utils.redis_utils import enqueue_jobs
+from app.models.models import Batch
+from app.utils.token_cache import (
+    lookup_token,
+    redeem_token,
+    release_token,
+    release_token_hold,
+    reserve_token,
+    settle_token,
+)
+from app.utils.rate_limit import (
+    QueueBackpressure,
+    RateLimit,
+    acquire_sse_slot,
+    release_sse_slot,
+    renew_sse_slot,
+)
+
+router = APIRouter()
+
+MAX_BATCH_FILES = 50
+
+
+class BatchUploadRequest(BaseModel):
+    email: str = "noemail@mailsized.com"
+    files: list[UploadRequest]
+
+
+class BatchPayRequest(BaseModel):
+    batch_id: str
+    email: str
+    provider: str
+    priority: bool = False
+    promo_code: str | None = None
+    price_cents: int
+
+
+# ───────────── Create Batch ─────────────
+@router.post(
+    "/api/batch/upload",
+    dependencies=[Depends(RateLimit("upload", 20, 10)), Depends(QueueBackpressure())],
+)
+def create_batch_upload(req: BatchUploadRequest):
+    """
+    Registers many uploads in one call: one DB transaction for all jobs and
+    presigned PUT URLs returned in bulk. Files over the multipart threshold
+    get no PUT URL and go through /upload/multipart with their upload_id.
+    """
+    if not req.files:
+        raise HTTPException(status_code=400, detail="No files in batch.")
+    if len(req.files) > MAX_BATCH_FILES:
+        raise HTTPException(status_code=400, detail=f"A batch holds at most {MAX_BATCH_FILES} files.")
+    for f in req.files:
+        validate_upload(f)
+
+    uploads = []
+    for f in req.files:
+        upload_id = str(uuid4())
+        presigned_url = presign_upload(upload_id, f)
+        uploads.append({
+            "upload_id": upload_id,
+            "filename": f.filename,
+            "size_bytes": f.size_bytes,
+            "duration_sec": f.duration_sec,
+            "presigned_url": presigned_url,
+            "multipart": presigned_url is None,
+        })
+
+    db = SessionLocal()
+    try:
+        batch, _ = repo.create_batch(db, req.email, uploads)
+        batch_id = batch.id
+    finally:
+        db.close()
+
+    return {"ok": True, "batch_id": batch_id, "uploads": uploads}
+
+
+# ───────────── Pay for Batch ─────────────
+def _prepare_batch(req: BatchPayRequest):
+    """Apply checkout choices and validate the promo code. Returns (jobs not yet queued?, token, file count)."""
+    db = SessionLocal()
+    try:
+        batch = repo.get_batch(db, req.batch_id)
+        if not batch:
+            raise HTTPException(status_code=404, detail="Batch not found.")
+
+        token = None
+        if req.promo_code:
+            token = lookup_token(db, req.promo_code.strip())
+            if not token:
+                raise HTTPException(status_code=400, detail="Invalid token.")
+            # A code this batch already reserved for an earlier checkout is reused
+            if token.exhausted and batch.token_used != token.code:
+                raise HTTPException(status_code=400, detail="Token already used.")
+
+        repo.update_batch_for_payment(
+            db, batch, req.email, req.provider, req.priority, req.price_cents
+        )
+        pending = any(j.enqueued_at is None for j in repo.get_batch_jobs(db, batch.id))
+        return pending, token, batch.file_count
+
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+
+def _queue_free_batch(batch_id: str, code: str) -> bool:
+    """
+    Consume the token, mark the jobs queued and push them with one RPUSH.
+    False (with the jobs and the token use given back) when Redis is down.
+    """
+    db = SessionLocal()
+    try:
+        # Redeem first: the conditional UPDATE is what stops over-redemption
+        if not redeem_token(db, code):
+            raise HTTPException(status_code=400, detail="Token already used.")
+        jobs = repo.mark_batch_enqueued(db, batch_id)
+        if not jobs:
+            release_token(db, code)  # a racing duplicate already queued the batch
+            return True
+
+        upload_ids = [j.upload_id for j in jobs]
+        if not enqueue_jobs(jobs):
+            repo.clear_job_enqueued(db, upload_ids)
+            release_token(db, code)
+            return False
+        settle_token(db, Batch, batch_id, code)
+        repo.record_job_stages(db, upload_ids, "enqueued")
+        return True
+    finally:
+        db.close()
+
+
+def _reserve_token(batch_id: str, code: str):
+    """Returns (token, newly reserved); a retried checkout reuses the batch's reservation."""
+    db = SessionLocal()
+    try:
+        token, new = reserve_token(db, Batch, batch_id, code)
+        if not token:
+            raise HTTPException(status_code=400, detail="Token already used.")
+        return token, new
+    finally:
+        db.close()
+
+
+def _release_token(batch_id: str, code: str):
+    db = SessionLocal()
+    try:
+        release_token_hold(db, Batch, batch_id, code)
+    finally:
+        db.close()
+
+
+def _record_checkout_session(batch_id: str, session_id: str):
+    db = SessionLocal()
+    try:
+        repo.set_checkout_session(db, Batch, batch_id, session_id)
+    finally:
+        db.close()
+
+
+@router.post(
+    "/api/batch/pay",
+    dependencies=[Depends(RateLimit("pay", 10, 5)), Depends(QueueBackpressure())],
+)
+async def pay_for_batch(req: BatchPayRequest):
+    """
+    One payment for the whole batch:
+      - 100% token → mark every job queued and enqueue them with one RPUSH
+      - otherwise  → one Stripe Checkout Session; the webhook enqueues the batch
+    Like /api/pay, DB and Redis work runs in the threadpool and Stripe is
+    awaited under its breaker and timeout.
+    """
+    try:
+        pending, token, file_count = await run_in_threadpool(_prepare_batch, req)
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Batch payment error: {e}")
+
+    if token and token.discount_percent == 100:
+        try:
+            queued = await run_in_threadpool(_queue_free_batch, req.batch_id, token.code) if pending else True
+        except HTTPException:
+            raise
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=f"Free token error: {e}")
+        if not queued:
+            raise HTTPException(status_code=503, detail="Processing queue is temporarily unavailable, please retry.")
+        return {
+            "ok": True,
+            "free": True,
+            "batch_id": req.batch_id,
+            "message": "100% discount token applied — processing started.",
+        }
+
+    # Reserve a discount code now (reused on retry); the latest session's expiry releases it
+    reserved = False
+    if token:
+        token, reserved = await run_in_threadpool(_reserve_token, req.batch_id, token.code)
+    try:
+        session = await create_checkout_session_async(
+            upload_id=None,
+            batch_id=req.batch_id,
+            file_count=file_count,
+            email=req.email,
+            amount_cents=req.price_cents,
+            token_obj=token,
+        )
+    except Exception as e:
+        if reserved:
+            await run_in_threadpool(_release_token, req.batch_id, token.code)
+        if isinstance(e, ServiceUnavailable):
+            raise HTTPException(status_code=503, detail=f"Payments are temporarily unavailable, please retry: {e}")
+        raise HTTPException(status_code=500, detail=f"Stripe error: {e}")
+
+    await run_in_threadpool(_record_checkout_session, req.batch_id, session.id)
+    return {"checkout_url": session.url}
+
+
+# ───────────── Aggregate Progress (SSE) ─────────────
+def _batch_snapshot(batch_id: str):
+    db = SessionLocal()
+    try:
+        if not repo.get_batch(db, batch_id):
+            return None
+        summary = repo.batch_progress(db, batch_id)
+        summary["jobs"] = [
+            {
+                "upload_id": j.upload_id,
+                "filename": j.filename,
+                "status": j.status,
+                "progress": j.progress,
+                "download_url": j.output_url,
+            }
+            for j in repo.get_batch_jobs(db, batch_id)
+        ]
+        return summary
+    finally:
+        db.close()
+
+
+@router.get(
+    "/events/batch/{batch_id}",
+    dependencies=[
+        Depends(RateLimit("events", 30, 10)),
+        Depends(RateLimit("events", 10, 5, per="batch_id")),
+    ],
+)
+async def stream_batch_progress(request: Request, batch_id: str):
+    """One SSE stream for the whole batch instead of one per file."""
+    sse_slot = await run_in_threadpool(acquire_sse_slot, request)
+
+    async def event_generator():
+        try:
+            while True:
+                if await request.is_disconnected():
+                    break
+                if sse_slot is not None and sse_slot.renew_due():
+                    await run_in_threadpool(renew_sse_slot, sse_slot)
+
+                snapshot = await run_in_threadpool(_batch_snapshot, batch_id)
+                if snapshot is None:
+                    yield "data: " + json.dumps({"status": "error", "message": "Batch not found"}) + "\n\n"
+                    break
+
+                finished = snapshot["done"] + snapshot["failed"]
+                snapshot["status"] = "done" if finished == snapshot["total"] else "processing"
+                yield "data: " + json.dumps(snapshot) + "\n\n"
+                if snapshot["status"] == "done":
+                    break
+                await asyncio.sleep(2)
+        finally:
+            await run_in_threadpool(release_sse_slot, sse_slot)
+
+    return StreamingResponse(event_generator(), media_type="text/event-stream")
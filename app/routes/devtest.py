@@ -4,22 +4,13 @@ from fastapi import APIRouter, HTTPException
 from pydantic import BaseModel
 from app.db import SessionLocal
 from app import repo
-import redis
+from app.utils.clients import get_redis
+from app.utils.redis_utils import QUEUE_NAME
+from datetime import datetime
 import json
-import os
-from urllib.parse import urlparse
 
 router = APIRouter()
 
-# ───────────── Redis Setup ─────────────
-redis_url = urlparse(os.getenv("REDIS_URL"))
-redis_client = redis.Redis(
-    host=redis_url.hostname,
-    port=redis_url.port,
-    db=0,
-    decode_responses=True
-)
-
 # ───────────── Request Model ─────────────
 class DevTestRequest(BaseModel):
     upload_id: str
@@ -52,6 +43,7 @@ def apply_devtest(req: DevTestRequest):
         job.priority = req.priority
         job.transcript = req.transcript
         job.token_used = "DEVTEST"
+        job.enqueued_at = datetime.utcnow()
         db.commit()
 
         # Push job details to Redis queue
@@ -64,7 +56,8 @@ def apply_devtest(req: DevTestRequest):
             "email": job.email,
             "priority": req.priority,
         }
-        redis_client.rpush("mailsized_jobs", json.dumps(redis_payload))
+        get_redis().rpush(QUEUE_NAME, json.dumps(redis_payload))
+        repo.record_job_stages(db, [job.upload_id], "enqueued")
 
         return {
             "ok": True,
@@ -1,11 +1,18 @@
 # app/routes/download.py
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, Depends, HTTPException
 from app.db import SessionLocal
 from app import repo
+from app.utils.rate_limit import RateLimit
 
 router = APIRouter(prefix="/download", tags=["Download"])
 
-@router.get("/{job_id}")
+@router.get(
+    "/{job_id}",
+    dependencies=[
+        Depends(RateLimit("download", 60, 20)),
+        Depends(RateLimit("download", 30, 10, per="job_id")),
+    ],
+)
 def get_download_url(job_id: str):
     """
     Returns the output_url for a completed job.
@@ -20,7 +27,8 @@ def get_download_url(job_id: str):
         if not job.output_url:
             raise HTTPException(status_code=404, detail="Download not ready yet")
 
-        return {"url": job.output_url}
+        outputs = repo.get_job_outputs(db, job_id)
+        return {"url": job.output_url, "outputs": outputs} if outputs else {"url": job.output_url}
 
     finally:
         db.close()
@@ -1,10 +1,23 @@
 # app/routes/pay.py
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, Depends, HTTPException
+from fastapi.concurrency import run_in_threadpool
 from pydantic import BaseModel
 from app.db import SessionLocal
 from app import repo
-from app.utils.stripe_utils import create_checkout_session
-from app.utils.redis_utils import enqueue_job  # for 100% free-token path
+from app.utils.external import ServiceUnavailable
+from app.utils.stripe_utils import create_checkout_session_async
+from app.utils.redis_utils import enqueue_job_async, split_providers  # for 100% free-token path
+from app.utils.rate_limit import QueueBackpressure, RateLimit
+from app.utils.queue_estimate import estimate_wait
+from app.models.models import Job
+from app.utils.token_cache import (
+    lookup_token,
+    redeem_token,
+    release_token,
+    release_token_hold,
+    reserve_token,
+    settle_token,
+)
 
 router = APIRouter()
 
@@ -20,20 +33,15 @@ class PayRequest(BaseModel):
     duration_sec: float
     price_cents: int
     filename: str
+    # Other providers to size for in the same run (one decode, one output each)
+    extra_providers: list[str] = []
 
 
-@router.post("/api/pay")
-async def handle_payment(req: PayRequest):
-    """
-    Initializes payment flow:
-      - Ensures a pending job exists BEFORE redirecting to Stripe (so webhook can find & enqueue it).
-      - Validates promo tokens.
-      - If token is 100% off → bypass Stripe, mark token used, enqueue immediately, return ok.
-      - Otherwise → create Stripe Checkout Session and return its URL.
-    """
+# ───── Blocking DB steps (run in the threadpool, off the event loop) ─────
+def _prepare_job(req: PayRequest):
+    """Upsert the pending job and validate the promo code. Returns (not yet queued?, token)."""
     db = SessionLocal()
     token = None
-
     try:
         # 1️⃣ Ensure email is stored against this upload
         try:
@@ -41,6 +49,10 @@ async def handle_payment(req: PayRequest):
         except Exception as e:
             raise HTTPException(status_code=500, detail=f"Failed to update email: {e}")
 
+        extra_providers = ",".join(
+            dict.fromkeys(p for p in req.extra_providers if p and p != req.provider and "," not in p)
+        ) or None
+
         # 2️⃣ Ensure a pending job row exists or update it
         job = repo.get_job_by_upload_id(db, req.file_key)
         if not job:
@@ -58,6 +70,7 @@ async def handle_payment(req: PayRequest):
                 progress=0.0,
                 input_path=f"{req.file_key}/{req.filename}",
             )
+            job.extra_providers = extra_providers
         else:
             # ✅ keep job info up to date
             job.filename = req.filename
@@ -65,63 +78,162 @@ async def handle_payment(req: PayRequest):
             job.size_bytes = req.size_bytes
             job.duration_sec = req.duration_sec
             job.price_cents = req.price_cents
+            job.extra_providers = extra_providers
 
         # 3️⃣ Token validation (only consume on 100% free)
         if req.promo_code:
-            token = repo.get_token(db, req.promo_code.strip())
+            token = lookup_token(db, req.promo_code.strip())
             if not token:
                 raise HTTPException(status_code=400, detail="Invalid token.")
-            if token.usage_count >= token.usage_limit:
+            # A code this job already reserved for an earlier checkout is reused
+            if token.exhausted and job.token_used != token.code:
                 raise HTTPException(status_code=400, detail="Token already used.")
 
+        pending = job.enqueued_at is None
         db.commit()  # persist everything before Stripe call
+        return pending, token
 
-        # 4️⃣ Handle 100% free token (skip Stripe, start processing directly)
-        if token and int(getattr(token, "discount_percent", 0) or 0) == 100:
-            try:
-                repo.use_token(db, token.code)
-                job.status = "queued"
-                db.commit()
-
-                enqueue_job(
-                    upload_id=job.upload_id,
-                    filename=job.filename,
-                    duration=job.duration_sec,
-                    size=job.size_bytes,
-                    provider=job.provider,
-                    email=job.email,
-                    priority=job.priority,
-                )
-
-                # ✅ Return signal for frontend to skip Stripe and show progress bar
-                return {
-                    "ok": True,
-                    "free": True,
-                    "upload_id": job.upload_id,
-                    "message": "100% discount token applied — processing started.",
-                }
-
-            except Exception as e:
-                db.rollback()
-                raise HTTPException(status_code=500, detail=f"Free token error: {e}")
-
-        # 5️⃣ Normal paid flow → Stripe Checkout Session
-        try:
-            session = create_checkout_session(
-                upload_id=req.file_key,
-                email=req.email,
-                amount_cents=req.price_cents,
-                token_obj=token,
-            )
-        except Exception as e:
-            raise HTTPException(status_code=500, detail=f"Stripe error: {e}")
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
 
-        return {"checkout_url": session.url}
 
+def _redeem_free_job(upload_id: str, code: str) -> dict | None:
+    """Consume the token and mark the job queued; enqueue_job kwargs, or None for a duplicate."""
+    db = SessionLocal()
+    try:
+        # Redeem first: the conditional UPDATE is what stops over-redemption
+        if not redeem_token(db, code):
+            raise HTTPException(status_code=400, detail="Token already used.")
+        # Only the first request for this upload enqueues; a racing duplicate gives its use back
+        queued = repo.mark_job_enqueued(db, upload_id)
+        if not queued:
+            release_token(db, code)
+            return None
+        return {
+            "upload_id": queued.upload_id,
+            "filename": queued.filename,
+            "duration": queued.duration_sec,
+            "size": queued.size_bytes,
+            "provider": queued.provider,
+            "email": queued.email,
+            "priority": queued.priority,
+            "extra_providers": split_providers(queued.extra_providers),
+        }
+    finally:
+        db.close()
+
+
+def _settle_free_job(upload_id: str, code: str, enqueued: bool):
+    """Record the enqueue, or undo the redemption so the client can retry."""
+    db = SessionLocal()
+    try:
+        if enqueued:
+            settle_token(db, Job, upload_id, code)
+            repo.record_job_stages(db, [upload_id], "enqueued")
+        else:
+            repo.clear_job_enqueued(db, [upload_id])
+            release_token(db, code)
+    finally:
+        db.close()
+
+
+def _reserve_token(upload_id: str, code: str):
+    """Returns (token, newly reserved); a retried checkout reuses the job's reservation."""
+    db = SessionLocal()
+    try:
+        token, new = reserve_token(db, Job, upload_id, code)
+        if not token:
+            raise HTTPException(status_code=400, detail="Token already used.")
+        return token, new
+    finally:
+        db.close()
+
+
+def _release_token(upload_id: str, code: str):
+    db = SessionLocal()
+    try:
+        release_token_hold(db, Job, upload_id, code)
+    finally:
+        db.close()
+
+
+def _record_checkout_session(upload_id: str, session_id: str):
+    db = SessionLocal()
+    try:
+        repo.set_checkout_session(db, Job, upload_id, session_id)
+    finally:
+        db.close()
+
+
+@router.post("/api/pay", dependencies=[Depends(RateLimit("pay", 10, 5)), Depends(QueueBackpressure())])
+async def handle_payment(req: PayRequest):
+    """
+    Initializes payment flow:
+      - Ensures a pending job exists BEFORE redirecting to Stripe (so webhook can find & enqueue it).
+      - Validates promo tokens.
+      - If token is 100% off → bypass Stripe, mark token used, enqueue immediately, return ok.
+      - Otherwise → create Stripe Checkout Session and return its URL.
+    DB work runs in the threadpool and Stripe/Redis are awaited, so the event
+    loop (and the SSE streams on it) never waits on I/O here.
+    """
+    try:
+        pending, token = await run_in_threadpool(_prepare_job, req)
     except HTTPException:
         raise
     except Exception as e:
-        db.rollback()
         raise HTTPException(status_code=500, detail=f"Payment init error: {e}")
-    finally:
-        db.close()
+
+    # 4️⃣ Handle 100% free token (skip Stripe, start processing directly)
+    if token and token.discount_percent == 100:
+        try:
+            queued = await run_in_threadpool(_redeem_free_job, req.file_key, token.code) if pending else None
+            if queued:
+                enqueued = await enqueue_job_async(**queued)
+                await run_in_threadpool(_settle_free_job, req.file_key, token.code, enqueued)
+                if not enqueued:
+                    raise HTTPException(
+                        status_code=503, detail="Processing queue is temporarily unavailable, please retry."
+                    )
+        except HTTPException:
+            raise
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=f"Free token error: {e}")
+
+        # ✅ Return signal for frontend to skip Stripe and show progress bar
+        return {
+            "ok": True,
+            "free": True,
+            "upload_id": req.file_key,
+            "message": "100% discount token applied — processing started.",
+            "estimate": await run_in_threadpool(estimate_wait, req.file_key, req.duration_sec),
+        }
+
+    # 5️⃣ Normal paid flow → Stripe Checkout Session (off the event loop).
+    # A discount code is reserved now, not after payment, so a flash crowd
+    # cannot pay with more uses than it has. Retries reuse the reservation;
+    # the expiry of the job's latest session releases it.
+    reserved = False
+    if token:
+        token, reserved = await run_in_threadpool(_reserve_token, req.file_key, token.code)
+    try:
+        session = await create_checkout_session_async(
+            upload_id=req.file_key,
+            email=req.email,
+            amount_cents=req.price_cents,
+            token_obj=token,
+        )
+    except Exception as e:
+        if reserved:
+            await run_in_threadpool(_release_token, req.file_key, token.code)
+        if isinstance(e, ServiceUnavailable):
+            raise HTTPException(status_code=503, detail=f"Payments are temporarily unavailable, please retry: {e}")
+        raise HTTPException(status_code=500, detail=f"Stripe error: {e}")
+
+    await run_in_threadpool(_record_checkout_session, req.file_key, session.id)
+    return {
+        "checkout_url": session.url,
+        "estimate": await run_in_threadpool(estimate_wait, None, req.duration_sec),
+    }
@@ -1,34 +1,42 @@
 # app/routes/stripe_webhook.py
-from fastapi import APIRouter, Request, Header, HTTPException
-import stripe
+from fastapi import APIRouter, BackgroundTasks, Request, Header, HTTPException
+from fastapi.concurrency import run_in_threadpool
+from datetime import datetime, timedelta
+import asyncio
+import json
 import os
 from app.db import SessionLocal
 from app import repo
-from app.utils.redis_utils import enqueue_job
+from app.utils.clients import get_stripe
+from app.utils.redis_utils import enqueue_job, enqueue_jobs, split_providers
+from app.models.models import Batch, Job
+from app.utils.token_cache import redeem_token, release_token_hold
 
 router = APIRouter()
-stripe.api_key = os.getenv("STRIPE_SECRET_KEY")
 endpoint_secret = os.getenv("STRIPE_WEBHOOK_SECRET")
 
+STRIPE_EVENT_SWEEP_SEC = int(os.getenv("STRIPE_EVENT_SWEEP_SEC", "30"))
+STRIPE_EVENT_CLAIM_TIMEOUT_SEC = 300  # reclaim events stuck in "processing" after a crash
+STRIPE_EVENT_MAX_ATTEMPTS = 5
+
 
 @router.post("/webhook")
 async def stripe_webhook(
     request: Request,
+    background_tasks: BackgroundTasks,
     stripe_signature: str = Header(None, alias="Stripe-Signature"),
 ):
     """
-    Handles Stripe events:
-      - On checkout.session.completed:
-          * Ensure a job exists or create fallback
-          * Update price_cents and status
-          * Enqueue to Redis for worker processing
-          * Consume token if present
+    Verifies and records the Stripe event, then acknowledges immediately.
+    Processing happens in process_stripe_event(): right after the response,
+    and again from the periodic sweep if that attempt is lost.
+    Duplicate deliveries of an event ID are acknowledged and dropped.
     """
     payload = await request.body()
 
     # ─────────────── Verify Signature ───────────────
     try:
-        event = stripe.Webhook.construct_event(
+        event = get_stripe().Webhook.construct_event(
             payload=payload,
             sig_header=stripe_signature,
             secret=endpoint_secret,
@@ -36,74 +44,194 @@ async def stripe_webhook(
     except Exception as e:
         raise HTTPException(status_code=400, detail=f"Webhook signature error: {str(e)}")
 
-    # ─────────────── Handle Checkout Success ───────────────
-    if event.get("type") == "checkout.session.completed":
-        session_obj = event["data"]["object"] or {}
-        metadata = session_obj.get("metadata") or {}
+    # ─────────────── Record in Ledger ───────────────
+    db = SessionLocal()
+    try:
+        is_new = await run_in_threadpool(
+            repo.record_stripe_event, db, event["id"], event["type"], payload.decode("utf-8")
+        )
+    finally:
+        db.close()
+
+    if not is_new:
+        return {"status": "duplicate"}
+
+    background_tasks.add_task(process_stripe_event, event["id"])
+    return {"status": "ok"}
 
-        upload_id = metadata.get("upload_id")
-        token_code = metadata.get("token_used")
-        amount_total = session_obj.get("amount_total", 0)
-        customer_email = session_obj.get("customer_email") or "noemail@mailsized.com"
 
-        if not upload_id:
-            # If upload_id missing, ignore to prevent Stripe retries
-            print("⚠️ Webhook ignored — missing upload_id in metadata.")
-            return {"status": "ignored"}
+# ─────────────── Event Processing ───────────────
+def process_stripe_event(event_id: str):
+    """Claim and apply one recorded event. Safe to call more than once."""
+    db = SessionLocal()
+    try:
+        stale_before = datetime.utcnow() - timedelta(seconds=STRIPE_EVENT_CLAIM_TIMEOUT_SEC)
+        record = repo.claim_stripe_event(db, event_id, stale_before)
+        if not record:
+            return
 
-        db = SessionLocal()
         try:
-            job = repo.get_job_by_upload_id(db, upload_id)
-
-            # ✅ Create fallback job if not found
-            if not job:
-                print(f"⚠️ No job found for {upload_id}, creating fallback.")
-                job = repo.create_job(
-                    db=db,
-                    upload_id=upload_id,
-                    filename="unknown",
-                    email=customer_email,
-                    provider="gmail",
-                    size_bytes=0,
-                    duration_sec=0.0,
-                    price_cents=int(amount_total or 0),
-                    priority=False,
-                    transcript=False,
-                    progress=0.0,
-                    input_path=f"{upload_id}/unknown",
-                )
-
-            # ✅ Update payment info and mark queued
-            job.price_cents = int(amount_total or job.price_cents)
-            job.status = "queued"
-            db.commit()
-
-            # ✅ Enqueue for worker
-            try:
-                enqueue_job(
-                    upload_id=job.upload_id,
-                    filename=job.filename,
-                    duration=job.duration_sec,
-                    size=job.size_bytes,
-                    provider=job.provider,
-                    email=job.email,
-                    priority=job.priority,
-                )
-                print(f"🟢 Enqueued job to Redis: {job.upload_id}")
-            except Exception as e:
-                print(f"🔴 Failed to enqueue job {job.upload_id}: {e}")
-
-            # ✅ Consume promo token if one was used
-            if token_code:
-                try:
-                    repo.use_token(db, token_code)
-                    db.commit()
-                    print(f"🎟️ Consumed token: {token_code}")
-                except Exception as e:
-                    print(f"⚠️ Failed to consume token {token_code}: {e}")
-
-        finally:
-            db.close()
-
-    # Always return 200 to prevent Stripe retries
-    return {"status": "ok"}
+            event = json.loads(record.payload)
+            if event.get("type") == "checkout.session.completed":
+                handle_checkout_completed(db, event)
+            elif event.get("type") == "checkout.session.expired":
+                handle_checkout_expired(db, event)
+            repo.finish_stripe_event(db, event_id)
+        except Exception as e:
+            db.rollback()
+            retry = record.attempts < STRIPE_EVENT_MAX_ATTEMPTS
+            print(f"🔴 Stripe event {event_id} failed (attempt {record.attempts}): {e}")
+            repo.finish_stripe_event(db, event_id, error=str(e), retry=retry)
+    finally:
+        db.close()
+
+
+def handle_checkout_completed(db, event: dict):
+    """
+    On checkout.session.completed:
+      * Ensure a job exists or create fallback
+      * Atomically mark it queued (only the first delivery wins)
+      * Enqueue to Redis for worker processing
+      * Consume token if present
+    """
+    session_obj = event["data"]["object"] or {}
+    metadata = session_obj.get("metadata") or {}
+
+    upload_id = metadata.get("upload_id")
+    batch_id = metadata.get("batch_id")
+    # Sessions created with a reserved code already consumed it at /api/pay;
+    # only older sessions still consume it here
+    token_code = None if metadata.get("token_reserved") else metadata.get("token_used")
+    amount_total = session_obj.get("amount_total", 0)
+    customer_email = session_obj.get("customer_email") or "noemail@mailsized.com"
+
+    if batch_id:
+        handle_batch_checkout_completed(db, batch_id, token_code)
+        return
+
+    if not upload_id:
+        print("⚠️ Webhook ignored — missing upload_id in metadata.")
+        return
+
+    job = repo.get_job_by_upload_id(db, upload_id)
+
+    # ✅ Create fallback job if not found
+    if not job:
+        print(f"⚠️ No job found for {upload_id}, creating fallback.")
+        job = repo.create_job(
+            db=db,
+            upload_id=upload_id,
+            filename="unknown",
+            email=customer_email,
+            provider="gmail",
+            size_bytes=0,
+            duration_sec=0.0,
+            price_cents=int(amount_total or 0),
+            priority=False,
+            transcript=False,
+            progress=0.0,
+            input_path=f"{upload_id}/unknown",
+        )
+
+    # ✅ Update payment info and mark queued — exactly once per upload
+    job = repo.mark_job_enqueued(db, upload_id, price_cents=int(amount_total or job.price_cents))
+    if not job:
+        print(f"↩️ Job {upload_id} already queued; skipping duplicate payment event.")
+        return
+
+    # ✅ Enqueue for worker
+    if enqueue_job(
+        upload_id=job.upload_id,
+        filename=job.filename,
+        duration=job.duration_sec,
+        size=job.size_bytes,
+        provider=job.provider,
+        email=job.email,
+        priority=job.priority,
+        extra_providers=split_providers(job.extra_providers),
+    ):
+        repo.record_job_stages(db, [job.upload_id], "enqueued")
+        print(f"🟢 Enqueued job to Redis: {job.upload_id}")
+    else:
+        # Leave the event unprocessed so the ledger sweep retries it
+        repo.clear_job_enqueued(db, [job.upload_id])
+        raise RuntimeError(f"Redis enqueue failed for {job.upload_id}")
+
+    # ✅ Consume promo token if one was used
+    if token_code:
+        try:
+            if redeem_token(db, token_code):
+                repo.set_token_used(db, Job, job.upload_id, token_code)
+                print(f"🎟️ Consumed token: {token_code}")
+            else:
+                print(f"⚠️ Token {token_code} was exhausted before this payment completed")
+        except Exception as e:
+            print(f"⚠️ Failed to consume token {token_code}: {e}")
+
+
+def handle_batch_checkout_completed(db, batch_id: str, token_code: str | None):
+    """Queue every job of a paid batch with one pipelined RPUSH."""
+    if not repo.get_batch(db, batch_id):
+        print(f"⚠️ Webhook ignored — unknown batch {batch_id}.")
+        return
+
+    jobs = repo.mark_batch_enqueued(db, batch_id)
+    if not jobs:
+        print(f"↩️ Batch {batch_id} already queued; skipping duplicate payment event.")
+        return
+
+    if enqueue_jobs(jobs):
+        repo.record_job_stages(db, [j.upload_id for j in jobs], "enqueued")
+        print(f"🟢 Enqueued batch {batch_id} ({len(jobs)} jobs)")
+    else:
+        repo.clear_job_enqueued(db, [j.upload_id for j in jobs])
+        raise RuntimeError(f"Redis enqueue failed for batch {batch_id}")
+
+    if token_code:
+        try:
+            if redeem_token(db, token_code):
+                repo.set_token_used(db, Batch, batch_id, token_code)
+                print(f"🎟️ Consumed token: {token_code}")
+            else:
+                print(f"⚠️ Token {token_code} was exhausted before this payment completed")
+        except Exception as e:
+            print(f"⚠️ Failed to consume token {token_code}: {e}")
+
+
+def handle_checkout_expired(db, event: dict):
+    """
+    An unpaid session timed out: give back the promo code use it reserved,
+    unless the customer has since opened a newer session that reuses it.
+    """
+    session_obj = event["data"]["object"] or {}
+    metadata = session_obj.get("metadata") or {}
+    token_code = metadata.get("token_used")
+    if not (token_code and metadata.get("token_reserved")):
+        return
+
+    model, key = (Batch, metadata["batch_id"]) if metadata.get("batch_id") else (Job, metadata.get("upload_id"))
+    if release_token_hold(db, model, key, token_code, session_id=session_obj.get("id")):
+        print(f"🎟️ Released reserved token {token_code} (checkout expired)")
+
+
+def process_pending_stripe_events() -> int:
+    db = SessionLocal()
+    try:
+        stale_before = datetime.utcnow() - timedelta(seconds=STRIPE_EVENT_CLAIM_TIMEOUT_SEC)
+        event_ids = repo.pending_stripe_event_ids(db, stale_before)
+    finally:
+        db.close()
+
+    for event_id in event_ids:
+        process_stripe_event(event_id)
+    return len(event_ids)
+
+
+async def consume_stripe_events():
+    """Background sweep for events whose immediate processing was lost."""
+    while True:
+        await asyncio.sleep(STRIPE_EVENT_SWEEP_SEC)
+        try:
+            await run_in_threadpool(process_pending_stripe_events)
+        except Exception as e:
+            print(f"⚠️ Stripe event sweep failed: {e}")
@@ -1,16 +1,30 @@
 # app/routes/upload.py
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, Depends, HTTPException
+from fastapi.concurrency import run_in_threadpool
 from pydantic import BaseModel
 from uuid import uuid4
-from app.utils.s3_utils import generate_presigned_upload_url
+from app.utils.s3_utils import (
+    generate_presigned_upload_url,
+    multipart_part_size,
+    create_multipart_upload,
+    generate_presigned_part_urls,
+    list_uploaded_parts,
+    complete_multipart_upload,
+    abort_multipart_upload,
+    MAX_PARTS,
+    MULTIPART_THRESHOLD_BYTES,
+)
 from app.db import SessionLocal
 from app import repo
+from app.utils.rate_limit import QueueBackpressure, RateLimit
+from app.utils.queue_estimate import estimate_wait
 
 router = APIRouter()
 
 MAX_SIZE_BYTES = 2 * 1024 * 1024 * 1024  # 2GB
 FREE_TIER_BYTES = 50 * 1024 * 1024       # 50MB
 MAX_DURATION_SEC = 20 * 60               # 20 minutes
+MAX_PART_URLS_PER_BATCH = 100
 
 
 class UploadRequest(BaseModel):
@@ -20,8 +34,33 @@ class UploadRequest(BaseModel):
     duration_sec: float
 
 
-@router.post("/upload")
-async def upload_file(req: UploadRequest):
+class MultipartStartRequest(BaseModel):
+    upload_id: str
+    content_type: str = "video/mp4"
+
+
+class MultipartPartsRequest(BaseModel):
+    upload_id: str
+    s3_upload_id: str
+    part_numbers: list[int]
+
+
+class CompletedPart(BaseModel):
+    part_number: int
+    etag: str
+
+
+class MultipartCompleteRequest(BaseModel):
+    upload_id: str
+    s3_upload_id: str
+    parts: list[CompletedPart]
+
+
+class MultipartAbortRequest(BaseModel):
+    upload_id: str
+    s3_upload_id: str
+
+def validate_upload(req: UploadRequest):
     if req.size_bytes > MAX_SIZE_BYTES:
         raise HTTPException(status_code=400, detail="File exceeds 2GB limit.")
     if req.duration_sec > MAX_DURATION_SEC:
@@ -29,10 +68,23 @@ async def upload_file(req: UploadRequest):
     if not req.filename.lower().endswith((".mp4", ".mov", ".avi", ".mkv")):
         raise HTTPException(status_code=400, detail="Unsupported video format.")
 
-    upload_id = str(uuid4())
+
+def presign_upload(upload_id: str, req: UploadRequest) -> str | None:
+    """Single PUT URL, or None for a file the browser sends through /upload/multipart."""
+    if req.size_bytes > MULTIPART_THRESHOLD_BYTES:
+        return None
     presigned_url = generate_presigned_upload_url(upload_id, req.content_type)
     if not presigned_url:
         raise HTTPException(status_code=500, detail="Could not generate upload URL.")
+    return presigned_url
+
+
+@router.post("/upload", dependencies=[Depends(RateLimit("upload", 20, 10)), Depends(QueueBackpressure())])
+async def upload_file(req: UploadRequest):
+    validate_upload(req)
+
+    upload_id = str(uuid4())
+    presigned_url = presign_upload(upload_id, req)
 
     # 🆓 Assign tiers
     if req.size_bytes <= FREE_TIER_BYTES:
@@ -66,8 +118,100 @@ async def upload_file(req: UploadRequest):
         "ok": True,
         "upload_id": upload_id,
         "presigned_url": presigned_url,
+        "multipart": presigned_url is None,
         "price_cents": price_cents,
         "tier": tier_label,
         "size_bytes": req.size_bytes,
         "duration_sec": req.duration_sec,
+        "estimate": await run_in_threadpool(estimate_wait, None, req.duration_sec),
+    }
+
+
+# ───────────── Multipart Upload ─────────────
+def _get_upload_job(upload_id: str, s3_upload_id: str | None = None):
+    """The job for upload_id; with s3_upload_id, only if that multipart upload was started for it."""
+    db = SessionLocal()
+    try:
+        job = repo.get_job_by_upload_id(db, upload_id)
+    finally:
+        db.close()
+    if not job or (s3_upload_id is not None and job.s3_upload_id != s3_upload_id):
+        raise HTTPException(status_code=404, detail="Upload not found.")
+    return job
+
+
+multipart_limit = Depends(RateLimit("multipart", 120, 60))
+
+
+@router.post("/upload/multipart/start", dependencies=[multipart_limit])
+def start_multipart_upload(req: MultipartStartRequest):
+    """Begin a multipart upload for a job created by /upload."""
+    job = _get_upload_job(req.upload_id)
+    part_size = multipart_part_size(job.size_bytes)
+    try:
+        s3_upload_id = create_multipart_upload(req.upload_id, req.content_type)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Could not start upload: {e}")
+
+    db = SessionLocal()
+    try:
+        repo.set_job_s3_upload_id(db, req.upload_id, s3_upload_id)
+    finally:
+        db.close()
+
+    return {
+        "upload_id": req.upload_id,
+        "s3_upload_id": s3_upload_id,
+        "part_size": part_size,
+        "part_count": max(1, -(-job.size_bytes // part_size)),
     }
+
+
+@router.post("/upload/multipart/parts", dependencies=[multipart_limit])
+async def presign_multipart_parts(req: MultipartPartsRequest):
+    """Presigned PUT URLs for a batch of part numbers."""
+    if not req.part_numbers or len(req.part_numbers) > MAX_PART_URLS_PER_BATCH:
+        raise HTTPException(status_code=400, detail=f"Request 1–{MAX_PART_URLS_PER_BATCH} parts per batch.")
+    if any(n < 1 or n > MAX_PARTS for n in req.part_numbers):
+        raise HTTPException(status_code=400, detail="Invalid part number.")
+    await run_in_threadpool(_get_upload_job, req.upload_id, req.s3_upload_id)
+
+    try:
+        parts = generate_presigned_part_urls(req.upload_id, req.s3_upload_id, req.part_numbers)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Could not generate part URLs: {e}")
+    return {"parts": parts}
+
+
+@router.get("/upload/multipart/{upload_id}/parts", dependencies=[multipart_limit])
+def get_uploaded_parts(upload_id: str, s3_upload_id: str):
+    """Parts already stored, used by the browser to resume an interrupted upload."""
+    _get_upload_job(upload_id, s3_upload_id)
+    try:
+        return {"parts": list_uploaded_parts(upload_id, s3_upload_id)}
+    except Exception as e:
+        raise HTTPException(status_code=404, detail=f"Upload not found: {e}")
+
+
+@router.post("/upload/multipart/complete", dependencies=[multipart_limit])
+def finish_multipart_upload(req: MultipartCompleteRequest):
+    if not req.parts:
+        raise HTTPException(status_code=400, detail="No parts uploaded.")
+    _get_upload_job(req.upload_id, req.s3_upload_id)
+    try:
+        complete_multipart_upload(
+            req.upload_id, req.s3_upload_id, [p.model_dump() for p in req.parts]
+        )
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=f"Could not complete upload: {e}")
+    return {"ok": True, "upload_id": req.upload_id}
+
+
+@router.post("/upload/multipart/abort", dependencies=[multipart_limit])
+def cancel_multipart_upload(req: MultipartAbortRequest):
+    _get_upload_job(req.upload_id, req.s3_upload_id)
+    try:
+        abort_multipart_upload(req.upload_id, req.s3_upload_id)
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=f"Could not abort upload: {e}")
+    return {"ok": True}
@@ -0,0 +1,81 @@
+# app/utils/assets.py
+import json
+import anyio
+from functools import lru_cache
+from mimetypes import guess_type
+from os import stat_result
+from pathlib import Path
+from stat import S_ISREG
+from starlette.datastructures import Headers
+from starlette.responses import FileResponse, Response
+from starlette.staticfiles import StaticFiles
+from starlette.types import Scope
+from app.utils.page_cache import accepted_encodings
+
+BASE_DIR = Path(__file__).resolve().parent.parent.parent
+ASSETS_DIR = BASE_DIR / "dist" / "assets"
+MANIFEST_PATH = ASSETS_DIR / "manifest.json"
+ASSETS_URL_PREFIX = "/assets"
+
+# Source files fingerprinted by build_assets.py (paths relative to BASE_DIR)
+ASSET_SOURCES = ["static/*.js", "static/*.css", "admin_portal/*.js", "admin_portal/*.css"]
+
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+PRECOMPRESSED = (("br", ".br"), ("gzip", ".gz"))
+
+
+@lru_cache(maxsize=1)
+def load_manifest() -> dict[str, str]:
+    """{"static/script.js": "static/script.<hash>.js", ...} or {} if never built."""
+    try:
+        return json.loads(MANIFEST_PATH.read_text())
+    except FileNotFoundError:
+        return {}
+
+
+def asset_url(path: str) -> str:
+    """
+    Template helper: fingerprinted URL for a source asset, falling back to the
+    plain /static or /admin_portal URL when build_assets.py hasn't been run.
+    """
+    hashed = load_manifest().get(path)
+    if hashed:
+        return f"{ASSETS_URL_PREFIX}/{hashed}"
+    return f"/{path}"
+
+
+class ImmutableStaticFiles(StaticFiles):
+    """
+    Serves fingerprinted build output. Names change with content, so every
+    response is cacheable forever; .br/.gz siblings are sent when accepted.
+    """
+
+    async def get_response(self, path: str, scope: Scope) -> Response:
+        accepted = accepted_encodings(Headers(scope=scope).get("accept-encoding", ""))
+        response = None
+
+        for encoding, suffix in PRECOMPRESSED:
+            if encoding not in accepted:
+                continue
+            full_path, stat = await anyio.to_thread.run_sync(self.lookup_path, path + suffix)
+            if stat and S_ISREG(stat.st_mode):
+                response = self._precompressed_response(full_path, stat, path, encoding)
+                break
+
+        if response is None:
+            response = await super().get_response(path, scope)
+
+        if response.status_code == 200:
+            response.headers["Cache-Control"] = IMMUTABLE_CACHE_CONTROL
+            response.headers["Vary"] = "Accept-Encoding"
+        return response
+
+    @staticmethod
+    def _precompressed_response(full_path: str, stat: stat_result, path: str, encoding: str) -> Response:
+        media_type = guess_type(path)[0] or "application/octet-stream"
+        return FileResponse(
+            full_path,
+            stat_result=stat,
+            media_type=media_type,
+            headers={"Content-Encoding": encoding},
+        )
@@ -0,0 +1,274 @@
+# app/utils/clients.py
+"""
+Process-wide external clients (Redis, S3, SQLAlchemy engine, Stripe).
+
+Nothing connects at import time: each client is built on first use and kept
+in a single registry, so the API lifespan (and the worker on exit) can close
+them all in one place via close_all(). Every client owns one explicitly sized
+connection pool; pool_stats() reports how full they are.
+"""
+import os
+import ssl
+import threading
+from urllib.parse import urlparse
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# ───────────── Pool settings ─────────────
+# Redis: blocking pool, so a burst waits up to REDIS_POOL_TIMEOUT for a free
+# connection instead of failing with "Too many connections".
+REDIS_MAX_CONNECTIONS = int(os.getenv("REDIS_MAX_CONNECTIONS", "50"))
+REDIS_POOL_TIMEOUT = float(os.getenv("REDIS_POOL_TIMEOUT", "5"))
+REDIS_CONNECT_TIMEOUT = float(os.getenv("REDIS_CONNECT_TIMEOUT", "5"))
+REDIS_SOCKET_TIMEOUT = float(os.getenv("REDIS_SOCKET_TIMEOUT", "10"))
+REDIS_HEALTH_CHECK_INTERVAL = int(os.getenv("REDIS_HEALTH_CHECK_INTERVAL", "30"))
+
+# Postgres: keep DB_POOL_SIZE warm connections, allow DB_MAX_OVERFLOW extra
+# under burst, recycle before idle-timeouts on the server/NAT side drop them.
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "10"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "20"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "10"))
+DB_POOL_RECYCLE_SEC = int(os.getenv("DB_POOL_RECYCLE_SEC", "1800"))
+
+# S3: botocore keeps at most S3_MAX_POOL_CONNECTIONS keep-alive connections.
+S3_MAX_POOL_CONNECTIONS = int(os.getenv("S3_MAX_POOL_CONNECTIONS", "50"))
+S3_CONNECT_TIMEOUT = float(os.getenv("S3_CONNECT_TIMEOUT", "5"))
+S3_READ_TIMEOUT = float(os.getenv("S3_READ_TIMEOUT", "60"))
+# Worker bulk transfers: one client whose pool matches the parallel part count
+# (see worker/transfers.py). S3_ENDPOINT_URL points it at a local S3 stand-in.
+S3_TRANSFER_CONCURRENCY = int(os.getenv("S3_TRANSFER_CONCURRENCY", "16"))
+S3_ENDPOINT_URL = os.getenv("S3_ENDPOINT_URL") or None
+
+# Stripe: blocking SDK, called from a bounded thread pool by async handlers.
+STRIPE_TIMEOUT_SEC = int(os.getenv("STRIPE_TIMEOUT_SEC", "10"))
+STRIPE_MAX_NETWORK_RETRIES = int(os.getenv("STRIPE_MAX_NETWORK_RETRIES", "1"))
+
+_clients: dict[str, object] = {}
+_lock = threading.Lock()
+
+
+def _get(name: str, factory):
+    client = _clients.get(name)
+    if client is None:
+        with _lock:
+            client = _clients.get(name)
+            if client is None:
+                client = factory()
+                _clients[name] = client
+    return client
+
+
+# ───────────── Factories ─────────────
+
+def _redis_pool(redis):
+    """BlockingConnectionPool from `redis` or `redis.asyncio` (same options for both)."""
+    url = urlparse(os.getenv("REDIS_URL", "redis://localhost:6379/0"))
+    connection_class = redis.SSLConnection if url.scheme == "rediss" else redis.Connection
+    connection_kwargs = {
+        "host": url.hostname,
+        "port": url.port or 6379,
+        "db": 0,
+        "socket_connect_timeout": REDIS_CONNECT_TIMEOUT,
+        "socket_timeout": REDIS_SOCKET_TIMEOUT,
+        "socket_keepalive": True,
+        "retry_on_timeout": True,
+        "health_check_interval": REDIS_HEALTH_CHECK_INTERVAL,
+        "decode_responses": True,
+    }
+    if connection_class is redis.SSLConnection:
+        connection_kwargs["ssl_cert_reqs"] = ssl.CERT_NONE
+
+    return redis.BlockingConnectionPool(
+        connection_class=connection_class,
+        max_connections=REDIS_MAX_CONNECTIONS,
+        timeout=REDIS_POOL_TIMEOUT,
+        **connection_kwargs,
+    )
+
+
+def _make_redis():
+    import redis
+
+    return redis.Redis(connection_pool=_redis_pool(redis))
+
+
+def _make_async_redis():
+    # For async request handlers: commands await the socket instead of
+    # blocking the event loop. Bound to the loop that first uses it.
+    import redis.asyncio
+
+    return redis.asyncio.Redis(connection_pool=_redis_pool(redis.asyncio))
+
+
+def _make_s3():
+    import boto3
+    from botocore.config import Config
+
+    config = Config(
+        max_pool_connections=S3_MAX_POOL_CONNECTIONS,
+        connect_timeout=S3_CONNECT_TIMEOUT,
+        read_timeout=S3_READ_TIMEOUT,
+        tcp_keepalive=True,
+        retries={"max_attempts": 5, "mode": "adaptive"},
+    )
+    return boto3.client("s3", region_name=os.getenv("AWS_REGION", "us-east-1"), config=config)
+
+
+def _make_s3_transfer():
+    import boto3
+    from botocore.config import Config
+
+    config = Config(
+        # every transfer thread holds a connection, plus a few for head/presign calls
+        max_pool_connections=S3_TRANSFER_CONCURRENCY + 4,
+        connect_timeout=S3_CONNECT_TIMEOUT,
+        read_timeout=S3_READ_TIMEOUT,
+        tcp_keepalive=True,
+        retries={"max_attempts": 5, "mode": "adaptive"},
+    )
+    return boto3.client(
+        "s3",
+        region_name=os.getenv("AWS_REGION", "us-east-1"),
+        endpoint_url=S3_ENDPOINT_URL,
+        config=config,
+    )
+
+
+def _make_engine():
+    from sqlalchemy import create_engine
+
+    url = os.getenv("DATABASE_URL")
+    if url and url.startswith("sqlite"):
+        # Local stand-in: SQLite picks its own pool class
+        return create_engine(url, connect_args={"check_same_thread": False})
+
+    return create_engine(
+        url,
+        pool_pre_ping=True,
+        pool_size=DB_POOL_SIZE,
+        max_overflow=DB_MAX_OVERFLOW,
+        pool_timeout=DB_POOL_TIMEOUT,
+        pool_recycle=DB_POOL_RECYCLE_SEC,
+        pool_use_lifo=True,
+        connect_args={
+            "keepalives": 1,
+            "keepalives_idle": 30,
+            "keepalives_interval": 10,
+            "keepalives_count": 5,
+        },
+    )
+
+
+def _make_stripe():
+    import stripe
+
+    stripe.api_key = os.getenv("STRIPE_SECRET_KEY")
+    # Per-request network timeout (SDK default is 80s); async handlers also
+    # bound the whole call, see app/utils/external.py
+    stripe.default_http_client = stripe.RequestsClient(timeout=STRIPE_TIMEOUT_SEC)
+    stripe.max_network_retries = STRIPE_MAX_NETWORK_RETRIES
+    return stripe
+
+
+# ───────────── Accessors ─────────────
+
+def get_redis():
+    return _get("redis", _make_redis)
+
+
+def get_async_redis():
+    return _get("async_redis", _make_async_redis)
+
+
+def get_s3():
+    return _get("s3", _make_s3)
+
+
+def get_s3_transfer():
+    """S3 client for the worker's parallel multipart downloads/uploads."""
+    return _get("s3_transfer", _make_s3_transfer)
+
+
+def get_engine():
+    return _get("engine", _make_engine)
+
+
+def get_stripe():
+    """The stripe module, with api_key configured once."""
+    return _get("stripe", _make_stripe)
+
+
+def pool_stats() -> dict:
+    """Utilisation of every pool created so far (uncreated clients are omitted)."""
+    stats = {}
+
+    redis_client = _clients.get("redis")
+    if redis_client is not None:
+        pool = redis_client.connection_pool
+        stats["redis"] = {
+            "max_connections": pool.max_connections,
+            "created": len(pool._connections),
+            "in_use": pool.max_connections - pool.pool.qsize(),
+        }
+
+    async_redis = _clients.get("async_redis")
+    if async_redis is not None:
+        pool = async_redis.connection_pool
+        stats["async_redis"] = {
+            "max_connections": pool.max_connections,
+            "created": len(pool._available_connections) + len(pool._in_use_connections),
+            "in_use": len(pool._in_use_connections),
+        }
+
+    engine = _clients.get("engine")
+    if engine is not None:
+        pool = engine.pool
+        stats["postgres"] = {"status": pool.status()}
+        if hasattr(pool, "checkedout"):
+            stats["postgres"].update(
+                size=pool.size(),
+                max_overflow=pool._max_overflow,
+                checked_out=pool.checkedout(),
+                checked_in=pool.checkedin(),
+                overflow=pool.overflow(),
+            )
+
+    s3 = _clients.get("s3")
+    if s3 is not None:
+        stats["s3"] = {"max_pool_connections": s3.meta.config.max_pool_connections}
+
+    s3_transfer = _clients.get("s3_transfer")
+    if s3_transfer is not None:
+        stats["s3_transfer"] = {"max_pool_connections": s3_transfer.meta.config.max_pool_connections}
+
+    return stats
+
+
+async def close_async_clients():
+    """Release clients whose close is a coroutine; call before close_all()."""
+    with _lock:
+        client = _clients.pop("async_redis", None)
+    if client is not None:
+        try:
+            await client.aclose()
+        except Exception as e:
+            print(f"⚠️ Failed to close async_redis client: {e}")
+
+
+def close_all():
+    """Release every client created so far (pools, sockets)."""
+    with _lock:
+        clients = dict(_clients)
+        _clients.clear()
+
+    for name, client in clients.items():
+        try:
+            if name == "engine":
+                client.dispose()
+            elif name == "redis":
+                client.connection_pool.disconnect()
+            elif hasattr(client, "close"):
+                client.close()
+        except Exception as e:
+            print(f"⚠️ Failed to close {name} client: {e}")
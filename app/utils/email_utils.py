@@ -5,14 +5,16 @@ import smtplib
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
 
+APP_NAME = "MailSized"
 
-def send_output_email(recipient: str, download_url: str, filename: str):
+
+def send_output_email(recipient: str, download_url: str, filename: str, extra_links: dict | None = None):
     """
     Send a completion email with the download link.
+    `extra_links` maps each additional provider to its own download link.
     Tries Mailgun first; falls back to SMTP if Mailgun fails.
     """
 
-    app_name = "MailSized"
     subject = "Your compressed video is ready 🎬"
     body = f"""
 Hi there,
@@ -21,12 +23,52 @@ Your video "{filename}" has been successfully compressed and is ready for downlo
 
 👉 Download link (valid for 24 hours):
 {download_url}
+"""
+    if extra_links:
+        body += "\nAlso sized for:\n" + "\n".join(
+            f"• {provider.capitalize()}\n  {url}" for provider, url in extra_links.items()
+        ) + "\n"
+    body += f"""
+Thanks for using {APP_NAME}!
+—
+The {APP_NAME} Team
+"""
+    return _send_email(recipient, subject, body)
+
+
+def send_batch_summary_email(recipient: str, items: list[dict]):
+    """
+    One email for a whole batch. `items` are dicts with filename, status and
+    download_url (None for failed files).
+    """
+    done = [i for i in items if i.get("download_url")]
+    failed = [i for i in items if not i.get("download_url")]
 
-Thanks for using {app_name}!
+    subject = f"Your {len(done)} compressed videos are ready 🎬"
+    lines = [f"• {i['filename']}\n  {i['download_url']}" for i in done]
+    body = f"""
+Hi there,
+
+{len(done)} of {len(items)} videos in your batch have been compressed and are ready for download.
+
+👉 Download links (valid for 24 hours):
+
+{chr(10).join(lines)}
+"""
+    if failed:
+        body += "\n⚠️ These files could not be compressed:\n" + "\n".join(
+            f"• {i['filename']}" for i in failed
+        ) + "\n"
+    body += f"""
+Thanks for using {APP_NAME}!
 —
-The {app_name} Team
+The {APP_NAME} Team
 """
+    return _send_email(recipient, subject, body)
+
 
+def _send_email(recipient: str, subject: str, body: str):
+    """Deliver a plain-text email via Mailgun, falling back to SMTP."""
     # ─────────────── Mailgun Config ───────────────
     mailgun_key = os.getenv("MAILGUN_API_KEY")
     mailgun_domain = os.getenv("MAILGUN_DOMAIN")
@@ -45,7 +87,7 @@ The {app_name} Team
                 f"https://api.mailgun.net/v3/{mailgun_domain}/messages",
                 auth=("api", mailgun_key),
                 data={
-                    "from": f"{app_name} <{sender}>",
+                    "from": f"{APP_NAME} <{sender}>",
                     "to": [recipient],
                     "subject": subject,
                     "text": body,
@@ -65,7 +107,7 @@ The {app_name} Team
             return False
 
         msg = MIMEMultipart()
-        msg["From"] = f"{app_name} <{sender}>"
+        msg["From"] = f"{APP_NAME} <{sender}>"
         msg["To"] = recipient
         msg["Subject"] = subject
         msg.attach(MIMEText(body, "plain"))
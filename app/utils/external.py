@@ -0,0 +1,103 @@
+# app/utils/external.py
+"""
+Guarded calls to external services from async request handlers.
+
+A blocking SDK call made directly in an `async def` freezes the event loop —
+and every SSE stream the process serves — for the whole round trip. Here:
+
+  - blocking calls run on a small dedicated thread pool (EXTERNAL_POOL_SIZE),
+    so a slow dependency cannot take over Starlette's shared threadpool
+  - every call is bounded by a timeout
+  - a per-service circuit breaker fails fast after repeated failures, then
+    lets one probe through every `reset_after_sec` until the service recovers
+
+Failures the breaker acts on surface as ServiceUnavailable; handlers turn
+that into a 503.
+"""
+import asyncio
+import functools
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+EXTERNAL_POOL_SIZE = int(os.getenv("EXTERNAL_POOL_SIZE", "16"))
+
+_executor = ThreadPoolExecutor(max_workers=EXTERNAL_POOL_SIZE, thread_name_prefix="external")
+
+
+class ServiceUnavailable(Exception):
+    def __init__(self, service: str, reason: str):
+        self.service = service
+        super().__init__(f"{service} unavailable: {reason}")
+
+
+class CircuitBreaker:
+    """
+    closed → open after `failure_threshold` consecutive failures; open → one
+    probe after `reset_after_sec`. Only touched from the event loop thread.
+    `is_failure` decides which exceptions count (e.g. not a caller's 4xx).
+    """
+
+    def __init__(self, name: str, failure_threshold: int = 5, reset_after_sec: float = 30.0,
+                 is_failure=lambda e: True):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_after_sec = reset_after_sec
+        self.is_failure = is_failure
+        self.failures = 0
+        self.opened_at = None
+        self.probing = False
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        return "half-open" if time.monotonic() - self.opened_at >= self.reset_after_sec else "open"
+
+    def allow(self) -> bool:
+        state = self.state
+        if state == "closed":
+            return True
+        if state == "half-open" and not self.probing:
+            self.probing = True
+            return True
+        return False
+
+    def record_success(self):
+        self.failures, self.opened_at, self.probing = 0, None, False
+
+    def record_failure(self):
+        self.failures += 1
+        self.probing = False
+        if self.opened_at is not None or self.failures >= self.failure_threshold:
+            if self.opened_at is None:
+                print(f"⚡ Circuit for {self.name} opened after {self.failures} failures")
+            self.opened_at = time.monotonic()
+
+
+async def guarded(breaker: CircuitBreaker, timeout: float, make_awaitable):
+    """Await `make_awaitable()` under the breaker and a timeout."""
+    if not breaker.allow():
+        raise ServiceUnavailable(breaker.name, "circuit open")
+    try:
+        result = await asyncio.wait_for(make_awaitable(), timeout)
+    except asyncio.TimeoutError:
+        breaker.record_failure()
+        raise ServiceUnavailable(breaker.name, f"timed out after {timeout:g}s")
+    except Exception as e:
+        if breaker.is_failure(e):
+            breaker.record_failure()
+        else:
+            breaker.record_success()
+        raise
+    breaker.record_success()
+    return result
+
+
+async def run_blocking(breaker: CircuitBreaker, timeout: float, fn, *args, **kwargs):
+    """Run a blocking call on the external pool without holding the event loop."""
+    loop = asyncio.get_running_loop()
+    return await guarded(
+        breaker, timeout,
+        lambda: loop.run_in_executor(_executor, functools.partial(fn, *args, **kwargs)),
+    )
@@ -0,0 +1,109 @@
+# app/utils/page_cache.py
+import gzip
+import hashlib
+import json
+from threading import Lock
+from fastapi import Request
+from fastapi.responses import Response
+from jinja2 import Environment
+
+try:
+    import brotli
+except ImportError:  # brotli is optional; gzip still covers every browser
+    brotli = None
+
+CACHE_CONTROL = "public, max-age=300, must-revalidate"
+
+
+class CachedPage:
+    """
+    One rendered template with its precompressed variants. Each variant has
+    its own strong ETag ("<hash>", "<hash>-gzip", "<hash>-br"): the bytes
+    differ, so a cache must never treat one as a revalidated copy of another.
+    """
+
+    def __init__(self, html: str):
+        self.identity = html.encode("utf-8")
+        self.gzip = gzip.compress(self.identity, compresslevel=9, mtime=0)
+        self.br = brotli.compress(self.identity, quality=11) if brotli else None
+        digest = hashlib.sha256(self.identity).hexdigest()[:32]
+        self.etags = {None: f'"{digest}"', "gzip": f'"{digest}-gzip"', "br": f'"{digest}-br"'}
+
+    def variant(self, accepted: set[str]) -> tuple[bytes, str | None]:
+        """(body, Content-Encoding) best matching the client's accepted codings."""
+        if self.br is not None and "br" in accepted:
+            return self.br, "br"
+        if "gzip" in accepted:
+            return self.gzip, "gzip"
+        return self.identity, None
+
+
+def accepted_encodings(header: str) -> set[str]:
+    """Content codings from an Accept-Encoding header, minus any with q=0."""
+    accepted = set()
+    for part in header.split(","):
+        name, _, params = part.strip().partition(";")
+        params = params.strip().replace(" ", "")
+        if params.startswith("q="):
+            try:
+                if float(params[2:]) == 0:
+                    continue
+            except ValueError:
+                continue
+        accepted.add(name.strip().lower())
+    return accepted
+
+
+def _etag_matches(request: Request, etag: str) -> bool:
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+    # If-None-Match uses the weak comparison: W/"x" matches "x"
+    return etag in {t.strip().removeprefix("W/") for t in header.split(",")}
+
+
+class PageCache:
+    """
+    Renders each (template, context) pair once and serves it from memory.
+    Context values must be JSON-serialisable; they form part of the cache key,
+    so a configuration change simply produces a new entry.
+    """
+
+    def __init__(self, env: Environment):
+        self.env = env
+        self._pages: dict[str, CachedPage] = {}
+        self._lock = Lock()
+
+    def get(self, template_name: str, **context) -> CachedPage:
+        key = template_name + "|" + json.dumps(context, sort_keys=True)
+        page = self._pages.get(key)
+        if page is None:
+            with self._lock:
+                page = self._pages.get(key)
+                if page is None:
+                    html = self.env.get_template(template_name).render(**context)
+                    page = CachedPage(html)
+                    self._pages[key] = page
+        return page
+
+    def response(self, request: Request, template_name: str, **context) -> Response:
+        page = self.get(template_name, **context)
+        body, encoding = page.variant(accepted_encodings(request.headers.get("accept-encoding", "")))
+        headers = {
+            "ETag": page.etags[encoding],
+            "Cache-Control": CACHE_CONTROL,
+            "Vary": "Accept-Encoding",
+        }
+
+        if _etag_matches(request, headers["ETag"]):
+            return Response(status_code=304, headers=headers)
+        if encoding:
+            headers["Content-Encoding"] = encoding
+
+        return Response(content=body, media_type="text/html; charset=utf-8", headers=headers)
+
+    def clear(self):
+        with self._lock:
+            self._pages.clear()
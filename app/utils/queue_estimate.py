@@ -0,0 +1,133 @@
+# app/utils/queue_estimate.py
+"""
+Queue wait-time estimator.
+
+Replays the Redis queue (FIFO, as the workers consume it) against the live
+workers: each worker heartbeats into WORKERS_KEY with when it expects to be
+free and its measured seconds of work per second of video. The replay gives
+every queued job an estimated start and completion time; a job that is not
+queued yet is placed at the tail.
+
+One schedule is computed per process every few seconds and shared by all
+callers, so SSE streams polling it stay cheap.
+"""
+import json
+import math
+import os
+import time
+from threading import Lock
+from app.utils.clients import get_redis
+from app.utils.redis_utils import QUEUE_NAME, WORKERS_KEY
+
+WORKER_HEARTBEAT_TTL_SEC = 60
+# Used until workers have measured themselves, and as the fleet size floor
+DEFAULT_SEC_PER_MEDIA_SEC = float(os.getenv("DEFAULT_SEC_PER_MEDIA_SEC", "0.5"))
+ESTIMATE_MIN_WORKERS = int(os.getenv("ESTIMATE_MIN_WORKERS", "1"))
+# Autoscaling goal: drain the current backlog within this many seconds
+TARGET_QUEUE_WAIT_SEC = float(os.getenv("TARGET_QUEUE_WAIT_SEC", "600"))
+SCHEDULE_CACHE_SEC = 2.0
+
+
+class QueueSchedule:
+    def __init__(self, now: float, worker_free_at: list[float], sec_per_media_sec: float,
+                 starts: dict, finishes: dict, depth: int, backlog_media_sec: float):
+        self.now = now
+        self.worker_free_at = worker_free_at  # when each worker frees up after the replay
+        self.sec_per_media_sec = sec_per_media_sec
+        self.starts = starts
+        self.finishes = finishes
+        self.depth = depth
+        self.backlog_media_sec = backlog_media_sec
+
+    def estimate(self, upload_id: str | None = None, duration_sec: float = 0.0) -> dict:
+        """Estimate for a queued job, or for a new one of `duration_sec` at the tail."""
+        if upload_id in self.starts:
+            start, finish = self.starts[upload_id], self.finishes[upload_id]
+        else:
+            start = min(self.worker_free_at)
+            finish = start + duration_sec * self.sec_per_media_sec
+        return {
+            "queue_depth": self.depth,
+            "workers": len(self.worker_free_at),
+            "start_in_sec": round(max(0.0, start - self.now)),
+            "complete_in_sec": round(max(0.0, finish - self.now)),
+            "estimated_start_at": int(start),
+            "estimated_completion_at": int(finish),
+        }
+
+    def tail_wait_sec(self) -> float:
+        return max(0.0, min(self.worker_free_at) - self.now)
+
+    def recommended_workers(self) -> int:
+        """Workers needed to finish the whole backlog within TARGET_QUEUE_WAIT_SEC."""
+        work_sec = self.backlog_media_sec * self.sec_per_media_sec
+        return max(ESTIMATE_MIN_WORKERS, math.ceil(work_sec / TARGET_QUEUE_WAIT_SEC))
+
+
+def _live_workers(redis_client, now: float) -> list[dict]:
+    workers, stale = [], []
+    for worker_id, raw in redis_client.hgetall(WORKERS_KEY).items():
+        try:
+            beat = json.loads(raw)
+        except ValueError:
+            stale.append(worker_id)
+            continue
+        if now - beat.get("ts", 0) > WORKER_HEARTBEAT_TTL_SEC:
+            stale.append(worker_id)
+        else:
+            workers.append(beat)
+    if stale:
+        redis_client.hdel(WORKERS_KEY, *stale)
+    return workers
+
+
+def build_schedule() -> QueueSchedule:
+    redis_client = get_redis()
+    now = time.time()
+    workers = _live_workers(redis_client, now)
+
+    ratios = [w["sec_per_media_sec"] for w in workers if w.get("sec_per_media_sec")]
+    sec_per_media_sec = sum(ratios) / len(ratios) if ratios else DEFAULT_SEC_PER_MEDIA_SEC
+
+    free_at = [max(now, w.get("busy_until") or now) for w in workers]
+    free_at += [now] * max(0, ESTIMATE_MIN_WORKERS - len(free_at))
+
+    starts, finishes = {}, {}
+    backlog_media_sec = 0.0
+    queued = redis_client.lrange(QUEUE_NAME, 0, -1)
+    for raw in queued:
+        try:
+            job = json.loads(raw)
+        except ValueError:
+            continue
+        duration = float(job.get("duration_sec") or 0)
+        backlog_media_sec += duration
+
+        i = min(range(len(free_at)), key=free_at.__getitem__)
+        start = free_at[i]
+        free_at[i] = start + duration * sec_per_media_sec
+        starts[job.get("upload_id")] = start
+        finishes[job.get("upload_id")] = free_at[i]
+
+    return QueueSchedule(now, free_at, sec_per_media_sec, starts, finishes, len(queued), backlog_media_sec)
+
+
+_cached: QueueSchedule | None = None
+_cache_lock = Lock()
+
+
+def current_schedule() -> QueueSchedule:
+    global _cached
+    with _cache_lock:
+        if _cached is None or time.time() - _cached.now > SCHEDULE_CACHE_SEC:
+            _cached = build_schedule()
+        return _cached
+
+
+def estimate_wait(upload_id: str | None = None, duration_sec: float = 0.0) -> dict | None:
+    """Estimate dict, or None when Redis is unavailable (never fails a request)."""
+    try:
+        return current_schedule().estimate(upload_id, duration_sec)
+    except Exception as e:
+        print(f"⚠️ Queue estimate unavailable: {e}")
+        return None
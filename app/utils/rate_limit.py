@@ -0,0 +1,226 @@
+# app/utils/rate_limit.py
+"""
+Redis-backed admission control shared by every API process:
+  - RateLimit: token bucket per client IP or per upload_id (FastAPI dependency)
+  - acquire_sse_slot(): caps concurrent /events streams per IP and overall,
+    using per-connection leases that expire unless the stream renews them
+  - QueueBackpressure: rejects new work while the worker queue is too deep or
+    the estimated wait for a new job is too long
+
+Limits fail open: if Redis is unreachable requests are let through, since the
+limiter must never be the thing that takes the site down.
+"""
+import math
+import os
+import time
+import uuid
+from fastapi import HTTPException, Request
+from app.utils.clients import get_redis
+from app.utils.redis_utils import QUEUE_NAME
+from app.utils.queue_estimate import current_schedule
+
+RATE_LIMIT_ENABLED = os.getenv("RATE_LIMIT_ENABLED", "1") == "1"
+SSE_MAX_PER_IP = int(os.getenv("SSE_MAX_PER_IP", "5"))
+SSE_MAX_TOTAL = int(os.getenv("SSE_MAX_TOTAL", "500"))
+# A lease not renewed within SSE_LEASE_TTL_SEC (killed process, stream that
+# never started) simply ages out of the ZSETs
+SSE_LEASE_TTL_SEC = 90
+SSE_LEASE_RENEW_SEC = 30
+SSE_TOTAL_KEY = "sse:leases"
+# Number of proxies in front of the app that append to X-Forwarded-For (the ALB)
+TRUSTED_PROXY_COUNT = int(os.getenv("TRUSTED_PROXY_COUNT", "1"))
+MAX_QUEUE_DEPTH = int(os.getenv("MAX_QUEUE_DEPTH", "200"))
+MAX_QUEUE_WAIT_SEC = float(os.getenv("MAX_QUEUE_WAIT_SEC", "3600"))
+BACKPRESSURE_RETRY_AFTER_SEC = int(os.getenv("BACKPRESSURE_RETRY_AFTER_SEC", "60"))
+
+# KEYS[1] bucket · ARGV rate/s, burst, now, cost → {allowed, retry_after}
+TOKEN_BUCKET_LUA = """
+local rate = tonumber(ARGV[1])
+local burst = tonumber(ARGV[2])
+local now = tonumber(ARGV[3])
+local cost = tonumber(ARGV[4])
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(state[1]) or burst
+local ts = tonumber(state[2]) or now
+tokens = math.min(burst, tokens + math.max(0, now - ts) * rate)
+local allowed = 0
+local retry_after = 0
+if tokens >= cost then
+  tokens = tokens - cost
+  allowed = 1
+else
+  retry_after = (cost - tokens) / rate
+end
+redis.call('HSET', KEYS[1], 'tokens', tokens, 'ts', now)
+redis.call('EXPIRE', KEYS[1], math.ceil(burst / rate) + 1)
+return {allowed, tostring(retry_after)}
+"""
+
+# KEYS[1] per-IP leases, KEYS[2] all leases (ZSETs scored by expiry)
+# ARGV now, expires_at, lease id, max per IP, max total, key ttl → 0 ok, 1 IP full, 2 full
+SSE_ACQUIRE_LUA = """
+local now = tonumber(ARGV[1])
+redis.call('ZREMRANGEBYSCORE', KEYS[1], '-inf', now)
+redis.call('ZREMRANGEBYSCORE', KEYS[2], '-inf', now)
+if redis.call('ZCARD', KEYS[1]) >= tonumber(ARGV[4]) then
+  return 1
+end
+if redis.call('ZCARD', KEYS[2]) >= tonumber(ARGV[5]) then
+  return 2
+end
+redis.call('ZADD', KEYS[1], ARGV[2], ARGV[3])
+redis.call('ZADD', KEYS[2], ARGV[2], ARGV[3])
+redis.call('EXPIRE', KEYS[1], ARGV[6])
+redis.call('EXPIRE', KEYS[2], ARGV[6])
+return 0
+"""
+
+_token_bucket = None
+_sse_acquire = None
+
+
+def client_ip(request: Request) -> str:
+    """
+    The address our own proxies saw: counting TRUSTED_PROXY_COUNT hops back
+    from the end of X-Forwarded-For. Earlier hops are client-supplied and
+    could be rotated to dodge per-IP limits. Falls back to the peer.
+    """
+    forwarded = request.headers.get("x-forwarded-for")
+    if forwarded and TRUSTED_PROXY_COUNT > 0:
+        hops = [hop.strip() for hop in forwarded.split(",") if hop.strip()]
+        if hops:
+            return hops[-min(TRUSTED_PROXY_COUNT, len(hops))]
+    return request.client.host if request.client else "unknown"
+
+
+def take_token(bucket: str, rate_per_min: float, burst: int, cost: int = 1) -> float:
+    """Spend from a bucket; returns 0 if allowed, else seconds until retry."""
+    global _token_bucket
+    if _token_bucket is None:
+        _token_bucket = get_redis().register_script(TOKEN_BUCKET_LUA)
+    allowed, retry_after = _token_bucket(
+        keys=[f"ratelimit:{bucket}"],
+        args=[rate_per_min / 60.0, burst, time.time(), cost],
+    )
+    return 0.0 if int(allowed) == 1 else float(retry_after)
+
+
+def _too_many(retry_after: float, detail: str):
+    raise HTTPException(
+        status_code=429,
+        detail=detail,
+        headers={"Retry-After": str(max(1, math.ceil(retry_after)))},
+    )
+
+
+class RateLimit:
+    """
+    Dependency: `Depends(RateLimit("upload", 20, 10))` limits per client IP;
+    `per="job_id"` limits per value of that path parameter instead.
+    """
+
+    def __init__(self, name: str, rate_per_min: float, burst: int, per: str = "ip"):
+        self.name = name
+        self.rate_per_min = rate_per_min
+        self.burst = burst
+        self.per = per
+
+    def __call__(self, request: Request):
+        if not RATE_LIMIT_ENABLED:
+            return
+        subject = client_ip(request) if self.per == "ip" else request.path_params.get(self.per, "")
+        try:
+            retry_after = take_token(f"{self.name}:{self.per}:{subject}", self.rate_per_min, self.burst)
+        except Exception as e:
+            print(f"⚠️ Rate limiter unavailable ({self.name}): {e}")
+            return
+        if retry_after:
+            _too_many(retry_after, "Too many requests. Please slow down.")
+
+
+class SseLease:
+    """One stream's slot: a member of the per-IP and global lease ZSETs."""
+
+    def __init__(self, ip_key: str):
+        self.ip_key = ip_key
+        self.lease_id = uuid.uuid4().hex
+        self.renewed_at = time.time()
+
+    def renew_due(self) -> bool:
+        return time.time() - self.renewed_at >= SSE_LEASE_RENEW_SEC
+
+
+def acquire_sse_slot(request: Request) -> SseLease | None:
+    """
+    Lease one concurrent-stream slot for the client's IP, raising 429 when
+    the per-IP or global cap is hit. Returns a handle for renew_sse_slot()
+    (call it while streaming) and release_sse_slot().
+    """
+    global _sse_acquire
+    if not RATE_LIMIT_ENABLED:
+        return None
+
+    lease = SseLease(f"sse:ip:{client_ip(request)}")
+    try:
+        if _sse_acquire is None:
+            _sse_acquire = get_redis().register_script(SSE_ACQUIRE_LUA)
+        now = time.time()
+        refused = int(_sse_acquire(
+            keys=[lease.ip_key, SSE_TOTAL_KEY],
+            args=[now, now + SSE_LEASE_TTL_SEC, lease.lease_id, SSE_MAX_PER_IP, SSE_MAX_TOTAL, math.ceil(SSE_LEASE_TTL_SEC)],
+        ))
+    except Exception as e:
+        print(f"⚠️ SSE limiter unavailable: {e}")
+        return None
+
+    if refused:
+        _too_many(5, "Too many open progress streams.")
+    return lease
+
+
+def renew_sse_slot(lease: SseLease | None):
+    """Push the lease's expiry forward; a stream that stops renewing loses its slot."""
+    if lease is None:
+        return
+    lease.renewed_at = time.time()
+    expires_at = lease.renewed_at + SSE_LEASE_TTL_SEC
+    try:
+        pipe = get_redis().pipeline()
+        for key in (lease.ip_key, SSE_TOTAL_KEY):
+            pipe.zadd(key, {lease.lease_id: expires_at}, xx=True)
+            pipe.expire(key, math.ceil(SSE_LEASE_TTL_SEC))
+        pipe.execute()
+    except Exception as e:
+        print(f"⚠️ Failed to renew SSE slot: {e}")
+
+
+def release_sse_slot(lease: SseLease | None):
+    if lease is None:
+        return
+    try:
+        pipe = get_redis().pipeline()
+        pipe.zrem(lease.ip_key, lease.lease_id)
+        pipe.zrem(SSE_TOTAL_KEY, lease.lease_id)
+        pipe.execute()
+    except Exception as e:
+        print(f"⚠️ Failed to release SSE slot: {e}")
+
+
+class QueueBackpressure:
+    """Dependency: 503 + Retry-After while the queue is too deep or too slow to start."""
+
+    def __call__(self):
+        if not RATE_LIMIT_ENABLED:
+            return
+        try:
+            depth = get_redis().llen(QUEUE_NAME)
+            wait_sec = current_schedule().tail_wait_sec() if depth else 0.0
+        except Exception as e:
+            print(f"⚠️ Queue depth unavailable: {e}")
+            return
+        if depth >= MAX_QUEUE_DEPTH or wait_sec > MAX_QUEUE_WAIT_SEC:
+            raise HTTPException(
+                status_code=503,
+                detail="We're busy right now. Please try again shortly.",
+                headers={"Retry-After": str(BACKPRESSURE_RETRY_AFTER_SEC)},
+            )
@@ -1,28 +1,24 @@
 # app/utils/redis_utils.py
-import os
 import json
-import redis
-from urllib.parse import urlparse
+import os
+from app.utils.clients import get_async_redis, get_redis
+from app.utils.external import CircuitBreaker, guarded
 
-# ───────────────────────────────────────────────
-# Redis Connection (works for local & prod)
-# ───────────────────────────────────────────────
-redis_url = urlparse(os.getenv("REDIS_URL", "redis://localhost:6379/0"))
+QUEUE_NAME = "mailsized_jobs"
+WORKERS_KEY = "mailsized_workers"  # hash: worker id → JSON heartbeat (see queue_estimate)
 
-redis_client = redis.Redis(
-    host=redis_url.hostname,
-    port=redis_url.port or 6379,
-    db=0,
-    decode_responses=True,
-)
+# Async handlers enqueue through the asyncio client under this bound
+REDIS_ENQUEUE_TIMEOUT_SEC = float(os.getenv("REDIS_ENQUEUE_TIMEOUT_SEC", "3"))
+REDIS_BREAKER = CircuitBreaker("redis")
 
-QUEUE_NAME = "mailsized_jobs"
 
-def enqueue_job(upload_id, filename, duration, size, provider, email, priority=False):
-    """
-    Push a new job into the Redis queue for the worker.
-    The worker will later fetch this and perform compression + email.
-    """
+def split_providers(value: str | None) -> list[str]:
+    """Job.extra_providers column → list."""
+    return [p for p in (value or "").split(",") if p]
+
+
+def _job_payload(upload_id, filename, duration, size, provider, email, priority=False, batch_id=None,
+                 extra_providers=None):
     job = {
         "upload_id": upload_id,
         "filename": filename,
@@ -32,9 +28,66 @@ def enqueue_job(upload_id, filename, duration, size, provider, email, priority=F
         "email": email,
         "priority": priority,
     }
+    if batch_id:
+        job["batch_id"] = batch_id
+    if extra_providers:
+        job["extra_providers"] = list(extra_providers)
+    return json.dumps(job)
+
+
+def enqueue_job(upload_id, filename, duration, size, provider, email, priority=False,
+                extra_providers=None) -> bool:
+    """
+    Push a new job into the Redis queue for the worker.
+    The worker will later fetch this and perform compression + email.
+    """
+    try:
+        get_redis().rpush(
+            QUEUE_NAME,
+            _job_payload(
+                upload_id, filename, duration, size, provider, email, priority,
+                extra_providers=extra_providers,
+            ),
+        )
+        print(f"📩 Queued job {upload_id} → Redis queue '{QUEUE_NAME}' (email={email})")
+        return True
+    except Exception as e:
+        print(f"❌ Failed to enqueue job {upload_id}: {e}")
+        return False
 
+
+def enqueue_jobs(jobs) -> bool:
+    """Push many Job rows onto the queue with a single RPUSH round trip."""
+    if not jobs:
+        return True
+    payloads = [
+        _job_payload(
+            j.upload_id, j.filename, j.duration_sec, j.size_bytes,
+            j.provider, j.email, j.priority, j.batch_id, split_providers(j.extra_providers),
+        )
+        for j in jobs
+    ]
+    try:
+        get_redis().rpush(QUEUE_NAME, *payloads)
+        print(f"📩 Queued {len(payloads)} jobs → Redis queue '{QUEUE_NAME}'")
+        return True
+    except Exception as e:
+        print(f"❌ Failed to enqueue {len(payloads)} jobs: {e}")
+        return False
+
+
+async def enqueue_job_async(upload_id, filename, duration, size, provider, email, priority=False,
+                            extra_providers=None) -> bool:
+    """enqueue_job() for async handlers: awaits Redis instead of blocking the event loop."""
+    payload = _job_payload(
+        upload_id, filename, duration, size, provider, email, priority,
+        extra_providers=extra_providers,
+    )
     try:
-        redis_client.rpush(QUEUE_NAME, json.dumps(job))
+        await guarded(REDIS_BREAKER, REDIS_ENQUEUE_TIMEOUT_SEC, lambda: get_async_redis().rpush(QUEUE_NAME, payload))
         print(f"📩 Queued job {upload_id} → Redis queue '{QUEUE_NAME}' (email={email})")
+        return True
     except Exception as e:
         print(f"❌ Failed to enqueue job {upload_id}: {e}")
+        return False
+
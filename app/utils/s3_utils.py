@@ -1,10 +1,10 @@
 # app/utils/s3_utils.py
-import boto3
 import os
 import os.path
 from uuid import uuid4
 from datetime import datetime, timedelta
 from dotenv import load_dotenv
+from app.utils.clients import get_s3
 
 load_dotenv()
 
@@ -14,11 +14,12 @@ OUTPUTS_BUCKET = os.getenv("OUTPUTS_BUCKET")
 UPLOAD_EXPIRY_SEC = 300  # 5 minutes
 DOWNLOAD_EXPIRY_SEC = 3600  # 1 hour
 
-print("✅ DEBUG AWS_REGION:", AWS_REGION)
-print("✅ DEBUG UPLOADS_BUCKET:", UPLOADS_BUCKET)
-print("✅ DEBUG OUTPUTS_BUCKET:", OUTPUTS_BUCKET)
-
-s3_client = boto3.client("s3", region_name=AWS_REGION)
+# Multipart uploads: S3 needs parts ≥ 5 MB (except the last) and ≤ 10,000 parts
+PART_URL_EXPIRY_SEC = 3600  # 1 hour per batch of part URLs
+MIN_PART_SIZE_BYTES = 16 * 1024 * 1024  # 16 MB
+MAX_PARTS = 10_000
+# Files above this go up in parts (MULTIPART_THRESHOLD in static/script.js)
+MULTIPART_THRESHOLD_BYTES = 64 * 1024 * 1024  # 64 MB
 
 
 # ───────────────────────────────
@@ -27,7 +28,7 @@ s3_client = boto3.client("s3", region_name=AWS_REGION)
 def generate_presigned_upload_url(upload_id: str, content_type: str = "video/mp4") -> str:
     object_key = f"uploads/{upload_id}.mp4"
     try:
-        url = s3_client.generate_presigned_url(
+        url = get_s3().generate_presigned_url(
             "put_object",
             Params={
                 "Bucket": UPLOADS_BUCKET,
@@ -46,6 +47,102 @@ def s3_upload_key(upload_id: str) -> str:
     return f"uploads/{upload_id}.mp4"
 
 
+# ───────────────────────────────
+# Multipart Upload (parallel, resumable)
+# ───────────────────────────────
+def multipart_part_size(size_bytes: int) -> int:
+    return max(MIN_PART_SIZE_BYTES, -(-size_bytes // MAX_PARTS))
+
+
+def create_multipart_upload(upload_id: str, content_type: str = "video/mp4") -> str:
+    """Start a multipart upload for uploads/{upload_id}.mp4 and return S3's UploadId."""
+    resp = get_s3().create_multipart_upload(
+        Bucket=UPLOADS_BUCKET,
+        Key=s3_upload_key(upload_id),
+        ContentType=content_type,
+    )
+    return resp["UploadId"]
+
+
+def generate_presigned_part_urls(upload_id: str, s3_upload_id: str, part_numbers: list[int]) -> list[dict]:
+    s3 = get_s3()
+    return [
+        {
+            "part_number": n,
+            "url": s3.generate_presigned_url(
+                "upload_part",
+                Params={
+                    "Bucket": UPLOADS_BUCKET,
+                    "Key": s3_upload_key(upload_id),
+                    "UploadId": s3_upload_id,
+                    "PartNumber": n,
+                },
+                ExpiresIn=PART_URL_EXPIRY_SEC,
+            ),
+        }
+        for n in part_numbers
+    ]
+
+
+def list_uploaded_parts(upload_id: str, s3_upload_id: str) -> list[dict]:
+    """Parts S3 already has, so an interrupted upload only resends the rest."""
+    paginator = get_s3().get_paginator("list_parts")
+    parts = []
+    for page in paginator.paginate(
+        Bucket=UPLOADS_BUCKET, Key=s3_upload_key(upload_id), UploadId=s3_upload_id
+    ):
+        parts.extend(
+            {"part_number": p["PartNumber"], "etag": p["ETag"], "size": p["Size"]}
+            for p in page.get("Parts", [])
+        )
+    return parts
+
+
+def complete_multipart_upload(upload_id: str, s3_upload_id: str, parts: list[dict]):
+    get_s3().complete_multipart_upload(
+        Bucket=UPLOADS_BUCKET,
+        Key=s3_upload_key(upload_id),
+        UploadId=s3_upload_id,
+        MultipartUpload={
+            "Parts": [
+                {"PartNumber": p["part_number"], "ETag": p["etag"]}
+                for p in sorted(parts, key=lambda p: p["part_number"])
+            ]
+        },
+    )
+
+
+def abort_multipart_upload(upload_id: str, s3_upload_id: str):
+    get_s3().abort_multipart_upload(
+        Bucket=UPLOADS_BUCKET, Key=s3_upload_key(upload_id), UploadId=s3_upload_id
+    )
+
+
+def abort_stale_multipart_uploads(initiated_before: datetime, dry_run: bool = False) -> int:
+    """
+    Abort multipart uploads under uploads/ started before `initiated_before`.
+    Parts of an abandoned upload are billed until aborted and never show up
+    as objects, so nothing else would delete them. Returns the number aborted
+    (or that would be, with dry_run).
+    """
+    s3 = get_s3()
+    aborted = 0
+    for page in s3.get_paginator("list_multipart_uploads").paginate(Bucket=UPLOADS_BUCKET, Prefix="uploads/"):
+        for upload in page.get("Uploads", []):
+            if upload["Initiated"].replace(tzinfo=None) >= initiated_before:
+                continue
+            if not dry_run:
+                try:
+                    s3.abort_multipart_upload(
+                        Bucket=UPLOADS_BUCKET, Key=upload["Key"], UploadId=upload["UploadId"]
+                    )
+                except Exception as e:
+                    print(f"⚠️ Could not abort multipart upload {upload['Key']}: {e}")
+                    continue
+            aborted += 1
+    return aborted
+
+
 # ───────────────────────────────
 # Generate Presigned Download URL
 # ───────────────────────────────
@@ -57,7 +154,7 @@ def generate_presigned_download_url(output_key: str) -> str:
     """
     try:
         filename = os.path.basename(output_key)
-        url = s3_client.generate_presigned_url(
+        url = get_s3().generate_presigned_url(
             "get_object",
             Params={
                 "Bucket": OUTPUTS_BUCKET,
@@ -71,3 +168,31 @@ def generate_presigned_download_url(output_key: str) -> str:
     except Exception as e:
         print(f"⚠️ Error generating presigned download URL: {e}")
         return None
+
+
+# ───────────────────────────────
+# Batched Delete
+# ───────────────────────────────
+DELETE_BATCH_MAX_KEYS = 1000  # DeleteObjects limit per request
+
+
+def delete_objects(bucket: str, keys: list[str]) -> tuple[set[str], dict[str, str]]:
+    """
+    Delete keys with DeleteObjects, up to 1000 per request.
+    Returns (deleted keys, {key: error message}). Missing keys count as deleted.
+    """
+    deleted, errors = set(), {}
+    for i in range(0, len(keys), DELETE_BATCH_MAX_KEYS):
+        chunk = keys[i:i + DELETE_BATCH_MAX_KEYS]
+        try:
+            resp = get_s3().delete_objects(
+                Bucket=bucket,
+                Delete={"Objects": [{"Key": k} for k in chunk], "Quiet": True},
+            )
+        except Exception as e:
+            errors.update({k: str(e) for k in chunk})
+            continue
+        failed = {err["Key"]: err.get("Message", err.get("Code", "")) for err in resp.get("Errors", [])}
+        errors.update(failed)
+        deleted.update(k for k in chunk if k not in failed)
+    return deleted, errors
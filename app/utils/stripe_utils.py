@@ -1,17 +1,40 @@
 # app/utils/stripe_utils.py
-import stripe
 import os
+import time
+from app.utils.clients import STRIPE_TIMEOUT_SEC, get_stripe
+from app.utils.external import CircuitBreaker, run_blocking
 
-stripe.api_key = os.getenv("STRIPE_SECRET_KEY")
 
-def create_checkout_session(upload_id: str, email: str, amount_cents: int, token_obj=None):
+def _stripe_outage(e: Exception) -> bool:
+    # Network errors carry no status; 4xx (bad params, rate limits) mean Stripe is up
+    status = getattr(e, "http_status", None)
+    return status is None or status >= 500
+
+
+STRIPE_BREAKER = CircuitBreaker("stripe", is_failure=_stripe_outage)
+# A promo code is reserved while its session is open, so keep sessions short
+# (Stripe's minimum is 30 minutes); checkout.session.expired gives the use back.
+CHECKOUT_SESSION_EXPIRY_SEC = max(1800, int(os.getenv("CHECKOUT_SESSION_EXPIRY_SEC", "1800")))
+# Whole call incl. SDK retries; beyond it the request gets a 503 instead of waiting
+STRIPE_CALL_TIMEOUT_SEC = float(os.getenv("STRIPE_CALL_TIMEOUT_SEC", str(STRIPE_TIMEOUT_SEC * 2)))
+
+
+def create_checkout_session(
+    upload_id: str | None,
+    email: str,
+    amount_cents: int,
+    token_obj=None,
+    batch_id: str | None = None,
+    file_count: int = 1,
+):
     BASE = os.getenv("PUBLIC_BASE_URL", "https://mailsized.com").rstrip("/")
     if not BASE:
         raise RuntimeError("PUBLIC_BASE_URL is not set")
 
-    # ✅ include upload_id so the front-end knows what to resume
-    success_url = f"{BASE}/?paid=1&upload_id={upload_id}"
-    cancel_url  = f"{BASE}/?cancel=1&upload_id={upload_id}"
+    # ✅ include upload_id (or batch_id) so the front-end knows what to resume
+    resume = f"batch_id={batch_id}" if batch_id else f"upload_id={upload_id}"
+    success_url = f"{BASE}/?paid=1&{resume}"
+    cancel_url  = f"{BASE}/?cancel=1&{resume}"
 
     discount_percent = 0
     token_code = ""
@@ -29,24 +52,35 @@ def create_checkout_session(upload_id: str, email: str, amount_cents: int, token
     if 0 < discounted_amount < 50:
         discounted_amount = 50
 
-    session = stripe.checkout.Session.create(
+    session = get_stripe().checkout.Session.create(
         payment_method_types=["card"],
         mode="payment",
         line_items=[{
             "price_data": {
                 "currency": "usd",
-                "product_data": {"name": "MailSized Compression"},
+                "product_data": {
+                    "name": f"MailSized Compression ({file_count} videos)" if batch_id else "MailSized Compression"
+                },
                 "unit_amount": discounted_amount,
             },
             "quantity": 1,
         }],
         metadata={
-            "upload_id": upload_id,
+            "upload_id": upload_id or "",
+            "batch_id": batch_id or "",
             "token_used": token_code,
+            # the handler redeemed the code before creating the session
+            "token_reserved": "1" if token_code else "",
             "discount_percent": discount_percent,
         },
+        expires_at=int(time.time()) + CHECKOUT_SESSION_EXPIRY_SEC,
         customer_email=email,
         success_url=success_url,
         cancel_url=cancel_url,
     )
     return session
+
+
+async def create_checkout_session_async(**kwargs):
+    """create_checkout_session() for async handlers (off the event loop, with timeout and breaker)."""
+    return await run_blocking(STRIPE_BREAKER, STRIPE_CALL_TIMEOUT_SEC, create_checkout_session, **kwargs)
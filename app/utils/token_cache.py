@@ -0,0 +1,122 @@
+# app/utils/token_cache.py
+"""
+Short-lived per-process cache of promo token lookups.
+
+During a campaign every /api/pay request validates the same code; serving
+that from memory keeps the validation reads off the token row, which the
+redemption UPDATE (repo.use_token) already serialises on. Unknown codes are
+cached too, so guessing codes cannot hammer the DB.
+
+The cache only ever gates the fast path: redemption is decided by the
+conditional UPDATE, and its RETURNING row refreshes the cached entry.
+
+Checkout reserves a code per job or batch (see repo.hold_token), so coming
+back to checkout after a cancel reuses the use already taken.
+"""
+import os
+import time
+from threading import Lock
+from typing import NamedTuple
+from app import repo
+
+TOKEN_CACHE_SEC = float(os.getenv("TOKEN_CACHE_SEC", "10"))
+TOKEN_CACHE_MAX_ENTRIES = 10_000
+
+
+class TokenInfo(NamedTuple):
+    code: str
+    discount_percent: int
+    usage_limit: int
+    usage_count: int
+
+    @property
+    def exhausted(self) -> bool:
+        return self.usage_count >= self.usage_limit
+
+
+_cache: dict[str, tuple[float, TokenInfo | None]] = {}
+_lock = Lock()
+
+
+def _store(code: str, info: TokenInfo | None):
+    with _lock:
+        if len(_cache) >= TOKEN_CACHE_MAX_ENTRIES:
+            now = time.monotonic()
+            for key in [k for k, (at, _) in _cache.items() if now - at > TOKEN_CACHE_SEC]:
+                del _cache[key]
+            if len(_cache) >= TOKEN_CACHE_MAX_ENTRIES:
+                _cache.clear()
+        _cache[code] = (time.monotonic(), info)
+
+
+def lookup_token(db, code: str) -> TokenInfo | None:
+    """Token details for validation, at most TOKEN_CACHE_SEC old; None if unknown."""
+    with _lock:
+        hit = _cache.get(code)
+    if hit and time.monotonic() - hit[0] < TOKEN_CACHE_SEC:
+        return hit[1]
+
+    token = repo.get_token(db, code)
+    info = None
+    if token:
+        info = TokenInfo(
+            token.code, int(token.discount_percent or 0), token.usage_limit or 0, token.usage_count or 0,
+        )
+    _store(code, info)
+    return info
+
+
+def redeem_token(db, code: str) -> TokenInfo | None:
+    """repo.use_token() that keeps the cache current; None when exhausted or unknown."""
+    row = repo.use_token(db, code)
+    if row is None:
+        with _lock:
+            hit = _cache.get(code)
+        if hit and hit[1] is not None:
+            _store(code, hit[1]._replace(usage_count=hit[1].usage_limit))
+        return None
+    info = TokenInfo(row.code, int(row.discount_percent or 0), row.usage_limit, row.usage_count)
+    _store(code, info)
+    return info
+
+
+def release_token(db, code: str):
+    repo.release_token(db, code)
+    with _lock:
+        _cache.pop(code, None)
+
+
+def reserve_token(db, model, key: str, code: str) -> tuple[TokenInfo | None, bool]:
+    """
+    One use of `code` for a job/batch checkout. Returns (info, newly taken);
+    info is None when the code is exhausted. A job/batch already holding
+    `code` reuses that use; one holding another code gives it back first.
+    """
+    for _ in range(2):
+        if repo.hold_token(db, model, key, code):
+            info = redeem_token(db, code)
+            if info is None:
+                repo.drop_token_hold(db, model, key, code)
+            return info, info is not None
+        held = repo.held_token(db, model, key)
+        if held == code:
+            return lookup_token(db, code), False
+        if held and repo.drop_token_hold(db, model, key, held):
+            release_token(db, held)
+    return None, False
+
+
+def release_token_hold(db, model, key: str, code: str, session_id: str | None = None) -> bool:
+    """Give back a reserved use (see repo.drop_token_hold for `session_id`)."""
+    if not repo.drop_token_hold(db, model, key, code, session_id):
+        return False
+    release_token(db, code)
+    return True
+
+
+def settle_token(db, model, key: str, code: str):
+    """Record `code` as the one paid with, giving back any other code held for checkout."""
+    held = repo.held_token(db, model, key)
+    if held and held != code:
+        release_token_hold(db, model, key, held)
+    repo.set_token_used(db, model, key, code)
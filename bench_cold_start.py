@@ -0,0 +1,72 @@
+# bench_cold_start.py
+"""
+Cold-start benchmark for the API and the worker.
+
+Each sample runs in a fresh interpreter and reports:
+  - import time of app.main / worker/worker.py
+  - time from interpreter start to the first served request (API: GET /healthz
+    through TestClient) or to the first Redis round trip (worker: connect_redis)
+
+    python bench_cold_start.py [--runs 5]
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+API_PROBE = """
+import json, time
+t0 = time.perf_counter()
+import app.main
+t1 = time.perf_counter()
+from fastapi.testclient import TestClient
+with TestClient(app.main.app) as client:
+    client.get("/healthz")
+    t2 = time.perf_counter()
+print(json.dumps({"import": t1 - t0, "first_request": t2 - t0}))
+"""
+
+WORKER_PROBE = """
+import json, sys, time
+t0 = time.perf_counter()
+sys.path.insert(0, "worker")
+import worker
+t1 = time.perf_counter()
+worker.connect_redis()
+t2 = time.perf_counter()
+print(json.dumps({"import": t1 - t0, "first_request": t2 - t0}))
+"""
+
+
+def sample(probe: str, database_url: str) -> dict:
+    env = dict(os.environ)
+    env.setdefault("DATABASE_URL", database_url)
+    out = subprocess.run(
+        [sys.executable, "-c", probe],
+        capture_output=True, text=True, check=True, env=env,
+    ).stdout
+    return json.loads(out.strip().splitlines()[-1])
+
+
+def report(name: str, samples: list[dict]):
+    for key in ("import", "first_request"):
+        values = [s[key] * 1000 for s in samples]
+        print(
+            f"{name:<7} {key:<14} median={statistics.median(values):8.1f} ms"
+            f"  min={min(values):8.1f} ms  max={max(values):8.1f} ms"
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+
+    # SQLite stand-in when DATABASE_URL is unset, kept out of the checkout
+    with tempfile.TemporaryDirectory() as tmp:
+        database_url = f"sqlite:///{os.path.join(tmp, 'bench_cold_start.db')}"
+        report("api", [sample(API_PROBE, database_url) for _ in range(args.runs)])
+        report("worker", [sample(WORKER_PROBE, database_url) for _ in range(args.runs)])
@@ -0,0 +1,35 @@
+# build_assets.py
+"""
+Fingerprints static assets into dist/assets/ with .gz/.br variants and writes
+manifest.json, which templates read through asset_url(). Run at image build.
+"""
+import gzip
+import hashlib
+import json
+import shutil
+import brotli
+from app.utils.assets import ASSETS_DIR, ASSET_SOURCES, BASE_DIR, MANIFEST_PATH
+
+print("🔧 Building static assets...")
+shutil.rmtree(ASSETS_DIR, ignore_errors=True)
+ASSETS_DIR.mkdir(parents=True)
+
+manifest = {}
+for pattern in ASSET_SOURCES:
+    for src in sorted(BASE_DIR.glob(pattern)):
+        rel = src.relative_to(BASE_DIR).as_posix()
+        data = src.read_bytes()
+        digest = hashlib.sha256(data).hexdigest()[:12]
+        hashed = f"{src.parent.relative_to(BASE_DIR).as_posix()}/{src.stem}.{digest}{src.suffix}"
+
+        out = ASSETS_DIR / hashed
+        out.parent.mkdir(parents=True, exist_ok=True)
+        out.write_bytes(data)
+        out.with_name(out.name + ".gz").write_bytes(gzip.compress(data, compresslevel=9, mtime=0))
+        out.with_name(out.name + ".br").write_bytes(brotli.compress(data, quality=11))
+
+        manifest[rel] = hashed
+        print(f"   {rel} → {hashed}")
+
+MANIFEST_PATH.write_text(json.dumps(manifest, indent=2, sort_keys=True))
+print("✅ Done.")
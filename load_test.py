@@ -0,0 +1,430 @@
+# load_test.py
+"""
+Load harness for the API, run entirely against local stand-ins:
+
+  - database: SQLite file by default, or any DATABASE_URL (e.g. a local Postgres)
+  - Redis:    in-memory fakeredis, or --redis-url for a real local Redis
+  - S3:       stub client that hands out fake presigned URLs
+  - Stripe:   stub Checkout + webhook verification (signatures not checked)
+  - worker:   simulated worker threads that pop the queue and mark jobs done
+
+Each virtual user walks the real customer journey over HTTP against a local
+uvicorn server: POST /upload → POST /api/pay → POST /webhook (paid tier, with
+optional duplicate deliveries) → GET /events/{id} stream or /download/{id}
+polling → GET /download/{id}. Free-tier users redeem a 100% token instead of
+going through Stripe.
+
+For every endpoint it reports throughput, latency percentiles (server side,
+until the last body byte) and DB queries per request, including any
+background tasks the request scheduled.
+
+    pip install -r requirements-dev.txt
+    python load_test.py [--users 500] [--concurrency 50] [--poll-ratio 0.3]
+"""
+import argparse
+import contextvars
+import json
+import os
+import random
+import re
+import sys
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from types import SimpleNamespace
+from uuid import uuid4
+
+os.chdir(os.path.dirname(os.path.abspath(__file__)))
+
+FREE_TOKEN_CODE = "LOADTEST-FREE"
+ROUTE_LABELS = [
+    (re.compile(r"^/events/[^/]+$"), "GET /events/{id}"),
+    (re.compile(r"^/download/[^/]+$"), "GET /download/{id}"),
+]
+
+_query_counter = contextvars.ContextVar("load_test_query_counter", default=None)
+
+
+# ───────────── Stand-ins ─────────────
+
+class StubS3:
+    """Just enough of the boto3 S3 client for the API's request paths."""
+
+    meta = SimpleNamespace(config=SimpleNamespace(max_pool_connections=0))
+
+    def generate_presigned_url(self, ClientMethod, Params=None, ExpiresIn=3600, **kwargs):
+        return f"https://s3.test/{Params.get('Bucket')}/{Params.get('Key')}?X-Amz-Expires={ExpiresIn}"
+
+    def create_multipart_upload(self, **kwargs):
+        return {"UploadId": uuid4().hex}
+
+    def complete_multipart_upload(self, **kwargs):
+        return {}
+
+    def abort_multipart_upload(self, **kwargs):
+        return {}
+
+    def close(self):
+        pass
+
+
+class StubStripe:
+    """Checkout sessions are remembered so the driver can build their webhooks."""
+
+    def __init__(self):
+        self.sessions = {}
+        self._lock = threading.Lock()
+        self.checkout = SimpleNamespace(Session=SimpleNamespace(create=self._create_session))
+        self.Webhook = SimpleNamespace(construct_event=self._construct_event)
+
+    def _create_session(self, **kwargs):
+        session_id = f"cs_test_{uuid4().hex}"
+        with self._lock:
+            self.sessions[session_id] = kwargs
+        return SimpleNamespace(id=session_id, url=f"https://checkout.stripe.test/{session_id}")
+
+    def _construct_event(self, payload, sig_header, secret):
+        if not sig_header:
+            raise ValueError("No signatures found matching the expected signature for payload")
+        return json.loads(payload)
+
+    def completed_event(self, session_id: str) -> dict:
+        session = self.sessions[session_id]
+        return {
+            "id": f"evt_test_{uuid4().hex}",
+            "type": "checkout.session.completed",
+            "data": {
+                "object": {
+                    "id": session_id,
+                    "metadata": session["metadata"],
+                    "amount_total": session["line_items"][0]["price_data"]["unit_amount"],
+                    "customer_email": session["customer_email"],
+                }
+            },
+        }
+
+
+def install_stand_ins(redis_url: str | None) -> StubStripe:
+    from app.utils import clients
+
+    if redis_url is None:
+        try:
+            import fakeredis
+        except ImportError:
+            sys.exit("fakeredis is not installed: pip install fakeredis, or pass --redis-url")
+        # one in-memory server behind both the sync and the asyncio client
+        server = fakeredis.FakeServer()
+        clients._clients["redis"] = fakeredis.FakeRedis(server=server, decode_responses=True)
+        clients._clients["async_redis"] = fakeredis.FakeAsyncRedis(server=server, decode_responses=True)
+
+    stripe_stub = StubStripe()
+    clients._clients["s3"] = StubS3()
+    clients._clients["stripe"] = stripe_stub
+    return stripe_stub
+
+
+def prepare_database():
+    from sqlalchemy import event
+    from app.db import Base, SessionLocal
+    from app import repo
+    from app.utils.clients import get_engine
+    import app.models.models  # noqa: F401  (registers tables)
+
+    engine = get_engine()
+    if engine.url.get_backend_name() == "sqlite":
+        Base.metadata.drop_all(engine)
+    Base.metadata.create_all(engine)
+
+    db = SessionLocal()
+    try:
+        if not repo.get_token(db, FREE_TOKEN_CODE):
+            repo.create_token(db, FREE_TOKEN_CODE, discount_percent=100, usage_limit=10**9)
+    finally:
+        db.close()
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def count_query(*args):
+        counter = _query_counter.get()
+        if counter is not None:
+            counter[0] += 1
+
+
+# ───────────── Metering ─────────────
+
+class Metrics:
+    def __init__(self):
+        self.samples = defaultdict(list)  # label → [(latency_s, queries, status)]
+        self._lock = threading.Lock()
+
+    def record(self, label: str, latency: float, queries: int, status: int):
+        with self._lock:
+            self.samples[label].append((latency, queries, status))
+
+
+def route_label(method: str, path: str) -> str:
+    for pattern, label in ROUTE_LABELS:
+        if pattern.match(path):
+            return label
+    return f"{method} {path}"
+
+
+class MeteredApp:
+    """ASGI wrapper timing each request and counting the DB queries it causes."""
+
+    def __init__(self, app, metrics: Metrics):
+        self.app = app
+        self.metrics = metrics
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        counter = [0]
+        token = _query_counter.set(counter)
+        started = time.perf_counter()
+        state = {"status": 0, "latency": None}
+
+        async def metered_send(message):
+            if message["type"] == "http.response.start":
+                state["status"] = message["status"]
+            elif message["type"] == "http.response.body" and not message.get("more_body"):
+                state["latency"] = time.perf_counter() - started
+            await send(message)
+
+        try:
+            await self.app(scope, receive, metered_send)
+        finally:
+            _query_counter.reset(token)
+            latency = state["latency"] or (time.perf_counter() - started)
+            self.metrics.record(
+                route_label(scope["method"], scope["path"]), latency, counter[0], state["status"]
+            )
+
+
+# ───────────── Simulated Worker ─────────────
+
+def simulated_worker(stop: threading.Event, encode_sec: float):
+    from app.db import SessionLocal
+    from app.models.models import Job
+    from app.utils.clients import get_redis
+    from app.utils.redis_utils import QUEUE_NAME
+
+    redis_client = get_redis()
+    while not stop.is_set():
+        # Plain LPOP + short sleep: fakeredis serialises blocking pops across threads
+        item = redis_client.lpop(QUEUE_NAME)
+        if not item:
+            time.sleep(0.1)
+            continue
+        upload_id = json.loads(item)["upload_id"]
+
+        db = SessionLocal()
+        try:
+            db.query(Job).filter(Job.upload_id == upload_id).update(
+                {"status": "processing", "progress": 1}
+            )
+            db.commit()
+            time.sleep(random.uniform(0.5, 1.5) * encode_sec)
+            db.query(Job).filter(Job.upload_id == upload_id).update({
+                "status": "done",
+                "progress": 100,
+                "output_url": f"https://s3.test/outputs/{upload_id}_compressed.mp4",
+            })
+            db.commit()
+        except Exception as e:
+            db.rollback()
+            print(f"⚠️ Simulated worker failed on {upload_id}: {e}")
+        finally:
+            db.close()
+
+
+# ───────────── Virtual User ─────────────
+
+def customer_journey(base_url: str, stripe_stub: StubStripe, args) -> bool:
+    import requests
+
+    http = requests.Session()
+    http.headers["X-Forwarded-For"] = f"10.{random.randint(0, 255)}.{random.randint(0, 255)}.{random.randint(1, 254)}"
+    try:
+        free = random.random() < args.free_ratio
+        size = random.randint(5, 50) * 1024**2 if free else random.randint(51, 1500) * 1024**2
+        duration = round(random.uniform(10, 600), 1)
+        filename = f"clip_{uuid4().hex[:8]}.mp4"
+
+        resp = http.post(f"{base_url}/upload", json={
+            "filename": filename, "size_bytes": size,
+            "content_type": "video/mp4", "duration_sec": duration,
+        }, timeout=30)
+        if resp.status_code != 200:
+            return False
+        upload = resp.json()
+        upload_id = upload["upload_id"]
+
+        resp = http.post(f"{base_url}/api/pay", json={
+            "file_key": upload_id,
+            "email": f"load+{upload_id[:8]}@example.com",
+            "provider": random.choice(["gmail", "outlook", "other"]),
+            "size_bytes": size,
+            "duration_sec": duration,
+            "price_cents": 0 if free else random.choice([199, 299, 499]),
+            "filename": filename,
+            "promo_code": FREE_TOKEN_CODE if free else None,
+        }, timeout=30)
+        if resp.status_code != 200:
+            return False
+
+        if not free:
+            session_id = resp.json()["checkout_url"].rsplit("/", 1)[-1]
+            body = json.dumps(stripe_stub.completed_event(session_id))
+            deliveries = 2 if random.random() < args.duplicate_ratio else 1
+            for _ in range(deliveries):
+                resp = http.post(
+                    f"{base_url}/webhook", data=body,
+                    headers={"Stripe-Signature": "t=0,v1=loadtest", "Content-Type": "application/json"},
+                    timeout=30,
+                )
+                if resp.status_code != 200:
+                    return False
+
+        deadline = time.time() + args.job_timeout
+        if random.random() < args.poll_ratio:
+            while time.time() < deadline:
+                if http.get(f"{base_url}/download/{upload_id}", timeout=30).status_code == 200:
+                    return True
+                time.sleep(args.poll_interval)
+            return False
+
+        with http.get(f"{base_url}/events/{upload_id}", stream=True, timeout=(5, args.job_timeout)) as stream:
+            for line in stream.iter_lines(decode_unicode=True):
+                if line and line.startswith("data: ") and "download_url" in line:
+                    break
+                if time.time() > deadline:
+                    return False
+        return http.get(f"{base_url}/download/{upload_id}", timeout=30).status_code == 200
+    except Exception as e:
+        print(f"⚠️ Journey failed: {e}")
+        return False
+    finally:
+        http.close()
+
+
+# ───────────── Report ─────────────
+
+def percentile(values: list[float], pct: float) -> float:
+    values = sorted(values)
+    k = (len(values) - 1) * pct
+    lo = int(k)
+    hi = min(lo + 1, len(values) - 1)
+    return values[lo] + (values[hi] - values[lo]) * (k - lo)
+
+
+def report(metrics: Metrics, wall_sec: float, journeys: list[float], failed: int):
+    print(
+        f"\n{'endpoint':<22} {'count':>6} {'req/s':>8} {'p50 ms':>9} {'p95 ms':>9}"
+        f" {'p99 ms':>9} {'q/req':>6} {'q max':>6}  statuses"
+    )
+    for label in sorted(metrics.samples):
+        samples = metrics.samples[label]
+        latencies = [s[0] * 1000 for s in samples]
+        queries = [s[1] for s in samples]
+        statuses = defaultdict(int)
+        for s in samples:
+            statuses[s[2]] += 1
+        print(
+            f"{label:<22} {len(samples):>6} {len(samples) / wall_sec:>8.1f}"
+            f" {percentile(latencies, 0.50):>9.1f} {percentile(latencies, 0.95):>9.1f}"
+            f" {percentile(latencies, 0.99):>9.1f} {sum(queries) / len(queries):>6.1f} {max(queries):>6}"
+            f"  {dict(sorted(statuses.items()))}"
+        )
+
+    print(f"\njourneys: {len(journeys)} ok, {failed} failed in {wall_sec:.1f}s "
+          f"({len(journeys) / wall_sec:.1f}/s)")
+    if journeys:
+        print(f"journey time: p50={percentile(journeys, 0.50):.2f}s  "
+              f"p95={percentile(journeys, 0.95):.2f}s  p99={percentile(journeys, 0.99):.2f}s")
+
+
+# ───────────── Main ─────────────
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=200, help="customer journeys to run")
+    parser.add_argument("--concurrency", type=int, default=50, help="journeys in flight at once")
+    parser.add_argument("--free-ratio", type=float, default=0.3, help="share of free-tier uploads")
+    parser.add_argument("--poll-ratio", type=float, default=0.3, help="share polling /download instead of SSE")
+    parser.add_argument("--duplicate-ratio", type=float, default=0.1, help="share of webhooks delivered twice")
+    parser.add_argument("--poll-interval", type=float, default=1.0)
+    parser.add_argument("--encode-sec", type=float, default=3.0, help="mean simulated encode time")
+    parser.add_argument("--workers", type=int, default=8, help="simulated worker threads")
+    parser.add_argument("--job-timeout", type=float, default=120.0)
+    parser.add_argument("--with-limits", action="store_true", help="keep rate limits and backpressure on")
+    parser.add_argument("--redis-url", default=None, help="use a real Redis instead of fakeredis")
+    parser.add_argument("--port", type=int, default=8765)
+    args = parser.parse_args()
+
+    # Configuration is read at import time, so set it before importing the app
+    os.environ.setdefault("DATABASE_URL", "sqlite:///load_test.db")
+    os.environ["RATE_LIMIT_ENABLED"] = "1" if args.with_limits else "0"
+    os.environ.setdefault("STRIPE_WEBHOOK_SECRET", "whsec_loadtest")
+    if args.redis_url:
+        os.environ["REDIS_URL"] = args.redis_url
+
+    import uvicorn
+    import app.main
+    from app.utils.clients import close_all
+
+    stripe_stub = install_stand_ins(args.redis_url)
+    prepare_database()
+
+    metrics = Metrics()
+    server = uvicorn.Server(uvicorn.Config(
+        MeteredApp(app.main.app, metrics),
+        host="127.0.0.1", port=args.port, log_level="warning",
+        limit_concurrency=None, timeout_keep_alive=30,
+    ))
+    server_thread = threading.Thread(target=server.run, daemon=True)
+    server_thread.start()
+    while not server.started:
+        time.sleep(0.05)
+
+    stop = threading.Event()
+    workers = [
+        threading.Thread(target=simulated_worker, args=(stop, args.encode_sec), daemon=True)
+        for _ in range(args.workers)
+    ]
+    for w in workers:
+        w.start()
+
+    base_url = f"http://127.0.0.1:{args.port}"
+    journeys, failed = [], 0
+
+    def timed_journey(_):
+        started = time.perf_counter()
+        ok = customer_journey(base_url, stripe_stub, args)
+        return ok, time.perf_counter() - started
+
+    print(f"🚀 {args.users} journeys, {args.concurrency} concurrent, "
+          f"db={os.environ['DATABASE_URL'].split('://')[0]}, redis={'real' if args.redis_url else 'fakeredis'}")
+    started = time.perf_counter()
+    try:
+        with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+            for ok, elapsed in pool.map(timed_journey, range(args.users)):
+                if ok:
+                    journeys.append(elapsed)
+                else:
+                    failed += 1
+        wall_sec = time.perf_counter() - started
+    finally:
+        stop.set()
+        server.should_exit = True
+        server_thread.join(timeout=10)
+        for w in workers:
+            w.join(timeout=5)
+        close_all()
+
+    report(metrics, wall_sec, journeys, failed)
+
+
+if __name__ == "__main__":
+    main()
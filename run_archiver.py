@@ -0,0 +1,58 @@
+# run_archiver.py
+"""
+Moves finished and abandoned jobs out of the hot `jobs` table into `jobs_archive`.
+
+    python run_archiver.py          # loop forever (ARCHIVE_INTERVAL_SEC between passes)
+    python run_archiver.py --once   # single pass, e.g. from a scheduled ECS task
+"""
+import os
+import sys
+import time
+from datetime import datetime, timedelta
+from dotenv import load_dotenv
+from app.db import SessionLocal
+from app import repo
+
+load_dotenv()
+
+ARCHIVE_FINISHED_AFTER_DAYS = float(os.getenv("ARCHIVE_FINISHED_AFTER_DAYS", "30"))
+ARCHIVE_ABANDONED_AFTER_DAYS = float(os.getenv("ARCHIVE_ABANDONED_AFTER_DAYS", "3"))
+ARCHIVE_BATCH_SIZE = int(os.getenv("ARCHIVE_BATCH_SIZE", "1000"))
+ARCHIVE_INTERVAL_SEC = int(os.getenv("ARCHIVE_INTERVAL_SEC", "3600"))
+
+
+def archive_once() -> int:
+    now = datetime.utcnow()
+    finished_before = now - timedelta(days=ARCHIVE_FINISHED_AFTER_DAYS)
+    abandoned_before = now - timedelta(days=ARCHIVE_ABANDONED_AFTER_DAYS)
+
+    total = 0
+    db = SessionLocal()
+    try:
+        # Small batches keep each transaction (and its row locks) short
+        while True:
+            moved = repo.archive_jobs_batch(
+                db, finished_before, abandoned_before, batch_size=ARCHIVE_BATCH_SIZE
+            )
+            total += moved
+            if moved < ARCHIVE_BATCH_SIZE:
+                break
+        # Stage timelines only feed recent latency reports
+        repo.prune_job_stages(db, finished_before)
+    except Exception as e:
+        db.rollback()
+        print(f"❌ Archive pass failed after {total} jobs: {e}")
+    finally:
+        db.close()
+
+    print(f"🗄️ Archived {total} jobs")
+    return total
+
+
+if __name__ == "__main__":
+    if "--once" in sys.argv:
+        archive_once()
+    else:
+        while True:
+            archive_once()
+            time.sleep(ARCHIVE_INTERVAL_SEC)
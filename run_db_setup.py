@@ -1,7 +1,41 @@
 # run_db_setup.py
-from app.db import Base, engine
+from sqlalchemy import inspect, text
+from app.db import Base
+from app.utils.clients import get_engine
 from app.models import models
 
+# Existing rows of a newly added column that must not stay NULL; run once, in
+# the same transaction as the ALTER that adds the column.
+BACKFILLS = {
+    # NULL means "never pushed to Redis" to the webhook guard, the archiver and
+    # the S3 sweeper. Rows from before the column existed can't be told apart
+    # once they reached /api/pay (paid and queued vs. abandoned at checkout), so
+    # all of those count as enqueued; only uploads that never got that far
+    # (provider still 'pending') stay NULL.
+    ("jobs", "enqueued_at"): "UPDATE jobs SET enqueued_at = created_at WHERE provider <> 'pending'",
+}
+
 print("🔧 Creating tables...")
+engine = get_engine()
 Base.metadata.create_all(bind=engine)
+
+# create_all skips tables that already exist, so add new nullable columns
+# and any new indexes explicitly
+existing = inspect(engine)
+with engine.begin() as conn:
+    for table in Base.metadata.sorted_tables:
+        present = {c["name"] for c in existing.get_columns(table.name)}
+        for column in table.columns:
+            if column.name not in present and column.nullable:
+                col_type = column.type.compile(dialect=engine.dialect)
+                conn.execute(text(f'ALTER TABLE {table.name} ADD COLUMN {column.name} {col_type}'))
+                print(f"   + {table.name}.{column.name}")
+                backfill = BACKFILLS.get((table.name, column.name))
+                if backfill:
+                    filled = conn.execute(text(backfill)).rowcount
+                    print(f"     backfilled {filled} rows")
+
+for table in Base.metadata.sorted_tables:
+    for index in table.indexes:
+        index.create(bind=engine, checkfirst=True)
 print("✅ Done.")
@@ -0,0 +1,162 @@
+# run_s3_sweeper.py
+"""
+Deletes S3 objects nobody can use any more, found by joining against `jobs`:
+
+  - outputs of done jobs whose download window has passed (output_path/url cleared)
+  - extra provider outputs in `job_outputs` past the same window (rows deleted)
+  - original uploads of finished jobs, and of uploads never paid for within a TTL
+    (input_deleted_at set)
+  - multipart uploads started more than MULTIPART_ABANDON_HOURS ago and never
+    completed (aborted, so S3 drops their parts)
+
+Keys go out in batched DeleteObjects calls (≤ 1000 keys each) and the DB rows
+are updated in bulk per batch. Run it more often than run_archiver.py moves
+rows out of `jobs`, or those rows' objects are never swept.
+
+    python run_s3_sweeper.py            # loop forever (SWEEP_INTERVAL_SEC between passes)
+    python run_s3_sweeper.py --once     # single pass, e.g. from a scheduled ECS task
+    python run_s3_sweeper.py --dry-run  # report what would be deleted
+"""
+import os
+import sys
+import time
+from datetime import datetime, timedelta
+from dotenv import load_dotenv
+from app.db import SessionLocal
+from app import repo
+from app.utils.s3_utils import (
+    UPLOADS_BUCKET,
+    OUTPUTS_BUCKET,
+    DELETE_BATCH_MAX_KEYS,
+    abort_stale_multipart_uploads,
+    delete_objects,
+)
+
+load_dotenv()
+
+OUTPUT_RETENTION_HOURS = float(os.getenv("OUTPUT_RETENTION_HOURS", "24"))  # download links last 24h
+INPUT_RETENTION_HOURS = float(os.getenv("INPUT_RETENTION_HOURS", "24"))
+UNPAID_UPLOAD_TTL_HOURS = float(os.getenv("UNPAID_UPLOAD_TTL_HOURS", "24"))
+MULTIPART_ABANDON_HOURS = float(os.getenv("MULTIPART_ABANDON_HOURS", "24"))
+SWEEP_INTERVAL_SEC = int(os.getenv("SWEEP_INTERVAL_SEC", "3600"))
+
+
+def _gb(n: int) -> str:
+    return f"{n / 1024**3:.2f} GB"
+
+
+def sweep_outputs(db, completed_before: datetime, dry_run: bool) -> tuple[int, int]:
+    objects, reclaimed = 0, 0
+    while True:
+        rows = repo.expired_outputs(db, completed_before, limit=DELETE_BATCH_MAX_KEYS)
+        if not rows:
+            break
+        if dry_run:
+            return len(rows), sum(r.output_size_bytes or 0 for r in rows)
+
+        deleted, errors = delete_objects(OUTPUTS_BUCKET, [r.output_path for r in rows])
+        for key, message in list(errors.items())[:5]:
+            print(f"⚠️ Could not delete s3://{OUTPUTS_BUCKET}/{key}: {message}")
+
+        done = [r for r in rows if r.output_path in deleted]
+        if done:
+            repo.clear_outputs(db, [r.id for r in done])
+        objects += len(done)
+        reclaimed += sum(r.output_size_bytes or 0 for r in done)
+        if errors or len(rows) < DELETE_BATCH_MAX_KEYS:
+            break  # failed keys would come straight back; retry them next pass
+    return objects, reclaimed
+
+
+def sweep_extra_outputs(db, created_before: datetime, dry_run: bool) -> tuple[int, int]:
+    objects, reclaimed = 0, 0
+    while True:
+        rows = repo.expired_job_outputs(db, created_before, limit=DELETE_BATCH_MAX_KEYS)
+        if not rows:
+            break
+        if dry_run:
+            return len(rows), sum(r.size_bytes or 0 for r in rows)
+
+        deleted, errors = delete_objects(OUTPUTS_BUCKET, [r.output_path for r in rows])
+        for key, message in list(errors.items())[:5]:
+            print(f"⚠️ Could not delete s3://{OUTPUTS_BUCKET}/{key}: {message}")
+
+        done = [r for r in rows if r.output_path in deleted]
+        if done:
+            repo.delete_job_outputs(db, [r.id for r in done])
+        objects += len(done)
+        reclaimed += sum(r.size_bytes or 0 for r in done)
+        if errors or len(rows) < DELETE_BATCH_MAX_KEYS:
+            break
+    return objects, reclaimed
+
+
+def sweep_inputs(db, finished_before: datetime, unpaid_before: datetime, dry_run: bool) -> tuple[int, int]:
+    objects, reclaimed = 0, 0
+    while True:
+        rows = repo.expired_inputs(db, finished_before, unpaid_before, limit=DELETE_BATCH_MAX_KEYS)
+        if not rows:
+            break
+        if dry_run:
+            return len(rows), sum(r.size_bytes or 0 for r in rows)
+
+        keys = {f"uploads/{r.upload_id}.mp4": r for r in rows}
+        deleted, errors = delete_objects(UPLOADS_BUCKET, list(keys))
+        for key, message in list(errors.items())[:5]:
+            print(f"⚠️ Could not delete s3://{UPLOADS_BUCKET}/{key}: {message}")
+
+        done = [keys[k] for k in deleted]
+        if done:
+            repo.mark_inputs_deleted(db, [r.id for r in done])
+        objects += len(done)
+        reclaimed += sum(r.size_bytes or 0 for r in done)
+        if errors or len(rows) < DELETE_BATCH_MAX_KEYS:
+            break
+    return objects, reclaimed
+
+
+def sweep_once(dry_run: bool = False) -> int:
+    now = datetime.utcnow()
+    db = SessionLocal()
+    outputs = inputs = (0, 0)
+    try:
+        outputs = sweep_outputs(db, now - timedelta(hours=OUTPUT_RETENTION_HOURS), dry_run)
+        extra = sweep_extra_outputs(db, now - timedelta(hours=OUTPUT_RETENTION_HOURS), dry_run)
+        outputs = (outputs[0] + extra[0], outputs[1] + extra[1])
+        inputs = sweep_inputs(
+            db,
+            now - timedelta(hours=INPUT_RETENTION_HOURS),
+            now - timedelta(hours=UNPAID_UPLOAD_TTL_HOURS),
+            dry_run,
+        )
+    except Exception as e:
+        db.rollback()
+        print(f"❌ S3 sweep failed: {e}")
+    finally:
+        db.close()
+
+    multipart = 0
+    try:
+        multipart = abort_stale_multipart_uploads(now - timedelta(hours=MULTIPART_ABANDON_HOURS), dry_run)
+    except Exception as e:
+        print(f"❌ Multipart upload sweep failed: {e}")
+
+    verb = "Would delete" if dry_run else "Deleted"
+    print(
+        f"🧹 {verb} {outputs[0]} outputs ({_gb(outputs[1])}) and "
+        f"{inputs[0]} uploads ({_gb(inputs[1])}); "
+        f"{'would abort' if dry_run else 'aborted'} {multipart} abandoned multipart uploads; "
+        f"{'would reclaim' if dry_run else 'reclaimed'} {_gb(outputs[1] + inputs[1])}"
+        + (" (first batch only)" if dry_run else "")
+    )
+    return outputs[1] + inputs[1]
+
+
+if __name__ == "__main__":
+    dry_run = "--dry-run" in sys.argv
+    if "--once" in sys.argv or dry_run:
+        sweep_once(dry_run)
+    else:
+        while True:
+            sweep_once()
+            time.sleep(SWEEP_INTERVAL_SEC)
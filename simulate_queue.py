@@ -0,0 +1,249 @@
+# simulate_queue.py
+"""
+Offline discrete-event simulator for the job queue.
+
+Replays historical arrivals from `jobs` + `jobs_archive` (enqueued_at, falling
+back to created_at for rows that predate it; duration_sec, size_bytes,
+priority) against a grid of worker fleets and dequeue policies, and reports
+queue wait (arrival → start) and completion (arrival → finish) percentiles
+and worker utilization. Nothing touches Redis or the workers.
+
+Dequeue policies:
+  fifo          what run_worker() does today (RPUSH + BLPOP)
+  priority      priority jobs first, FIFO within each class
+  sjf           shortest video first
+  priority-sjf  priority jobs first, shortest first within each class
+
+Encode-speed models:
+  ratio     service = duration × --sec-per-media-sec (+ --overhead-sec)
+  history   each job's measured dequeued → upload_done time from job_stages,
+            falling back to `ratio` once those rows have been pruned
+
+--jitter adds lognormal noise to every service time; --contention slows each
+slot by that fraction per other slot on the same worker (x264 runs
+single-threaded, so slots only contend once a worker runs out of vCPUs).
+
+    python simulate_queue.py --days 7 --workers 2,4,8 --policy fifo,priority
+    python simulate_queue.py --days 30 --concurrency 1,2 --arrival-scale 0.5   # 2× traffic
+"""
+import argparse
+import heapq
+import itertools
+import math
+import random
+from datetime import datetime, timedelta
+from sqlalchemy import select, union_all
+from app.db import SessionLocal
+from app.models.models import Job, JobArchive, JobStage
+from app.utils.queue_estimate import DEFAULT_SEC_PER_MEDIA_SEC
+
+POLICIES = {
+    "fifo":         lambda job: (job["arrival"],),
+    "priority":     lambda job: (not job["priority"], job["arrival"]),
+    "sjf":          lambda job: (job["duration"], job["arrival"]),
+    "priority-sjf": lambda job: (not job["priority"], job["duration"], job["arrival"]),
+}
+
+
+# ─────────────── Historical Arrivals ───────────────
+def load_arrivals(since: datetime, until: datetime) -> list[dict]:
+    def arrivals_from(model):
+        return select(
+            model.upload_id, model.created_at, model.enqueued_at, model.status,
+            model.duration_sec, model.size_bytes, model.priority,
+        ).where(model.created_at >= since, model.created_at < until)
+
+    db = SessionLocal()
+    try:
+        rows = db.execute(union_all(arrivals_from(Job), arrivals_from(JobArchive))).all()
+
+        measured = {}
+        stages = db.execute(
+            select(JobStage.upload_id, JobStage.stage, JobStage.at).where(
+                JobStage.at >= since,
+                JobStage.stage.in_(("dequeued", "upload_done")),
+            )
+        ).all()
+        by_job = {}
+        for upload_id, stage, at in stages:
+            by_job.setdefault(upload_id, {})[stage] = at
+        for upload_id, marks in by_job.items():
+            if "dequeued" in marks and "upload_done" in marks:
+                measured[upload_id] = (marks["upload_done"] - marks["dequeued"]).total_seconds()
+    finally:
+        db.close()
+
+    jobs = []
+    for r in rows:
+        # Jobs never pushed to Redis (unpaid) never reached a worker
+        if r.enqueued_at is None and r.status not in ("processing", "done", "error"):
+            continue
+        jobs.append({
+            "upload_id": r.upload_id,
+            "arrived_at": r.enqueued_at or r.created_at,
+            "duration": float(r.duration_sec or 0),
+            "size_bytes": r.size_bytes or 0,
+            "priority": bool(r.priority),
+            "measured_sec": measured.get(r.upload_id),
+        })
+    jobs.sort(key=lambda j: j["arrived_at"])
+    return jobs
+
+
+# ─────────────── Encode-Speed Models ───────────────
+def service_times(jobs: list[dict], args, rng: random.Random) -> list[float]:
+    times = []
+    for job in jobs:
+        if args.speed == "history" and job["measured_sec"]:
+            seconds = job["measured_sec"]
+        else:
+            seconds = args.overhead_sec + job["duration"] * args.sec_per_media_sec
+        if args.jitter:
+            seconds *= rng.lognormvariate(-args.jitter ** 2 / 2, args.jitter)  # mean-preserving
+        times.append(max(seconds, 0.1))
+    return times
+
+
+# ─────────────── Discrete-Event Simulation ───────────────
+def simulate(jobs: list[dict], services: list[float], workers: int, concurrency: int,
+             policy: str, contention: float, arrival_scale: float) -> dict:
+    slowdown = 1 + contention * (concurrency - 1)
+    free_slots = {w: concurrency for w in range(workers)}
+    busy_sec = [0.0] * workers
+
+    origin = jobs[0]["arrived_at"]
+    events = []  # (time, seq, kind, payload)
+    seq = itertools.count()
+    for i, job in enumerate(jobs):
+        t = (job["arrived_at"] - origin).total_seconds() * arrival_scale
+        heapq.heappush(events, (t, next(seq), "arrive", i))
+
+    sort_key = POLICIES[policy]
+    waiting = []  # heap of (policy key, seq, job index)
+    arrivals, waits, completions = {}, [], []
+    priority_waits, standard_waits = [], []
+    max_depth, now = 0, 0.0
+
+    def dispatch():
+        while waiting:
+            # least-loaded worker, like idle workers racing on BLPOP
+            w = max(free_slots, key=free_slots.get)
+            if free_slots[w] == 0:
+                return
+            _, _, i = heapq.heappop(waiting)
+            free_slots[w] -= 1
+            run_sec = services[i] * slowdown
+            busy_sec[w] += run_sec
+            wait = now - arrivals[i]
+            waits.append(wait)
+            (priority_waits if jobs[i]["priority"] else standard_waits).append(wait)
+            heapq.heappush(events, (now + run_sec, next(seq), "finish", (i, w)))
+
+    while events:
+        now, _, kind, payload = heapq.heappop(events)
+        if kind == "arrive":
+            arrivals[payload] = now
+            heapq.heappush(waiting, (sort_key({**jobs[payload], "arrival": now}), next(seq), payload))
+            max_depth = max(max_depth, len(waiting))
+        else:
+            i, w = payload
+            free_slots[w] += 1
+            completions.append(now - arrivals[i])
+        dispatch()
+
+    makespan = max(now, 1e-9)
+    return {
+        "waits": waits,
+        "completions": completions,
+        "priority_waits": priority_waits,
+        "standard_waits": standard_waits,
+        "utilization": sum(busy_sec) / (workers * concurrency * makespan),
+        "max_depth": max_depth,
+        "makespan": makespan,
+    }
+
+
+# ─────────────── Report ───────────────
+def pct(values: list[float], q: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, math.ceil(q / 100 * len(ordered)) - 1)]
+
+
+def fmt_sec(seconds: float) -> str:
+    if seconds >= 3600:
+        return f"{seconds / 3600:.1f}h"
+    if seconds >= 60:
+        return f"{seconds / 60:.1f}m"
+    return f"{seconds:.0f}s"
+
+
+def report(rows: list[tuple]):
+    header = (
+        f"{'workers':>7} {'conc':>4} {'policy':<13} {'wait p50':>8} {'p95':>7} {'p99':>7} {'max':>7}"
+        f"  {'done p50':>8} {'p95':>7} {'p99':>7}  {'prio p95':>8} {'std p95':>7}  {'util':>5} {'depth':>5}"
+    )
+    print(header)
+    print("-" * len(header))
+    for workers, concurrency, policy, r in rows:
+        w, c = r["waits"], r["completions"]
+        print(
+            f"{workers:>7} {concurrency:>4} {policy:<13} "
+            f"{fmt_sec(pct(w, 50)):>8} {fmt_sec(pct(w, 95)):>7} {fmt_sec(pct(w, 99)):>7} {fmt_sec(max(w)):>7}  "
+            f"{fmt_sec(pct(c, 50)):>8} {fmt_sec(pct(c, 95)):>7} {fmt_sec(pct(c, 99)):>7}  "
+            f"{fmt_sec(pct(r['priority_waits'], 95)):>8} {fmt_sec(pct(r['standard_waits'], 95)):>7}  "
+            f"{r['utilization']:>5.0%} {r['max_depth']:>5}"
+        )
+
+
+def int_list(value: str) -> list[int]:
+    return [int(v) for v in value.split(",") if v]
+
+
+def policy_list(value: str) -> list[str]:
+    policies = [v.strip() for v in value.split(",") if v.strip()]
+    unknown = [p for p in policies if p not in POLICIES]
+    if unknown:
+        raise argparse.ArgumentTypeError(f"unknown policy {', '.join(unknown)} (choose from {', '.join(POLICIES)})")
+    return policies
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--days", type=float, default=7, help="replay arrivals from the last N days")
+    parser.add_argument("--until", type=datetime.fromisoformat, default=None, help="end of the window (UTC, ISO)")
+    parser.add_argument("--workers", type=int_list, default=[2], help="comma-separated fleet sizes")
+    parser.add_argument("--concurrency", type=int_list, default=[1], help="comma-separated jobs per worker")
+    parser.add_argument("--policy", type=policy_list, default=["fifo"], help="comma-separated dequeue policies")
+    parser.add_argument("--speed", choices=("ratio", "history"), default="history")
+    parser.add_argument("--sec-per-media-sec", type=float, default=DEFAULT_SEC_PER_MEDIA_SEC)
+    parser.add_argument("--overhead-sec", type=float, default=15.0, help="download + upload per job (ratio model)")
+    parser.add_argument("--jitter", type=float, default=0.0, help="lognormal sigma on service times")
+    parser.add_argument("--contention", type=float, default=0.0, help="slowdown per extra slot on a worker")
+    parser.add_argument("--arrival-scale", type=float, default=1.0, help="<1 compresses arrivals (more traffic)")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    until = args.until or datetime.utcnow()
+    jobs = load_arrivals(until - timedelta(days=args.days), until)
+    if not jobs:
+        raise SystemExit("No arrivals in that window")
+
+    services = service_times(jobs, args, random.Random(args.seed))
+    measured = sum(1 for j in jobs if j["measured_sec"])
+    print(
+        f"🧪 {len(jobs)} arrivals ({sum(j['priority'] for j in jobs)} priority) over {args.days:g} days, "
+        f"{sum(j['duration'] for j in jobs) / 3600:.1f}h of video; "
+        f"speed={args.speed} ({measured} measured), mean service {fmt_sec(sum(services) / len(services))}\n"
+    )
+
+    results = [
+        (workers, concurrency, policy, simulate(
+            jobs, services, workers, concurrency, policy, args.contention, args.arrival_scale,
+        ))
+        for workers in args.workers
+        for concurrency in args.concurrency
+        for policy in args.policy
+    ]
+    report(results)
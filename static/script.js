@@ -18,6 +18,26 @@ function fmtDuration(sec) {
   return `${m}:${String(s).padStart(2, "0")} min`;
 }
 
+// "under a minute" / "about 7 min" / "about 1.5 h"
+function fmtWait(sec) {
+  if (!Number.isFinite(sec) || sec < 60) return "under a minute";
+  const min = Math.round(sec / 60);
+  return min < 60 ? `about ${min} min` : `about ${(sec / 3600).toFixed(1)} h`;
+}
+
+// Queue estimate from /upload, /api/pay or /events; null hides it
+function renderEstimate(estimate) {
+  const el = $("estimateNote");
+  if (!el) return;
+  if (!estimate) {
+    el.style.display = "none";
+    return;
+  }
+  const start = estimate.start_in_sec >= 60 ? `starts in ${fmtWait(estimate.start_in_sec)}, ` : "";
+  el.textContent = `⏱ Estimated: ${start}ready in ${fmtWait(estimate.complete_in_sec)}`;
+  el.style.display = "";
+}
+
 function setTextSafe(el, txt) {
   if (el) el.textContent = txt;
 }
@@ -226,6 +246,140 @@ function setUploadProgress(pct, note = "Uploading…") {
   }
 }
 
+// ────────────── Multipart Upload (parallel + resumable) ──────────────
+const MULTIPART_THRESHOLD = 64 * BYTES_MB;
+const UPLOAD_CONCURRENCY = 4;
+const PART_URL_BATCH = 20;
+const PART_RETRIES = 4;
+
+function fileFingerprint(file) {
+  return `mp:${file.name}:${file.size}:${file.lastModified}`;
+}
+
+async function postJSON(url, body) {
+  const res = await fetch(url, {
+    method: "POST",
+    headers: { "Content-Type": "application/json" },
+    body: JSON.stringify(body),
+  });
+  const data = await res.json().catch(() => ({}));
+  if (!res.ok) throw new Error(data.detail || `Request to ${url} failed`);
+  return data;
+}
+
+const sleep = (ms) => new Promise((r) => setTimeout(r, ms));
+
+// Upload session saved per file, so re-selecting the same file after a
+// failure only sends the parts S3 doesn't have yet.
+function loadMultipartSession(file) {
+  try {
+    return JSON.parse(sessionStorage.getItem(fileFingerprint(file)) || "null");
+  } catch {
+    return null;
+  }
+}
+
+async function uploadMultipart(file, uploadId) {
+  const key = fileFingerprint(file);
+  let session = loadMultipartSession(file);
+  if (!session || session.uploadId !== uploadId) {
+    const start = await postJSON("/upload/multipart/start", {
+      upload_id: uploadId,
+      content_type: file.type || "video/mp4",
+    });
+    session = {
+      uploadId,
+      s3UploadId: start.s3_upload_id,
+      partSize: start.part_size,
+      partCount: start.part_count,
+    };
+    sessionStorage.setItem(key, JSON.stringify(session));
+  }
+
+  const { s3UploadId, partSize, partCount } = session;
+  const etags = new Map();
+  try {
+    const res = await fetch(
+      `/upload/multipart/${encodeURIComponent(uploadId)}/parts?s3_upload_id=${encodeURIComponent(s3UploadId)}`
+    );
+    if (res.ok) {
+      const data = await res.json();
+      (data.parts || []).forEach((p) => etags.set(p.part_number, p.etag));
+    }
+  } catch {}
+
+  const partBytes = (n) => Math.min(partSize, file.size - (n - 1) * partSize);
+  let uploadedBytes = 0;
+  etags.forEach((_, n) => (uploadedBytes += partBytes(n)));
+  setUploadProgress((uploadedBytes / file.size) * 100, "Uploading…");
+
+  // Presigned URLs are fetched lazily, one batch at a time
+  const urlBatches = new Map();
+  const partUrl = async (n) => {
+    const batch = Math.floor((n - 1) / PART_URL_BATCH);
+    if (!urlBatches.has(batch)) {
+      const first = batch * PART_URL_BATCH + 1;
+      const last = Math.min(partCount, first + PART_URL_BATCH - 1);
+      const numbers = [];
+      for (let i = first; i <= last; i++) numbers.push(i);
+      urlBatches.set(
+        batch,
+        postJSON("/upload/multipart/parts", {
+          upload_id: uploadId,
+          s3_upload_id: s3UploadId,
+          part_numbers: numbers,
+        }).then((d) => new Map(d.parts.map((p) => [p.part_number, p.url])))
+      );
+    }
+    try {
+      return (await urlBatches.get(batch)).get(n);
+    } catch (err) {
+      urlBatches.delete(batch);
+      throw err;
+    }
+  };
+
+  const uploadPart = async (n) => {
+    const start = (n - 1) * partSize;
+    const blob = file.slice(start, start + partSize);
+    for (let attempt = 1; ; attempt++) {
+      try {
+        const res = await fetch(await partUrl(n), { method: "PUT", body: blob });
+        if (!res.ok) {
+          // Expired URL → drop the batch so the retry gets a fresh one
+          if (res.status === 403) urlBatches.delete(Math.floor((n - 1) / PART_URL_BATCH));
+          throw new Error(`Part ${n} failed (${res.status})`);
+        }
+        const etag = res.headers.get("ETag");
+        if (!etag) throw new Error("S3 did not expose the ETag header (check bucket CORS).");
+        etags.set(n, etag);
+        uploadedBytes += blob.size;
+        setUploadProgress((uploadedBytes / file.size) * 100, "Uploading…");
+        return;
+      } catch (err) {
+        if (attempt >= PART_RETRIES) throw err;
+        await sleep(500 * 2 ** attempt);
+      }
+    }
+  };
+
+  const pending = [];
+  for (let n = 1; n <= partCount; n++) if (!etags.has(n)) pending.push(n);
+  const worker = async () => {
+    while (pending.length) await uploadPart(pending.shift());
+  };
+  await Promise.all(
+    Array.from({ length: Math.min(UPLOAD_CONCURRENCY, pending.length) }, worker)
+  );
+
+  await postJSON("/upload/multipart/complete", {
+    upload_id: uploadId,
+    s3_upload_id: s3UploadId,
+    parts: [...etags].map(([part_number, etag]) => ({ part_number, etag })),
+  });
+  sessionStorage.removeItem(key);
+}
+
 // ────────────── Upload File Handler ──────────────
 async function handleFile(file) {
   state.file = file;
@@ -252,14 +406,23 @@ async function handleFile(file) {
     email,
   };
 
-  const res = await fetch("/upload", {
-    method: "POST",
-    headers: { "Content-Type": "application/json" },
-    body: JSON.stringify(payload),
-  });
+  let multipart = file.size > MULTIPART_THRESHOLD;
+  const resumed = multipart ? loadMultipartSession(file) : null;
 
-  const data = await res.json();
-  if (!data.ok) return showError(data.detail || "Upload request failed");
+  let data = { upload_id: resumed?.uploadId };
+  if (!resumed) {
+    const res = await fetch("/upload", {
+      method: "POST",
+      headers: { "Content-Type": "application/json" },
+      body: JSON.stringify(payload),
+    });
+
+    data = await res.json();
+    if (!data.ok) return showError(data.detail || "Upload request failed");
+    // The server only presigns a single PUT for files below its multipart threshold
+    multipart = data.multipart ?? multipart;
+  }
+  renderEstimate(data.estimate);
 
   state.uploadId = data.upload_id;
   sessionStorage.setItem("upload_id", data.upload_id);
@@ -267,12 +430,21 @@ async function handleFile(file) {
   state.sizeBytes = file.size;
   state.durationSec = dur;
 
-  const s3UploadRes = await fetch(data.presigned_url, {
-    method: "PUT",
-    headers: { "Content-Type": file.type },
-    body: file,
-  });
-  if (!s3UploadRes.ok) return showError("Upload to S3 failed.");
+  if (multipart) {
+    try {
+      await uploadMultipart(file, data.upload_id);
+    } catch (err) {
+      console.error("Multipart upload failed:", err);
+      return showError("Upload interrupted. Select the same file again to resume.");
+    }
+  } else {
+    const s3UploadRes = await fetch(data.presigned_url, {
+      method: "PUT",
+      headers: { "Content-Type": file.type },
+      body: file,
+    });
+    if (!s3UploadRes.ok) return showError("Upload to S3 failed.");
+  }
 
   setUploadProgress(100, "Upload complete");
   setTextSafe($("fileDuration"), fmtDuration(dur));
@@ -413,6 +585,7 @@ function wireCheckout() {
       );
       setStep(2);
       $("postPaySection").style.display = "";
+      renderEstimate(data.estimate);
       startSSE(id);
       return;
     }
@@ -510,6 +683,10 @@ function startSSE(jobId) {
       if (pctEl) pctEl.textContent = `${Math.floor(p)}%`;
       if (fillEl) fillEl.style.width = `${Math.floor(p)}%`;
       if (noteEl) noteEl.textContent = data.message || "Working…";
+      if (data.estimate) renderEstimate(data.estimate);
+      else if (data.status === "processing" && data.eta_sec != null)
+        renderEstimate({ start_in_sec: 0, complete_in_sec: data.eta_sec });
+      else if (data.status !== "queued") renderEstimate(null);
 
       if (data.download_url) {
         revealDownload(data.download_url);
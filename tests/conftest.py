@@ -0,0 +1,134 @@
+# tests/conftest.py
+import os
+import sys
+from datetime import datetime, timezone
+from types import SimpleNamespace
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, "worker"))  # worker modules import each other top-level
+
+import fakeredis
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+from app.db import Base
+from app.utils import clients
+import app.models.models  # noqa: F401  (registers tables)
+
+
+@pytest.fixture(autouse=True)
+def empty_token_cache():
+    # Per-process cache; a code cached by one test must not leak into the next database
+    from app.utils import token_cache
+    token_cache._cache.clear()
+    yield
+    token_cache._cache.clear()
+
+
+@pytest.fixture
+def engine(monkeypatch):
+    """One in-memory database, also what SessionLocal() hands out to code under test."""
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    monkeypatch.setitem(clients._clients, "engine", engine)
+    yield engine
+    engine.dispose()
+
+
+@pytest.fixture
+def db(engine):
+    Base.metadata.create_all(engine)
+    session = sessionmaker(bind=engine)()
+    try:
+        yield session
+    finally:
+        session.close()
+
+
+@pytest.fixture
+def redis_client(monkeypatch):
+    client = fakeredis.FakeRedis(server=fakeredis.FakeServer(), decode_responses=True)
+    monkeypatch.setitem(clients._clients, "redis", client)
+    return client
+
+
+@pytest.fixture
+def async_redis_client(redis_client, monkeypatch):
+    """The asyncio client handlers await, on the same fake server as redis_client."""
+    from app.utils.redis_utils import REDIS_BREAKER
+    server = redis_client.connection_pool.connection_kwargs["server"]
+    client = fakeredis.FakeAsyncRedis(server=server, decode_responses=True)
+    monkeypatch.setitem(clients._clients, "async_redis", client)
+    REDIS_BREAKER.record_success()
+    yield client
+    REDIS_BREAKER.record_success()
+
+
+class FakeStripe:
+    """Checkout sessions only; `fail_with` makes Session.create raise."""
+
+    def __init__(self):
+        self.sessions = []
+        self.fail_with = None
+        self.checkout = SimpleNamespace(Session=SimpleNamespace(create=self._create_session))
+
+    def _create_session(self, **kwargs):
+        if self.fail_with:
+            raise self.fail_with
+        session = SimpleNamespace(id=f"cs_test_{len(self.sessions)}", url="https://checkout.test", **kwargs)
+        self.sessions.append(session)
+        return session
+
+
+@pytest.fixture
+def stripe(monkeypatch):
+    from app.utils.stripe_utils import STRIPE_BREAKER
+    fake = FakeStripe()
+    monkeypatch.setitem(clients._clients, "stripe", fake)
+    STRIPE_BREAKER.record_success()
+    yield fake
+    STRIPE_BREAKER.record_success()
+
+
+class FakeS3:
+    """
+    Presigning, DeleteObjects and multipart bookkeeping; keys in `failing`
+    come back as per-key errors.
+    """
+
+    def __init__(self):
+        self.deleted = []
+        self.calls = 0
+        self.failing = set()
+        self.multipart = {}  # UploadId -> {"Key", "UploadId", "Initiated"}
+        self.aborted = []
+
+    def generate_presigned_url(self, ClientMethod, Params=None, ExpiresIn=3600, **kwargs):
+        return f"https://s3.test/{Params['Bucket']}/{Params['Key']}?method={ClientMethod}"
+
+    def delete_objects(self, Bucket, Delete):
+        self.calls += 1
+        keys = [o["Key"] for o in Delete["Objects"]]
+        self.deleted += [k for k in keys if k not in self.failing]
+        return {"Errors": [{"Key": k, "Code": "AccessDenied"} for k in keys if k in self.failing]}
+
+    def create_multipart_upload(self, Bucket, Key, **kwargs):
+        upload_id = f"mpu-{len(self.multipart)}"
+        self.multipart[upload_id] = {"Key": Key, "UploadId": upload_id, "Initiated": datetime.now(timezone.utc)}
+        return {"UploadId": upload_id}
+
+    def abort_multipart_upload(self, Bucket, Key, UploadId):
+        self.multipart.pop(UploadId)
+        self.aborted.append(UploadId)
+
+    def get_paginator(self, operation):
+        assert operation == "list_multipart_uploads"
+        return SimpleNamespace(paginate=lambda **kwargs: [{"Uploads": list(self.multipart.values())}])
+
+
+@pytest.fixture
+def s3(monkeypatch):
+    fake = FakeS3()
+    monkeypatch.setitem(clients._clients, "s3", fake)
+    return fake
@@ -0,0 +1,77 @@
+# tests/test_archiver.py
+from datetime import datetime, timedelta
+from sqlalchemy import select
+from app import repo
+from app.models.models import Job, JobArchive, JobStage
+from run_archiver import archive_once
+
+NOW = datetime.utcnow()
+OLD = NOW - timedelta(days=60)
+FINISHED_BEFORE = NOW - timedelta(days=30)
+ABANDONED_BEFORE = NOW - timedelta(days=3)
+
+
+def add_job(db, job_id: str, created_at: datetime = OLD, status: str = "queued", progress: float = 0.0,
+            enqueued_at: datetime | None = None):
+    db.add(Job(
+        id=job_id, upload_id=job_id, email="a@example.com", provider="gmail", size_bytes=1,
+        duration_sec=1.0, input_path=f"{job_id}/clip.mov", status=status, progress=progress,
+        created_at=created_at, enqueued_at=enqueued_at,
+    ))
+    db.commit()
+
+
+def archived(db) -> set[str]:
+    return set(db.execute(select(JobArchive.id)).scalars())
+
+
+def remaining(db) -> set[str]:
+    return set(db.execute(select(Job.id)).scalars())
+
+
+def test_finished_and_abandoned_jobs_move_to_the_archive(db):
+    add_job(db, "done-old", status="done")
+    add_job(db, "error-old", status="error")
+    add_job(db, "abandoned", created_at=NOW - timedelta(days=5))
+    add_job(db, "done-recent", created_at=NOW - timedelta(days=1), status="done")
+    add_job(db, "abandoned-recent", created_at=NOW - timedelta(days=1))
+
+    assert repo.archive_jobs_batch(db, FINISHED_BEFORE, ABANDONED_BEFORE) == 3
+    assert archived(db) == {"done-old", "error-old", "abandoned"}
+    assert remaining(db) == {"done-recent", "abandoned-recent"}
+
+
+def test_paid_jobs_waiting_in_the_queue_are_kept(db):
+    add_job(db, "paid-waiting", enqueued_at=OLD)
+    add_job(db, "processing", status="processing", progress=40.0, enqueued_at=OLD)
+    add_job(db, "drained", progress=12.0, enqueued_at=OLD)  # put back by a scale-in drain
+
+    assert repo.archive_jobs_batch(db, FINISHED_BEFORE, ABANDONED_BEFORE) == 0
+    assert remaining(db) == {"paid-waiting", "processing", "drained"}
+
+
+def test_batches_until_nothing_is_left(db, monkeypatch):
+    import run_archiver
+    monkeypatch.setattr(run_archiver, "ARCHIVE_BATCH_SIZE", 2)
+    for i in range(5):
+        add_job(db, f"done-{i}", status="done")
+
+    assert archive_once() == 5
+    assert remaining(db) == set()
+
+
+def test_archived_rows_keep_every_column(db):
+    add_job(db, "done-old", status="done", enqueued_at=OLD)
+    repo.archive_jobs_batch(db, FINISHED_BEFORE, ABANDONED_BEFORE)
+
+    row = db.get(JobArchive, "done-old")
+    assert (row.upload_id, row.status, row.enqueued_at) == ("done-old", "done", OLD)
+
+
+def test_old_stage_rows_are_pruned(db):
+    repo.add_job_stages(db, ["a"], "uploaded", at=OLD)
+    repo.add_job_stages(db, ["b"], "uploaded", at=NOW)
+    db.commit()
+
+    archive_once()
+    assert set(db.execute(select(JobStage.upload_id)).scalars()) == {"b"}
@@ -0,0 +1,66 @@
+# tests/test_assets.py
+import gzip
+import json
+import pytest
+from starlette.applications import Starlette
+from starlette.routing import Mount
+from starlette.testclient import TestClient
+from app.utils import assets
+from app.utils.assets import IMMUTABLE_CACHE_CONTROL, ImmutableStaticFiles, asset_url
+
+JS = b"console.log('hello');\n" * 50
+
+
+@pytest.fixture
+def built(tmp_path, monkeypatch):
+    (tmp_path / "static").mkdir()
+    (tmp_path / "static" / "script.abc123.js").write_bytes(JS)
+    (tmp_path / "static" / "script.abc123.js.gz").write_bytes(gzip.compress(JS))
+    manifest = tmp_path / "manifest.json"
+    manifest.write_text(json.dumps({"static/script.js": "static/script.abc123.js"}))
+    monkeypatch.setattr(assets, "MANIFEST_PATH", manifest)
+    assets.load_manifest.cache_clear()
+    yield tmp_path
+    assets.load_manifest.cache_clear()
+
+
+@pytest.fixture
+def client(built):
+    app = Starlette(routes=[Mount("/assets", ImmutableStaticFiles(directory=built))])
+    return TestClient(app)
+
+
+def test_asset_url_uses_the_fingerprinted_name(built):
+    assert asset_url("static/script.js") == "/assets/static/script.abc123.js"
+
+
+def test_asset_url_falls_back_without_a_build(tmp_path, monkeypatch):
+    monkeypatch.setattr(assets, "MANIFEST_PATH", tmp_path / "missing.json")
+    assets.load_manifest.cache_clear()
+    try:
+        assert asset_url("static/script.js") == "/static/script.js"
+    finally:
+        assets.load_manifest.cache_clear()
+
+
+def test_precompressed_variant_is_served_when_accepted(client):
+    resp = client.get("/assets/static/script.abc123.js", headers={"Accept-Encoding": "br, gzip"})
+    assert resp.status_code == 200
+    assert resp.headers["content-encoding"] == "gzip"  # no .br built, so the next accepted one
+    assert "javascript" in resp.headers["content-type"]
+    assert resp.content == JS  # the client decoded it
+    assert resp.headers["cache-control"] == IMMUTABLE_CACHE_CONTROL
+    assert resp.headers["vary"] == "Accept-Encoding"
+
+
+def test_identity_when_no_encoding_is_accepted(client):
+    resp = client.get("/assets/static/script.abc123.js", headers={"Accept-Encoding": "identity"})
+    assert "content-encoding" not in resp.headers
+    assert resp.content == JS
+    assert resp.headers["cache-control"] == IMMUTABLE_CACHE_CONTROL
+
+
+def test_missing_assets_are_not_cached_forever(client):
+    resp = client.get("/assets/static/nope.js")
+    assert resp.status_code == 404
+    assert "cache-control" not in resp.headers
@@ -0,0 +1,143 @@
+# tests/test_batch.py
+import asyncio
+import json
+import pytest
+from fastapi import HTTPException
+from app import repo
+from app.routes import batch as batch_routes
+from app.routes.batch import BatchPayRequest, BatchUploadRequest, create_batch_upload, pay_for_batch
+from app.routes.upload import UploadRequest
+from app.utils.redis_utils import QUEUE_NAME
+from app.utils.stripe_utils import STRIPE_BREAKER
+
+CLIP = {"filename": "clip.mp4", "size_bytes": 10, "content_type": "video/mp4", "duration_sec": 5.0}
+
+
+@pytest.fixture
+def batch_id(db, s3):
+    resp = create_batch_upload(BatchUploadRequest(email="a@example.com", files=[UploadRequest(**CLIP)] * 3))
+    assert len(resp["uploads"]) == 3
+    return resp["batch_id"]
+
+
+def pay(batch_id: str, promo_code: str | None = None, price_cents: int = 900) -> dict:
+    req = BatchPayRequest(batch_id=batch_id, email="b@example.com", provider="outlook",
+                          promo_code=promo_code, price_cents=price_cents)
+    return asyncio.run(pay_for_batch(req))
+
+
+def batch_state(db, batch_id: str):
+    db.expire_all()
+    return repo.get_batch(db, batch_id), repo.get_batch_jobs(db, batch_id)
+
+
+def test_upload_validates_every_file(db, s3):
+    with pytest.raises(HTTPException) as e:
+        create_batch_upload(BatchUploadRequest(files=[UploadRequest(**CLIP), UploadRequest(**{**CLIP, "filename": "x.gif"})]))
+    assert e.value.status_code == 400
+
+
+def test_checkout_choices_apply_to_every_job(db, batch_id, redis_client, stripe):
+    pay(batch_id, price_cents=1000)
+    batch, jobs = batch_state(db, batch_id)
+    assert {j.provider for j in jobs} == {"outlook"} and {j.email for j in jobs} == {"b@example.com"}
+    assert sum(j.price_cents for j in jobs) == batch.price_cents == 1000
+
+
+def test_free_batch_is_queued_with_one_push(db, batch_id, redis_client):
+    repo.create_token(db, "FREE", discount_percent=100, usage_limit=1)
+
+    assert pay(batch_id, "FREE")["free"] is True
+    assert redis_client.llen(QUEUE_NAME) == 3
+    assert {json.loads(j)["batch_id"] for j in redis_client.lrange(QUEUE_NAME, 0, -1)} == {batch_id}
+
+    batch, jobs = batch_state(db, batch_id)
+    assert batch.token_used == "FREE"
+    assert all(j.enqueued_at for j in jobs)
+    assert repo.get_token(db, "FREE").usage_count == 1
+
+
+def test_repeating_a_free_payment_does_not_enqueue_twice(db, batch_id, redis_client):
+    repo.create_token(db, "FREE", discount_percent=100, usage_limit=5)
+    pay(batch_id, "FREE")
+    pay(batch_id, "FREE")
+    assert redis_client.llen(QUEUE_NAME) == 3
+    assert repo.get_token(db, "FREE").usage_count == 1
+
+
+def test_failed_free_enqueue_gives_everything_back(db, batch_id, redis_client, monkeypatch):
+    repo.create_token(db, "FREE", discount_percent=100, usage_limit=1)
+    with monkeypatch.context() as m:
+        m.setattr(batch_routes, "enqueue_jobs", lambda jobs: False)
+        with pytest.raises(HTTPException) as e:
+            pay(batch_id, "FREE")
+    assert e.value.status_code == 503
+
+    batch, jobs = batch_state(db, batch_id)
+    assert all(j.enqueued_at is None for j in jobs)
+    assert batch.token_used is None
+    assert repo.get_token(db, "FREE").usage_count == 0
+
+    pay(batch_id, "FREE")  # the retry goes through
+    assert redis_client.llen(QUEUE_NAME) == 3
+
+
+def test_paid_batch_gets_one_checkout_session(db, batch_id, stripe):
+    assert pay(batch_id)["checkout_url"] == "https://checkout.test"
+    session = stripe.sessions[0]
+    assert session.metadata["batch_id"] == batch_id
+    assert session.line_items[0]["price_data"]["unit_amount"] == 900
+
+
+def test_partial_code_is_reserved_and_recorded(db, batch_id, stripe):
+    repo.create_token(db, "HALF", discount_percent=50, usage_limit=1)
+    pay(batch_id, "HALF")
+
+    assert stripe.sessions[0].metadata["token_reserved"] == "1"
+    assert stripe.sessions[0].line_items[0]["price_data"]["unit_amount"] == 450
+    assert batch_state(db, batch_id)[0].token_used == "HALF"
+    assert repo.get_token(db, "HALF").usage_count == 1
+
+
+def test_stripe_failure_releases_the_code(db, batch_id, stripe):
+    repo.create_token(db, "HALF", discount_percent=50, usage_limit=1)
+    stripe.fail_with = ConnectionError("stripe down")
+
+    with pytest.raises(HTTPException) as e:
+        pay(batch_id, "HALF")
+    assert e.value.status_code == 500
+    assert repo.get_token(db, "HALF").usage_count == 0
+    assert batch_state(db, batch_id)[0].token_used is None
+
+
+def test_open_stripe_circuit_is_a_503(db, batch_id, stripe):
+    for _ in range(STRIPE_BREAKER.failure_threshold):
+        STRIPE_BREAKER.record_failure()
+    with pytest.raises(HTTPException) as e:
+        pay(batch_id)
+    assert e.value.status_code == 503
+    assert stripe.sessions == []
+
+
+def test_unknown_batch(db, stripe):
+    with pytest.raises(HTTPException) as e:
+        pay("nope")
+    assert e.value.status_code == 404
+
+
+def test_batch_progress_counts(db, batch_id):
+    _, jobs = batch_state(db, batch_id)
+    repo.update_job_status(db, jobs[0].id, "done")
+    repo.update_job_status(db, jobs[1].id, "error")
+    progress = repo.batch_progress(db, batch_id)
+    assert (progress["total"], progress["done"], progress["failed"]) == (3, 1, 1)
+
+
+def test_returning_to_batch_checkout_reuses_the_reservation(db, batch_id, stripe):
+    repo.create_token(db, "HALF", discount_percent=50, usage_limit=1)
+    pay(batch_id, "HALF")
+    pay(batch_id, "HALF")
+
+    assert len(stripe.sessions) == 2
+    assert repo.get_token(db, "HALF").usage_count == 1
+    assert batch_state(db, batch_id)[0].checkout_session_id == stripe.sessions[1].id
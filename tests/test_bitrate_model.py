@@ -0,0 +1,75 @@
+# tests/test_bitrate_model.py
+import pytest
+from bitrate_model import (
+    DEFAULT_SAFETY, MAX_SAFETY, MIN_SAFETY, MIN_SAMPLES, MIN_VIDEO_KBPS, TARGET_FILL, fit_calibration,
+)
+
+
+def outcome(actual_bytes: int, provider: str = "gmail", video_kbps: int = 1000, truncated: bool = False,
+            width: int = 1280, height: int = 720, duration: float = 30.0, encoder: str = "libx264") -> dict:
+    return {
+        "provider": provider, "encoder": encoder, "target_bytes": 1_000_000, "predicted_bytes": 1_000_000,
+        "actual_bytes": actual_bytes, "truncated": truncated, "video_kbps": video_kbps,
+        "source_width": width, "source_height": height, "duration_sec": duration,
+    }
+
+
+def test_too_few_samples_fall_back_to_default():
+    calibration = fit_calibration([outcome(900_000)] * (MIN_SAMPLES - 1))
+    assert calibration.safety_factor("gmail", 1280, 720, 30.0) == DEFAULT_SAFETY
+
+
+def test_factor_keeps_the_quantile_under_target_fill():
+    calibration = fit_calibration([outcome(1_000_000)] * MIN_SAMPLES)
+    assert calibration.safety_factor("gmail", 1280, 720, 30.0) == pytest.approx(TARGET_FILL)
+
+
+def test_factor_is_clamped():
+    low = fit_calibration([outcome(5_000_000)] * MIN_SAMPLES)
+    high = fit_calibration([outcome(100_000)] * MIN_SAMPLES)
+    assert low.safety_factor("gmail", 1280, 720, 30.0) == MIN_SAFETY
+    assert high.safety_factor("gmail", 1280, 720, 30.0) == MAX_SAFETY
+
+
+def test_truncated_outputs_count_as_overshoot():
+    calibration = fit_calibration([outcome(800_000, truncated=True)] * MIN_SAMPLES)
+    assert calibration.safety_factor("gmail", 1280, 720, 30.0) < DEFAULT_SAFETY
+
+
+def test_unknown_provider_uses_band_then_overall_factor():
+    rows = [outcome(1_100_000)] * MIN_SAMPLES + [outcome(1_000_000, width=3840, height=2160)] * MIN_SAMPLES
+    calibration = fit_calibration(rows)
+    band = calibration.safety_factor("outlook", 1280, 720, 30.0)
+    overall = calibration.safety_factor("outlook", 640, 360, 3000.0)
+    assert band == round(TARGET_FILL / 1.1, 3)
+    assert overall == calibration.factors[(None, None, None, None)]
+
+
+def test_floor_clamped_outcomes_are_excluded():
+    floored = [outcome(100_000, video_kbps=MIN_VIDEO_KBPS)] * MIN_SAMPLES
+    calibration = fit_calibration([outcome(1_100_000)] * MIN_SAMPLES + floored)
+    assert calibration.safety_factor("gmail", 1280, 720, 30.0) == round(TARGET_FILL / 1.1, 3)
+    assert fit_calibration(floored).factors == {}
+
+
+def test_each_encoder_gets_its_own_factor():
+    rows = [outcome(1_000_000)] * MIN_SAMPLES + [outcome(1_200_000, encoder="h264_nvenc")] * MIN_SAMPLES
+    calibration = fit_calibration(rows)
+    assert calibration.safety_factor("gmail", 1280, 720, 30.0, "libx264") == pytest.approx(TARGET_FILL)
+    assert calibration.safety_factor("gmail", 1280, 720, 30.0, "h264_nvenc") == round(TARGET_FILL / 1.2, 3)
+    # without an encoder, both histories are pooled
+    assert calibration.safety_factor("gmail", 1280, 720, 30.0) == round(TARGET_FILL / 1.2, 3)
+
+
+def test_sparse_encoder_falls_back_to_the_encoder_agnostic_factor():
+    rows = [outcome(1_100_000)] * MIN_SAMPLES + [outcome(2_000_000, encoder="hevc_vaapi")] * (MIN_SAMPLES - 1)
+    calibration = fit_calibration(rows)
+    pooled = calibration.safety_factor("gmail", 1280, 720, 30.0)
+    assert calibration.safety_factor("gmail", 1280, 720, 30.0, "hevc_vaapi") == pooled
+    assert calibration.safety_factor("gmail", 1280, 720, 30.0, "libsvtav1") == pooled
+
+
+def test_encoder_history_is_shared_across_providers():
+    rows = [outcome(1_200_000, provider="gmail", encoder="h264_nvenc")] * MIN_SAMPLES
+    calibration = fit_calibration(rows)
+    assert calibration.safety_factor("outlook", 1280, 720, 30.0, "h264_nvenc") == round(TARGET_FILL / 1.2, 3)
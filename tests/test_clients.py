@@ -0,0 +1,93 @@
+# tests/test_clients.py
+import os
+import subprocess
+import sys
+import pytest
+from app.utils import clients
+
+ROOT = os.path.join(os.path.dirname(__file__), "..")
+
+
+@pytest.fixture
+def registry(monkeypatch):
+    """An empty client registry, restored afterwards."""
+    fresh = {}
+    monkeypatch.setattr(clients, "_clients", fresh)
+    return fresh
+
+
+class Closable:
+    def __init__(self):
+        self.closed = False
+
+    def close(self):
+        self.closed = True
+
+
+def test_importing_the_api_and_worker_creates_no_clients():
+    code = (
+        "import sys; sys.path.insert(0, 'worker')\n"
+        "import app.main, worker\n"
+        "from app.utils.clients import _clients\n"
+        "print(sorted(_clients))"
+    )
+    out = subprocess.run([sys.executable, "-c", code], cwd=ROOT, capture_output=True, text=True, timeout=60)
+    assert out.returncode == 0, out.stderr
+    assert out.stdout.strip().splitlines()[-1] == "[]"
+
+
+def test_client_is_built_once_on_first_use(registry):
+    built = []
+    factory = lambda: built.append(1) or Closable()
+    first = clients._get("thing", factory)
+    assert clients._get("thing", factory) is first
+    assert built == [1]
+
+
+def test_close_all_releases_and_forgets_every_client(registry):
+    thing = clients._get("thing", Closable)
+    clients.close_all()
+    assert thing.closed
+    assert registry == {}
+    assert clients._get("thing", Closable) is not thing
+
+
+def test_a_failing_close_does_not_stop_the_others(registry):
+    class Broken:
+        def close(self):
+            raise RuntimeError("boom")
+
+    registry["broken"] = Broken()
+    ok = registry["ok"] = Closable()
+    clients.close_all()
+    assert ok.closed
+
+
+# ───────────── Pool stats ─────────────
+
+def test_pool_stats_omits_clients_never_created(registry):
+    assert clients.pool_stats() == {}
+
+
+def test_redis_pool_is_bounded_and_reports_checkouts(registry, monkeypatch):
+    import redis
+    monkeypatch.setattr(redis.Connection, "connect", lambda self: None)  # no server needed
+    monkeypatch.setattr(redis.Connection, "can_read", lambda self, timeout=0: False)
+    monkeypatch.setenv("REDIS_URL", "redis://localhost:6379/0")
+    monkeypatch.setattr(clients, "REDIS_MAX_CONNECTIONS", 3)
+    pool = clients.get_redis().connection_pool
+
+    conn = pool.get_connection("PING")
+    assert clients.pool_stats()["redis"] == {"max_connections": 3, "created": 1, "in_use": 1}
+    pool.release(conn)
+    assert clients.pool_stats()["redis"] == {"max_connections": 3, "created": 1, "in_use": 0}
+
+
+def test_database_pool_reports_checked_out_connections(registry, tmp_path, monkeypatch):
+    monkeypatch.setenv("DATABASE_URL", f"sqlite:///{tmp_path}/pool.db")
+    engine = clients.get_engine()
+    with engine.connect():
+        stats = clients.pool_stats()["postgres"]
+        assert stats["checked_out"] == 1
+    assert clients.pool_stats()["postgres"]["checked_out"] == 0
+    engine.dispose()
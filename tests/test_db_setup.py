@@ -0,0 +1,65 @@
+# tests/test_db_setup.py
+import os
+import runpy
+from sqlalchemy import text
+
+RUN_DB_SETUP = os.path.join(os.path.dirname(__file__), "..", "run_db_setup.py")
+
+LEGACY_SCHEMA = """
+CREATE TABLE tokens (code VARCHAR PRIMARY KEY, discount_percent INTEGER, usage_limit INTEGER,
+                     usage_count INTEGER, created_at DATETIME);
+CREATE TABLE jobs (
+    id VARCHAR PRIMARY KEY, upload_id VARCHAR UNIQUE NOT NULL, email VARCHAR NOT NULL,
+    provider VARCHAR NOT NULL, priority BOOLEAN NOT NULL, transcript BOOLEAN NOT NULL,
+    size_bytes INTEGER NOT NULL, duration_sec FLOAT NOT NULL, price_cents INTEGER NOT NULL,
+    status VARCHAR NOT NULL, progress FLOAT NOT NULL, error TEXT, input_path TEXT NOT NULL,
+    output_path TEXT, created_at DATETIME NOT NULL, updated_at DATETIME NOT NULL,
+    completed_at DATETIME, filename TEXT, output_url TEXT, token_used TEXT REFERENCES tokens(code)
+);
+"""
+
+
+def legacy_job(conn, job_id: str, provider: str, status: str = "queued"):
+    conn.execute(text(
+        "INSERT INTO jobs (id, upload_id, email, provider, priority, transcript, size_bytes, duration_sec,"
+        " price_cents, status, progress, input_path, created_at, updated_at)"
+        " VALUES (:id, :id, 'a@example.com', :provider, 0, 0, 1, 1.0, 0, :status, 0, 'x',"
+        " '2026-01-01 00:00:00', '2026-01-01 00:00:00')"
+    ), {"id": job_id, "provider": provider, "status": status})
+
+
+def run_db_setup():
+    runpy.run_path(RUN_DB_SETUP)
+
+
+def enqueued(conn) -> dict:
+    return dict(conn.execute(text("SELECT id, enqueued_at FROM jobs")).all())
+
+
+def test_adding_enqueued_at_backfills_jobs_that_reached_checkout(engine):
+    with engine.begin() as conn:
+        for statement in LEGACY_SCHEMA.split(";"):
+            if statement.strip():
+                conn.execute(text(statement))
+        legacy_job(conn, "paid-queued", "gmail")
+        legacy_job(conn, "finished", "outlook", status="done")
+        legacy_job(conn, "never-paid", "pending")
+
+    run_db_setup()
+
+    with engine.connect() as conn:
+        state = enqueued(conn)
+    assert state["paid-queued"] is not None
+    assert state["finished"] is not None
+    assert state["never-paid"] is None
+
+
+def test_backfill_only_runs_when_the_column_is_added(engine):
+    run_db_setup()
+    with engine.begin() as conn:
+        legacy_job(conn, "new-unpaid", "gmail")
+
+    run_db_setup()
+
+    with engine.connect() as conn:
+        assert enqueued(conn)["new-unpaid"] is None
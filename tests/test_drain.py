@@ -0,0 +1,89 @@
+# tests/test_drain.py
+import json
+import signal
+import time
+import pytest
+import worker
+from app.utils.redis_utils import QUEUE_NAME
+
+
+@pytest.fixture(autouse=True)
+def running(monkeypatch):
+    """A worker that has not been signalled; the drain state is global to the process."""
+    worker.shutdown_requested.clear()
+    monkeypatch.setattr(worker, "_drain_deadline", None)
+    monkeypatch.setattr(worker, "WORKER_STOP_TIMEOUT_SEC", 30.0)
+    monkeypatch.setattr(worker, "DRAIN_UPLOAD_MARGIN_SEC", 10)
+    yield
+    worker.shutdown_requested.clear()
+
+
+def test_anything_fits_until_a_signal_arrives():
+    assert worker.fits_before_deadline(None)
+    assert worker.fits_before_deadline(10_000)
+
+
+def test_after_sigterm_only_work_that_beats_the_deadline_fits():
+    worker.request_shutdown(signal.SIGTERM, None)
+    assert worker.fits_before_deadline(5)  # 5s + 10s margin < 30s
+    assert not worker.fits_before_deadline(25)
+    assert not worker.fits_before_deadline(None)  # unknown remaining time
+
+
+def test_a_second_signal_does_not_extend_the_deadline():
+    worker.request_shutdown(signal.SIGTERM, None)
+    deadline = worker._drain_deadline
+    time.sleep(0.01)
+    worker.request_shutdown(signal.SIGTERM, None)
+    assert worker._drain_deadline == deadline
+
+
+def test_drained_job_goes_back_to_the_front_of_the_queue(redis_client, monkeypatch):
+    def db_down():
+        raise ConnectionError("db down")
+
+    monkeypatch.setattr(worker, "get_db_conn", db_down)  # the push must not depend on the reset
+    redis_client.rpush(QUEUE_NAME, json.dumps({"upload_id": "next"}))
+
+    worker.requeue_job({"upload_id": "cut-short", "requeued": 1}, 42.44, "shutdown during encode")
+    front = json.loads(redis_client.lindex(QUEUE_NAME, 0))
+    assert front == {"upload_id": "cut-short", "requeued": 2, "drained_at_progress": 42.4}
+
+
+def start_worker(monkeypatch, redis_client, compress_video):
+    monkeypatch.setattr(worker, "connect_redis", lambda: redis_client)
+    monkeypatch.setattr(worker, "calibrate_encoders", lambda cache=None: None)
+    monkeypatch.setattr(worker, "refresh_calibration", lambda force=False: None)
+    monkeypatch.setattr(worker, "compress_video", compress_video)
+    monkeypatch.setattr(signal, "signal", lambda signum, handler: None)
+    worker.run_worker()
+
+
+def test_worker_finishes_its_job_and_stops_pulling_after_sigterm(redis_client, monkeypatch):
+    for upload_id in ("a", "b"):
+        redis_client.rpush(QUEUE_NAME, json.dumps({"upload_id": upload_id}))
+    done = []
+
+    def compress_video(job):
+        worker.request_shutdown(signal.SIGTERM, None)  # arrives mid-job
+        done.append(job["upload_id"])
+
+    start_worker(monkeypatch, redis_client, compress_video)
+    assert done == ["a"]
+    assert [json.loads(p)["upload_id"] for p in redis_client.lrange(QUEUE_NAME, 0, -1)] == ["b"]
+    assert not redis_client.hexists(worker.WORKERS_KEY, worker.WORKER_ID)
+
+
+def test_job_popped_as_the_signal_lands_is_returned_untouched(redis_client, monkeypatch):
+    payload = json.dumps({"upload_id": "a", "priority": True})
+    redis_client.rpush(QUEUE_NAME, payload)
+    blpop = redis_client.blpop
+
+    def blpop_then_signal(*args, **kwargs):
+        popped = blpop(*args, **kwargs)
+        worker.request_shutdown(signal.SIGTERM, None)
+        return popped
+
+    monkeypatch.setattr(redis_client, "blpop", blpop_then_signal)
+    start_worker(monkeypatch, redis_client, lambda job: pytest.fail("job should not run"))
+    assert redis_client.lrange(QUEUE_NAME, 0, -1) == [payload]
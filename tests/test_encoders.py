@@ -0,0 +1,53 @@
+# tests/test_encoders.py
+import json
+import pytest
+import encoders
+from encoders import BACKENDS, CALIBRATION_CACHE_KEY, Encoder, calibrate_encoders
+
+
+@pytest.fixture(autouse=True)
+def declared_costs(monkeypatch):
+    for encoder in BACKENDS.values():
+        monkeypatch.setattr(encoder, "cost", type(encoder).cost)
+    monkeypatch.setattr(encoders, "machine_fingerprint", lambda: "ffmpeg-test|cpu|2")
+
+
+def test_encoder_must_define_video_args():
+    with pytest.raises(TypeError):
+        Encoder()
+
+
+def test_estimate_scales_with_megapixel_frames():
+    x264 = BACKENDS["libx264"]
+    fmt = {"width": 1000, "height": 1000, "fps": 10}
+    assert x264.estimate_seconds(60, fmt) == pytest.approx(600 * x264.cost)
+
+
+def test_cached_costs_skip_the_benchmark(redis_client, monkeypatch):
+    redis_client.hset(CALIBRATION_CACHE_KEY, "ffmpeg-test|cpu|2", json.dumps({"libx264": 0.5, "unknown": 1.0}))
+    monkeypatch.setattr(encoders, "_benchmark_encoders", lambda: pytest.fail("benchmark ran"))
+
+    calibrate_encoders(cache=redis_client)
+    assert BACKENDS["libx264"].cost == 0.5
+
+
+def test_cache_miss_benchmarks_and_stores(redis_client, monkeypatch):
+    monkeypatch.setattr(encoders, "_benchmark_encoders", lambda: {"libx264": 0.25})
+    calibrate_encoders(cache=redis_client)
+    assert json.loads(redis_client.hget(CALIBRATION_CACHE_KEY, "ffmpeg-test|cpu|2")) == {"libx264": 0.25}
+
+
+def test_always_ignores_the_cache(redis_client, monkeypatch):
+    redis_client.hset(CALIBRATION_CACHE_KEY, "ffmpeg-test|cpu|2", json.dumps({"libx264": 0.5}))
+    monkeypatch.setattr(encoders, "ENCODER_CALIBRATION", "always")
+    monkeypatch.setattr(encoders, "_benchmark_encoders", lambda: {"libx264": 0.25})
+
+    calibrate_encoders(cache=redis_client)
+    assert json.loads(redis_client.hget(CALIBRATION_CACHE_KEY, "ffmpeg-test|cpu|2")) == {"libx264": 0.25}
+
+
+def test_off_keeps_declared_costs(redis_client, monkeypatch):
+    monkeypatch.setattr(encoders, "ENCODER_CALIBRATION", "off")
+    monkeypatch.setattr(encoders, "_benchmark_encoders", lambda: pytest.fail("benchmark ran"))
+    calibrate_encoders(cache=redis_client)
+    assert BACKENDS["libx264"].cost == encoders.X264.cost
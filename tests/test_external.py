@@ -0,0 +1,111 @@
+# tests/test_external.py
+import asyncio
+import threading
+import time
+import pytest
+from app.utils.external import CircuitBreaker, ServiceUnavailable, guarded, run_blocking
+from app.utils.stripe_utils import _stripe_outage
+
+
+class StripeError(Exception):
+    def __init__(self, http_status=None):
+        self.http_status = http_status
+
+
+async def ok():
+    return "ok"
+
+
+async def boom():
+    raise ConnectionError("down")
+
+
+def call(breaker: CircuitBreaker, make_awaitable, timeout: float = 1.0):
+    return asyncio.run(guarded(breaker, timeout, make_awaitable))
+
+
+def trip(breaker: CircuitBreaker):
+    for _ in range(breaker.failure_threshold):
+        with pytest.raises(ConnectionError):
+            call(breaker, boom)
+
+
+def test_breaker_opens_after_consecutive_failures_and_fails_fast():
+    breaker = CircuitBreaker("svc", failure_threshold=3, reset_after_sec=60)
+    trip(breaker)
+    assert breaker.state == "open"
+
+    with pytest.raises(ServiceUnavailable, match="circuit open"):
+        call(breaker, lambda: pytest.fail("called through an open circuit"))
+
+
+def test_a_success_resets_the_failure_count():
+    breaker = CircuitBreaker("svc", failure_threshold=2)
+    with pytest.raises(ConnectionError):
+        call(breaker, boom)
+    assert call(breaker, ok) == "ok"
+    with pytest.raises(ConnectionError):
+        call(breaker, boom)
+    assert breaker.state == "closed"
+
+
+def test_half_open_lets_one_probe_through():
+    breaker = CircuitBreaker("svc", failure_threshold=1, reset_after_sec=0.05)
+    trip(breaker)
+    time.sleep(0.06)
+    assert breaker.state == "half-open"
+    assert breaker.allow()
+    assert not breaker.allow()  # a second caller while the probe is out
+
+    breaker.record_success()
+    assert breaker.state == "closed"
+
+
+def test_failed_probe_reopens_the_circuit():
+    breaker = CircuitBreaker("svc", failure_threshold=1, reset_after_sec=0.05)
+    trip(breaker)
+    time.sleep(0.06)
+    with pytest.raises(ConnectionError):
+        call(breaker, boom)
+    assert breaker.state == "open"
+
+
+def test_timeout_counts_as_a_failure():
+    breaker = CircuitBreaker("svc", failure_threshold=1)
+    with pytest.raises(ServiceUnavailable, match="timed out"):
+        call(breaker, lambda: asyncio.sleep(1), timeout=0.01)
+    assert breaker.state == "open"
+
+
+def test_caller_errors_do_not_trip_the_breaker():
+    breaker = CircuitBreaker("stripe", failure_threshold=1, is_failure=_stripe_outage)
+
+    async def bad_request():
+        raise StripeError(http_status=400)
+
+    with pytest.raises(StripeError):
+        call(breaker, bad_request)
+    assert breaker.state == "closed"
+
+
+@pytest.mark.parametrize("status, outage", [(None, True), (500, True), (503, True), (400, False), (429, False)])
+def test_stripe_outage_classification(status, outage):
+    assert _stripe_outage(StripeError(http_status=status)) is outage
+
+
+def test_run_blocking_keeps_the_loop_free():
+    breaker = CircuitBreaker("svc")
+    gate = threading.Event()
+
+    def blocking_call(x):
+        assert gate.wait(5)
+        return (x, threading.current_thread().name)
+
+    async def main():
+        pending = asyncio.ensure_future(run_blocking(breaker, 5, blocking_call, 7))
+        await asyncio.sleep(0.01)  # the loop still runs while the call is blocked
+        gate.set()
+        return await pending
+
+    value, thread = asyncio.run(main())
+    assert value == 7 and thread.startswith("external")
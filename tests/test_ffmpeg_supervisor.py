@@ -0,0 +1,82 @@
+# tests/test_ffmpeg_supervisor.py
+import sys
+import time
+import pytest
+from ffmpeg_supervisor import FFMPEG_BUDGET_REALTIME, FFMPEG_MIN_BUDGET_SEC, FfmpegError, supervise_ffmpeg, wall_budget
+
+# Stand-ins for ffmpeg: small Python programs writing -progress style lines to stdout
+
+
+def fake_ffmpeg(body: str) -> list[str]:
+    return [sys.executable, "-c", "import sys, time\n" + body]
+
+
+def test_clean_run_returns_the_stderr_tail_and_feeds_every_line():
+    lines = []
+    cmd = fake_ffmpeg(
+        "for i in range(3):\n"
+        "    print(f'out_time_us={i}', flush=True)\n"
+        "for i in range(5000):\n"
+        "    sys.stderr.write(f'log line {i}\\n')\n"  # more than a pipe buffer
+        "print('progress=end', flush=True)\n"
+    )
+    tail = supervise_ffmpeg(cmd, on_line=lines.append)
+    assert [l.strip() for l in lines] == ["out_time_us=0", "out_time_us=1", "out_time_us=2", "progress=end"]
+    assert tail.endswith("log line 4999")
+    assert "log line 0\n" not in tail
+
+
+def test_nonzero_exit_is_failed_with_the_stderr_tail():
+    with pytest.raises(FfmpegError) as e:
+        supervise_ffmpeg(fake_ffmpeg("sys.stderr.write('Invalid data found\\n'); sys.exit(3)"))
+    assert e.value.kind == "failed"
+    assert "exit code 3" in str(e.value) and e.value.stderr_tail == "Invalid data found"
+
+
+def test_output_that_stops_advancing_is_stalled():
+    cmd = fake_ffmpeg("print('out_time_us=5', flush=True)\ntime.sleep(60)")
+    started = time.time()
+    with pytest.raises(FfmpegError) as e:
+        supervise_ffmpeg(cmd, stall_sec=0.5)
+    assert e.value.kind == "stalled"
+    assert time.time() - started < 10
+
+
+def test_repeating_the_same_out_time_is_still_a_stall():
+    cmd = fake_ffmpeg("while True:\n    print('out_time_us=5', flush=True)\n    time.sleep(0.1)")
+    with pytest.raises(FfmpegError) as e:
+        supervise_ffmpeg(cmd, stall_sec=0.5)
+    assert e.value.kind == "stalled"
+
+
+def test_progressing_run_over_its_budget_is_timeout():
+    cmd = fake_ffmpeg(
+        "i = 0\n"
+        "while True:\n"
+        "    i += 1\n"
+        "    print(f'out_time_us={i}', flush=True)\n"
+        "    time.sleep(0.1)"
+    )
+    with pytest.raises(FfmpegError) as e:
+        supervise_ffmpeg(cmd, stall_sec=30, wall_budget_sec=0.5)
+    assert e.value.kind == "timeout"
+
+
+def test_callback_exception_kills_ffmpeg_and_propagates():
+    class Drained(Exception):
+        pass
+
+    def on_line(line):
+        raise Drained()
+
+    cmd = fake_ffmpeg("print('out_time_us=1', flush=True)\ntime.sleep(60)")
+    started = time.time()
+    with pytest.raises(Drained):
+        supervise_ffmpeg(cmd, on_line=on_line)
+    assert time.time() - started < 10
+
+
+def test_wall_budget_scales_with_duration_and_estimate():
+    assert wall_budget(1.0) == FFMPEG_MIN_BUDGET_SEC
+    assert wall_budget(3600.0) == 3600.0 * FFMPEG_BUDGET_REALTIME
+    assert wall_budget(1.0, estimate_sec=1000.0) == 3000.0
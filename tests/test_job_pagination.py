@@ -0,0 +1,58 @@
+# tests/test_job_pagination.py
+from datetime import datetime, timedelta
+from app import repo
+from app.models.models import Job
+
+START = datetime(2026, 1, 1, 12, 0, 0)
+
+
+def add_job(db, job_id: str, created_at: datetime, **fields) -> Job:
+    job = Job(
+        id=job_id, upload_id=f"upload-{job_id}", email="a@example.com", provider="gmail",
+        size_bytes=1, duration_sec=1.0, input_path=f"uploads/{job_id}", created_at=created_at,
+        **fields,
+    )
+    db.add(job)
+    db.commit()
+    return job
+
+
+def test_cursor_round_trip(db):
+    job = add_job(db, "job-1", START)
+    assert repo.decode_job_cursor(repo.encode_job_cursor(job)) == (START, "job-1")
+
+
+def test_pages_cover_every_job_once_newest_first(db):
+    for i in range(7):
+        add_job(db, f"job-{i}", START + timedelta(minutes=i))
+
+    seen, cursor = [], None
+    while True:
+        jobs, cursor = repo.list_jobs(db, limit=3, cursor=cursor)
+        seen += [j.id for j in jobs]
+        if cursor is None:
+            break
+
+    assert seen == [f"job-{i}" for i in reversed(range(7))]
+
+
+def test_ties_on_created_at_break_on_id(db):
+    for job_id in ("b", "a", "c"):
+        add_job(db, job_id, START)
+
+    first, cursor = repo.list_jobs(db, limit=2)
+    rest, last_cursor = repo.list_jobs(db, limit=2, cursor=cursor)
+
+    assert [j.id for j in first] == ["c", "b"]
+    assert [j.id for j in rest] == ["a"]
+    assert last_cursor is None
+
+
+def test_filters_apply_before_the_cursor(db):
+    for i in range(4):
+        add_job(db, f"job-{i}", START + timedelta(minutes=i), status="done" if i % 2 else "queued")
+
+    jobs, cursor = repo.list_jobs(db, limit=1, status="done")
+    more, _ = repo.list_jobs(db, limit=1, cursor=cursor, status="done")
+
+    assert [j.id for j in jobs + more] == ["job-3", "job-1"]
@@ -0,0 +1,67 @@
+# tests/test_job_stages.py
+from datetime import datetime, timedelta
+from app import repo
+from app.models.models import JobStage
+
+T0 = datetime(2026, 1, 1, 12, 0, 0)
+
+
+def stage(db, upload_id: str, name: str, seconds: float):
+    repo.add_job_stages(db, [upload_id], name, at=T0 + timedelta(seconds=seconds))
+
+
+def test_percentile_interpolates_between_ranks():
+    values = [1.0, 2.0, 3.0, 4.0, 5.0]
+    assert repo._percentile(values, 0.5) == 3.0
+    assert repo._percentile(values, 0.95) == 4.8
+    assert repo._percentile([7.0], 0.99) == 7.0
+
+
+def test_spans_are_measured_per_job(db):
+    for i, wait in enumerate([10, 20, 30, 40, 50]):
+        stage(db, f"j{i}", "enqueued", 0)
+        stage(db, f"j{i}", "dequeued", wait)
+    db.commit()
+
+    report = repo.stage_latency_percentiles(db, since=T0 - timedelta(hours=1))
+    assert report["enqueued→dequeued"] == {"count": 5, "p50": 30.0, "p95": 48.0, "p99": 49.6}
+    assert "dequeued→download_done" not in report  # no job got there
+
+
+def test_end_to_end_spans_skip_jobs_missing_a_stage(db):
+    stage(db, "a", "enqueued", 0)
+    stage(db, "a", "upload_done", 100)
+    stage(db, "b", "upload_done", 50)  # never recorded as enqueued
+    db.commit()
+
+    assert repo.stage_latency_percentiles(db, since=T0)["enqueued→upload_done"]["count"] == 1
+
+
+def test_only_spans_ending_after_since_count(db):
+    stage(db, "old", "enqueued", 0)
+    stage(db, "old", "dequeued", 10)
+    stage(db, "new", "enqueued", 0)
+    stage(db, "new", "dequeued", 3600)
+    db.commit()
+
+    report = repo.stage_latency_percentiles(db, since=T0 + timedelta(minutes=30))
+    assert report["enqueued→dequeued"]["count"] == 1
+    assert report["enqueued→dequeued"]["p50"] == 3600.0
+
+
+def test_a_repeated_stage_counts_from_its_first_time(db):
+    stage(db, "a", "enqueued", 0)
+    stage(db, "a", "dequeued", 30)
+    stage(db, "a", "dequeued", 90)  # picked up again after a drain requeued it
+    db.commit()
+
+    assert repo.stage_latency_percentiles(db, since=T0)["enqueued→dequeued"]["p50"] == 30.0
+
+
+def test_prune_drops_old_stage_rows(db):
+    stage(db, "a", "uploaded", 0)
+    stage(db, "a", "paid", 7200)
+    db.commit()
+
+    assert repo.prune_job_stages(db, before=T0 + timedelta(hours=1)) == 1
+    assert [s.stage for s in db.query(JobStage).all()] == ["paid"]
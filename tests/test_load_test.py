@@ -0,0 +1,64 @@
+# tests/test_load_test.py
+import asyncio
+import json
+import pytest
+from sqlalchemy import text
+from app import repo
+from load_test import FREE_TOKEN_CODE, MeteredApp, Metrics, StubStripe, percentile, prepare_database, route_label
+
+
+def test_routes_with_ids_share_a_label():
+    assert route_label("GET", "/events/abc-123") == "GET /events/{id}"
+    assert route_label("GET", "/download/abc-123") == "GET /download/{id}"
+    assert route_label("POST", "/api/pay") == "POST /api/pay"
+
+
+def test_percentile_interpolates():
+    assert percentile([3.0, 1.0, 2.0], 0.5) == 2.0
+    assert percentile([0.0, 10.0], 0.95) == 9.5
+
+
+def test_stub_stripe_builds_the_completed_event_for_a_session():
+    stripe = StubStripe()
+    session = stripe.checkout.Session.create(
+        metadata={"upload_id": "u1"}, customer_email="a@example.com",
+        line_items=[{"price_data": {"unit_amount": 499}}],
+    )
+    event = stripe.completed_event(session.id)
+    assert event["type"] == "checkout.session.completed"
+    assert event["data"]["object"]["metadata"] == {"upload_id": "u1"}
+    assert event["data"]["object"]["amount_total"] == 499
+
+    assert stripe.Webhook.construct_event(json.dumps(event), "t=1,v1=x", "whsec") == event
+    with pytest.raises(ValueError):
+        stripe.Webhook.construct_event(json.dumps(event), None, "whsec")
+
+
+def test_prepare_database_creates_the_free_token(db):
+    prepare_database()
+    assert repo.get_token(db, FREE_TOKEN_CODE).discount_percent == 100
+
+
+def test_metered_app_times_requests_and_counts_their_queries(engine):
+    prepare_database()
+
+    async def app(scope, receive, send):
+        with engine.connect() as conn:
+            conn.execute(text("SELECT 1"))
+            conn.execute(text("SELECT 2"))
+        await send({"type": "http.response.start", "status": 201, "headers": []})
+        await send({"type": "http.response.body", "body": b"ok"})
+
+    async def send(message):
+        pass
+
+    metrics = Metrics()
+    scope = {"type": "http", "method": "GET", "path": "/events/abc"}
+    asyncio.run(MeteredApp(app, metrics)(scope, None, send))
+
+    [(latency, queries, status)] = metrics.samples["GET /events/{id}"]
+    assert latency > 0 and queries == 2 and status == 201
+
+    with engine.connect() as conn:  # outside a request nothing is counted
+        conn.execute(text("SELECT 3"))
+    assert len(metrics.samples) == 1
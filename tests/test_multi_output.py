@@ -0,0 +1,80 @@
+# tests/test_multi_output.py
+import pytest
+import worker
+from bitrate_model import Calibration
+from encoders import BACKENDS
+from app.utils.redis_utils import split_providers
+
+SOURCE = {"width": 1920, "height": 1080, "fps": 30.0}
+X264 = BACKENDS["libx264"]
+
+
+def target(provider: str, width: int, fps: float, target_bytes: int = 10_000_000, path: str = "out.mp4") -> dict:
+    height = width * 9 // 16
+    return {
+        "provider": provider, "target_bytes": target_bytes, "v_kbps": 1000, "encoder": X264,
+        "fmt": {"width": width, "height": height, "fps": fps}, "path": path,
+    }
+
+
+def after(cmd: list[str], flag: str) -> list[str]:
+    return [cmd[i + 1] for i, arg in enumerate(cmd) if arg == flag]
+
+
+def test_single_target_uses_a_plain_filter_chain():
+    cmd = worker.build_ffmpeg_cmd("in.mp4", SOURCE, [target("gmail", 1280, 24)])
+    assert "-filter_complex" not in cmd
+    assert after(cmd, "-vf") == ["fps=24,scale=1280:720,format=yuv420p"]
+    assert after(cmd, "-map") == ["0:v:0", "0:a:0?"]
+    assert after(cmd, "-fs") == ["10000000"]
+
+
+def test_several_targets_share_one_decode_through_split():
+    targets = [
+        target("gmail", 1280, 24, 25_000_000, "a.mp4"),
+        target("outlook", 640, 15, 20_000_000, "b.mp4"),
+        target("yahoo", 1920, 30, 25_000_000, "c.mp4"),
+    ]
+    cmd = worker.build_ffmpeg_cmd("in.mp4", SOURCE, targets)
+
+    assert after(cmd, "-i") == ["in.mp4"]  # decoded once
+    assert after(cmd, "-filter_complex") == [
+        "[0:v:0]split=3[s0][s1][s2];"
+        "[s0]fps=24,scale=1280:720,format=yuv420p[v0];"
+        "[s1]fps=15,scale=640:360,format=yuv420p[v1];"
+        "[s2]format=yuv420p[v2]"
+    ]
+    assert "-vf" not in cmd
+    assert after(cmd, "-map") == ["[v0]", "0:a:0?", "[v1]", "0:a:0?", "[v2]", "0:a:0?"]
+    assert after(cmd, "-fs") == ["25000000", "20000000", "25000000"]
+    # each output's options come right before its own path
+    assert cmd.index("a.mp4") < cmd.index("[v1]") < cmd.index("b.mp4") < cmd.index("[v2]") < cmd.index("c.mp4")
+    assert cmd[-1] == "c.mp4"
+
+
+def test_plan_targets_gives_the_primary_output_the_old_key(monkeypatch):
+    monkeypatch.setattr(worker, "queue_depth", lambda: 0)
+    monkeypatch.setattr(worker, "available_encoders", lambda: [X264])
+    targets = worker.plan_targets("u1", ["gmail", "outlook", "gmail"], 30.0, SOURCE)
+
+    assert [t["provider"] for t in targets] == ["gmail", "outlook"]  # duplicates dropped
+    assert [t["key"] for t in targets] == ["outputs/u1_compressed.mp4", "outputs/u1_outlook.mp4"]
+    assert targets[0]["path"] != targets[1]["path"]
+    assert [t["target_bytes"] for t in targets] == [worker.choose_target("gmail"), worker.choose_target("outlook")]
+
+
+
+def test_plan_targets_sizes_the_bitrate_with_the_chosen_encoders_factor(monkeypatch):
+    monkeypatch.setattr(worker, "queue_depth", lambda: 0)
+    monkeypatch.setattr(worker, "available_encoders", lambda: [X264])
+    factors = {("gmail", None, "fhd", "short"): 0.9, ("gmail", "libx264", "fhd", "short"): 0.8}
+    monkeypatch.setattr(worker, "calibration", Calibration(factors))
+    (t,) = worker.plan_targets("u1", ["gmail"], 30.0, SOURCE)
+
+    assert t["safety"] == 0.8
+    assert t["v_kbps"] == worker.safe_bitrate_calc(30.0, t["target_bytes"], safety=0.8)
+
+@pytest.mark.parametrize("value, expected", [(None, []), ("", []), ("outlook", ["outlook"]),
+                                             ("outlook,,yahoo", ["outlook", "yahoo"])])
+def test_split_providers(value, expected):
+    assert split_providers(value) == expected
@@ -0,0 +1,26 @@
+# tests/test_output_format.py
+from worker import MIN_BITS_PER_PIXEL, choose_output_format
+
+SOURCE_1080P = {"width": 1920, "height": 1080, "fps": 30.0}
+
+
+def test_high_bitrate_keeps_source_format():
+    fmt = choose_output_format(8000, SOURCE_1080P)
+    assert (fmt["width"], fmt["height"], fmt["fps"]) == (1920, 1080, 30.0)
+
+
+def test_low_bitrate_steps_down_the_ladder():
+    fmt = choose_output_format(500, SOURCE_1080P)
+    assert fmt["width"] < 1920
+    assert fmt["bpp"] >= MIN_BITS_PER_PIXEL
+    assert fmt["width"] % 2 == 0 and fmt["height"] % 2 == 0
+
+
+def test_never_upscales_or_raises_fps():
+    fmt = choose_output_format(8000, {"width": 640, "height": 360, "fps": 15.0})
+    assert (fmt["width"], fmt["height"], fmt["fps"]) == (640, 360, 15.0)
+
+
+def test_starved_bitrate_returns_smallest_rung():
+    fmt = choose_output_format(10, SOURCE_1080P)
+    assert (fmt["width"], fmt["fps"]) == (320, 10)
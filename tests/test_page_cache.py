@@ -0,0 +1,59 @@
+# tests/test_page_cache.py
+import gzip
+import pytest
+from jinja2 import DictLoader, Environment
+from starlette.requests import Request
+from app.utils.page_cache import PageCache, accepted_encodings
+
+
+@pytest.fixture
+def cache():
+    return PageCache(Environment(loader=DictLoader({"index.html": "<h1>{{ title }}</h1>" + "x" * 500})))
+
+
+def request(accept_encoding: str | None = None, if_none_match: str | None = None) -> Request:
+    headers = []
+    if accept_encoding is not None:
+        headers.append((b"accept-encoding", accept_encoding.encode()))
+    if if_none_match is not None:
+        headers.append((b"if-none-match", if_none_match.encode()))
+    return Request({"type": "http", "headers": headers})
+
+
+def test_each_encoding_has_its_own_etag(cache):
+    identity = cache.response(request(), "index.html", title="Hi")
+    gzipped = cache.response(request("gzip"), "index.html", title="Hi")
+    brotli = cache.response(request("br, gzip"), "index.html", title="Hi")
+
+    etags = {identity.headers["etag"], gzipped.headers["etag"], brotli.headers["etag"]}
+    assert len(etags) == 3
+    assert gzipped.headers["etag"] == identity.headers["etag"][:-1] + '-gzip"'
+    assert gzip.decompress(gzipped.body) == identity.body
+    assert brotli.headers["content-encoding"] == "br"
+    assert "content-encoding" not in identity.headers
+
+
+def test_revalidating_the_same_variant_is_a_304(cache):
+    etag = cache.response(request("gzip"), "index.html", title="Hi").headers["etag"]
+    resp = cache.response(request("gzip", if_none_match=etag), "index.html", title="Hi")
+    assert resp.status_code == 304 and resp.body == b""
+    assert resp.headers["etag"] == etag
+
+    weak = cache.response(request("gzip", if_none_match=f"W/{etag}"), "index.html", title="Hi")
+    assert weak.status_code == 304
+
+
+def test_another_variants_etag_gets_the_full_body(cache):
+    gzip_etag = cache.response(request("gzip"), "index.html", title="Hi").headers["etag"]
+    resp = cache.response(request("identity", if_none_match=gzip_etag), "index.html", title="Hi")
+    assert resp.status_code == 200 and resp.body.startswith(b"<h1>Hi</h1>")
+
+
+def test_changed_context_is_a_new_page(cache):
+    first = cache.response(request(), "index.html", title="Hi").headers["etag"]
+    resp = cache.response(request(if_none_match=first), "index.html", title="Bye")
+    assert resp.status_code == 200 and resp.headers["etag"] != first
+
+
+def test_rejected_codings_are_not_accepted():
+    assert accepted_encodings("gzip;q=0, br;q=0.5, identity") == {"br", "identity"}
@@ -0,0 +1,158 @@
+# tests/test_pay.py
+import asyncio
+import json
+import pytest
+from fastapi import HTTPException
+from app import repo
+from app.routes import pay as pay_routes
+from app.routes.pay import PayRequest, handle_payment
+from app.utils.redis_utils import QUEUE_NAME, REDIS_BREAKER
+from app.routes.stripe_webhook import process_stripe_event
+
+
+def pay(promo_code: str | None = None, upload_id: str = "up-1") -> dict:
+    req = PayRequest(file_key=upload_id, email="a@example.com", provider="gmail", promo_code=promo_code,
+                     size_bytes=100, duration_sec=10.0, price_cents=500, filename="clip.mp4")
+    return asyncio.run(handle_payment(req))
+
+
+def deliver(db, event_type: str, session) -> None:
+    event_id = f"evt_{event_type}_{session.id}"
+    event = {"id": event_id, "type": event_type,
+             "data": {"object": {"id": session.id, "amount_total": 250, "metadata": session.metadata}}}
+    repo.record_stripe_event(db, event_id, event_type, json.dumps(event))
+    process_stripe_event(event_id)
+
+
+def usage(db, code: str) -> int:
+    db.expire_all()
+    return repo.get_token(db, code).usage_count
+
+
+def held(db, upload_id: str = "up-1") -> str | None:
+    db.expire_all()
+    return repo.get_job_by_upload_id(db, upload_id).token_used
+
+
+@pytest.fixture
+def half(db):
+    repo.create_token(db, "HALF", discount_percent=50, usage_limit=1)
+    return "HALF"
+
+
+def test_partial_code_is_reserved_at_checkout(db, redis_client, stripe, half):
+    assert pay(half)["checkout_url"]
+    session = stripe.sessions[0]
+    assert session.metadata["token_reserved"] == "1"
+    assert session.line_items[0]["price_data"]["unit_amount"] == 250
+    assert usage(db, half) == 1 and held(db) == half
+    assert repo.get_job_by_upload_id(db, "up-1").checkout_session_id == session.id
+
+
+def test_returning_to_checkout_reuses_the_reservation(db, redis_client, stripe, half):
+    pay(half)
+    pay(half)  # cancelled and came back; the code only has one use
+    assert len(stripe.sessions) == 2
+    assert usage(db, half) == 1
+
+
+def test_another_upload_cannot_take_a_reserved_code(db, redis_client, stripe, half):
+    pay(half)
+    with pytest.raises(HTTPException) as e:
+        pay(half, upload_id="up-2")
+    assert e.value.detail == "Token already used."
+
+
+def test_only_the_latest_session_expiry_releases_the_code(db, redis_client, stripe, half):
+    pay(half)
+    pay(half)
+    first, latest = stripe.sessions
+
+    deliver(db, "checkout.session.expired", first)
+    assert usage(db, half) == 1
+
+    deliver(db, "checkout.session.expired", latest)
+    assert usage(db, half) == 0 and held(db) is None
+
+
+def test_paid_session_keeps_the_code_consumed(db, redis_client, stripe, half):
+    pay(half)
+    pay(half)
+    first, latest = stripe.sessions
+
+    deliver(db, "checkout.session.completed", first)
+    deliver(db, "checkout.session.expired", latest)
+    assert usage(db, half) == 1 and held(db) == half
+    assert repo.get_job_by_upload_id(db, "up-1").enqueued_at is not None
+
+
+def test_switching_codes_gives_the_old_one_back(db, redis_client, stripe, half):
+    repo.create_token(db, "TENOFF", discount_percent=10, usage_limit=1)
+    pay(half)
+    pay("TENOFF")
+    assert usage(db, half) == 0
+    assert usage(db, "TENOFF") == 1 and held(db) == "TENOFF"
+
+
+def test_stripe_failure_releases_a_new_reservation_only(db, redis_client, stripe, half):
+    stripe.fail_with = RuntimeError("card declined setup")
+    with pytest.raises(HTTPException):
+        pay(half)
+    assert usage(db, half) == 0 and held(db) is None
+
+    stripe.fail_with = None
+    pay(half)
+    stripe.fail_with = RuntimeError("card declined setup")
+    with pytest.raises(HTTPException):
+        pay(half)  # the first session is still open and holds the use
+    assert usage(db, half) == 1 and held(db) == half
+
+
+# ───────────── 100% codes (no Stripe) ─────────────
+
+@pytest.fixture
+def free(db):
+    repo.create_token(db, "FREE", discount_percent=100, usage_limit=1)
+    return "FREE"
+
+
+def test_free_code_queues_the_job_without_stripe(db, redis_client, async_redis_client, stripe, free):
+    resp = pay(free)
+    assert resp["free"] is True
+    assert json.loads(redis_client.lindex(QUEUE_NAME, 0))["upload_id"] == "up-1"
+    assert stripe.sessions == []
+    assert usage(db, free) == 1 and held(db) == free
+    assert repo.get_job_by_upload_id(db, "up-1").enqueued_at is not None
+
+
+def test_failed_free_enqueue_is_a_503_and_gives_everything_back(db, redis_client, async_redis_client, free, monkeypatch):
+    async def redis_down(**job):
+        return False
+
+    with monkeypatch.context() as m:
+        m.setattr(pay_routes, "enqueue_job_async", redis_down)
+        with pytest.raises(HTTPException) as e:
+            pay(free)
+    assert e.value.status_code == 503
+    assert usage(db, free) == 0
+    assert repo.get_job_by_upload_id(db, "up-1").enqueued_at is None
+
+    pay(free)  # the retry goes through
+    assert redis_client.llen(QUEUE_NAME) == 1
+
+
+def test_repeating_a_free_payment_queues_once(db, redis_client, async_redis_client, free):
+    pay(free)
+    pay(free)
+    assert redis_client.llen(QUEUE_NAME) == 1
+    assert usage(db, free) == 1
+
+
+def test_open_redis_circuit_fails_the_free_path_fast(db, async_redis_client, free):
+    for _ in range(REDIS_BREAKER.failure_threshold):
+        REDIS_BREAKER.record_failure()
+
+    with pytest.raises(HTTPException) as e:
+        pay(free)
+    assert e.value.status_code == 503
+    assert usage(db, free) == 0
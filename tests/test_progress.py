@@ -0,0 +1,103 @@
+# tests/test_progress.py
+import asyncio
+import json
+import pytest
+from app.models.models import Job
+from worker import ProgressParser, progress_record
+
+
+def feed_all(parser: ProgressParser, text: str) -> list[dict]:
+    return [b for b in map(parser.feed, text.splitlines()) if b is not None]
+
+
+def test_parser_returns_one_block_per_progress_line():
+    blocks = feed_all(ProgressParser(), "frame=10\nspeed=2.0x\nprogress=continue\nframe=20\nprogress=end\n")
+    assert blocks == [
+        {"frame": "10", "speed": "2.0x", "progress": "continue"},
+        {"frame": "20", "progress": "end"},
+    ]
+
+
+def test_parser_ignores_non_key_value_lines():
+    assert feed_all(ProgressParser(), "garbage\n\nprogress=continue\n") == [{"progress": "continue"}]
+
+
+def test_progress_record_halfway():
+    block = {
+        "out_time_us": "30000000", "speed": "2.0x", "total_size": "1000000",
+        "bitrate": "812.4kbits/s", "fps": "N/A", "progress": "continue",
+    }
+    record = progress_record(block, duration=60.0, target_bytes=1_500_000, elapsed=15.0)
+
+    assert record["percent"] == 50.0
+    assert record["eta_sec"] == 15.0  # 30 s of video left at 2x
+    assert record["projected_bytes"] == 2_000_000
+    assert record["overshoot"] is True
+    assert record["bitrate_kbps"] == 812.4
+    assert record["fps"] is None
+    assert record["ended"] is False
+
+
+def test_progress_record_stops_at_99_and_falls_back_to_elapsed_eta():
+    record = progress_record({"out_time_ms": "60000000", "progress": "end"}, 60.0, 10, elapsed=30.0)
+    assert record["percent"] == 99.0
+    assert record["eta_sec"] == round(30.0 * 1 / 99, 1)
+    assert record["ended"] is True
+
+
+def test_no_overshoot_warning_during_warm_up():
+    block = {"out_time_us": "3000000", "total_size": "900000"}  # 5% in, projecting 18 MB
+    record = progress_record(block, 60.0, 1_000_000, elapsed=1.0)
+    assert record["projected_bytes"] > 1_000_000
+    assert record["overshoot"] is False
+
+
+# ───────────── /events stream ─────────────
+
+def first_event(job_id: str) -> dict:
+    from starlette.requests import Request
+    from app.main import stream_job_progress
+
+    async def receive():
+        return {"type": "http.request"}  # client still connected
+
+    async def read():
+        request = Request({"type": "http", "headers": [], "client": ("10.0.0.1", 1)}, receive)
+        body = (await stream_job_progress(request, job_id)).body_iterator
+        try:
+            chunk = await body.__anext__()
+        finally:
+            await body.aclose()
+        return json.loads(chunk.removeprefix("data: "))
+
+    return asyncio.run(read())
+
+
+@pytest.fixture
+def streaming(db, monkeypatch):
+    from app.utils import rate_limit
+    monkeypatch.setattr(rate_limit, "RATE_LIMIT_ENABLED", False)
+    return db
+
+
+def add_job(db, status: str, progress_detail: dict | None = None):
+    db.add(Job(upload_id="j1", email="a@example.com", provider="gmail", size_bytes=100, duration_sec=60.0,
+               input_path="j1/clip.mp4", status=status, progress=50.0,
+               progress_detail=json.dumps(progress_detail) if progress_detail else None))
+    db.commit()
+
+
+def test_processing_job_streams_speed_eta_and_sizes(streaming):
+    record = progress_record({"out_time_us": "30000000", "speed": "2.0x", "total_size": "1000000"},
+                             duration=60.0, target_bytes=1_500_000, elapsed=15.0)
+    add_job(streaming, "processing", record)
+
+    event = first_event("j1")
+    assert event["status"] == "processing" and event["progress"] == 50.0
+    assert (event["speed"], event["eta_sec"]) == (2.0, 15.0)
+    assert (event["size_bytes"], event["target_bytes"], event["projected_bytes"]) == (1_000_000, 1_500_000, 2_000_000)
+
+
+def test_detail_is_left_out_once_the_job_is_no_longer_processing(streaming):
+    add_job(streaming, "error", {"speed": 2.0, "eta_sec": 15.0})
+    assert "speed" not in first_event("j1")
@@ -0,0 +1,94 @@
+# tests/test_queue_estimate.py
+import json
+import time
+import pytest
+from app.utils import queue_estimate
+from app.utils.queue_estimate import QueueSchedule, build_schedule
+from app.utils.redis_utils import QUEUE_NAME, WORKERS_KEY
+
+
+def beat(redis_client, worker_id: str, busy_for: float = 0.0, sec_per_media_sec: float | None = None, age: float = 0.0):
+    now = time.time()
+    redis_client.hset(WORKERS_KEY, worker_id, json.dumps({
+        "ts": now - age, "busy_until": now + busy_for, "sec_per_media_sec": sec_per_media_sec,
+    }))
+
+
+def queue(redis_client, *durations: float):
+    for i, duration in enumerate(durations):
+        redis_client.rpush(QUEUE_NAME, json.dumps({"upload_id": f"job-{i}", "duration_sec": duration}))
+
+
+def test_estimate_for_queued_and_new_jobs():
+    schedule = QueueSchedule(
+        now=1000.0, worker_free_at=[1100.0, 1200.0], sec_per_media_sec=0.5,
+        starts={"queued": 1050.0}, finishes={"queued": 1100.0}, depth=1, backlog_media_sec=100.0,
+    )
+
+    queued = schedule.estimate("queued")
+    assert (queued["start_in_sec"], queued["complete_in_sec"]) == (50, 100)
+
+    new = schedule.estimate(duration_sec=60.0)
+    assert (new["start_in_sec"], new["complete_in_sec"]) == (100, 130)
+    assert new["workers"] == 2 and new["queue_depth"] == 1
+    assert schedule.tail_wait_sec() == 100.0
+
+
+def test_recommended_workers(monkeypatch):
+    monkeypatch.setattr(queue_estimate, "TARGET_QUEUE_WAIT_SEC", 600.0)
+    schedule = QueueSchedule(0.0, [0.0], 0.5, {}, {}, depth=10, backlog_media_sec=3000.0)
+    assert schedule.recommended_workers() == 3  # 1500 s of work in 600 s
+
+
+def test_build_schedule_replays_the_queue_fifo(redis_client):
+    beat(redis_client, "idle", sec_per_media_sec=1.0)
+    beat(redis_client, "busy", busy_for=100.0, sec_per_media_sec=1.0)
+    queue(redis_client, 60.0, 60.0, 30.0)
+
+    schedule = build_schedule()
+    start = {i: schedule.starts[f"job-{i}"] - schedule.now for i in range(3)}
+
+    assert schedule.depth == 3 and schedule.backlog_media_sec == 150.0
+    assert start[0] == pytest.approx(0, abs=1)
+    assert start[1] == pytest.approx(60, abs=1)    # idle worker again, before busy frees up
+    assert start[2] == pytest.approx(100, abs=1)   # busy worker frees first
+    assert schedule.finishes["job-2"] - schedule.now == pytest.approx(130, abs=1)
+
+
+def test_stale_and_malformed_heartbeats_are_dropped(redis_client):
+    beat(redis_client, "live")
+    beat(redis_client, "stale", age=queue_estimate.WORKER_HEARTBEAT_TTL_SEC + 5)
+    redis_client.hset(WORKERS_KEY, "broken", "not json")
+
+    schedule = build_schedule()
+
+    assert len(schedule.worker_free_at) == 1
+    assert set(redis_client.hkeys(WORKERS_KEY)) == {"live"}
+    assert schedule.sec_per_media_sec == queue_estimate.DEFAULT_SEC_PER_MEDIA_SEC
+
+
+def test_no_live_workers_still_estimates(redis_client):
+    queue(redis_client, 40.0)
+    schedule = build_schedule()
+    assert len(schedule.worker_free_at) == queue_estimate.ESTIMATE_MIN_WORKERS
+    assert schedule.estimate("job-0")["start_in_sec"] == 0
+
+
+def test_worker_keeps_beating_through_a_long_transfer(redis_client, monkeypatch):
+    import worker
+    monkeypatch.setattr(worker, "HEARTBEAT_INTERVAL_SEC", 0.05)
+    busy_until = time.time() + 600
+    worker.heartbeat(busy_until=busy_until, force=True)
+    first = json.loads(redis_client.hget(WORKERS_KEY, worker.WORKER_ID))["ts"]
+
+    thread = worker.start_heartbeat_thread()
+    try:
+        time.sleep(0.3)  # e.g. a multi-GB download with no progress callbacks
+    finally:
+        worker._heartbeat_stop.set()
+        thread.join(timeout=5)
+
+    latest = json.loads(redis_client.hget(WORKERS_KEY, worker.WORKER_ID))
+    assert latest["ts"] > first
+    assert latest["busy_until"] == busy_until
+    assert not thread.is_alive()
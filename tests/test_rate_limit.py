@@ -0,0 +1,151 @@
+# tests/test_rate_limit.py
+import time
+import pytest
+from fastapi import HTTPException
+from starlette.requests import Request
+from app.utils import rate_limit
+from app.utils.rate_limit import (
+    QueueBackpressure,
+    RateLimit,
+    acquire_sse_slot,
+    client_ip,
+    release_sse_slot,
+    renew_sse_slot,
+    take_token,
+)
+from app.utils.redis_utils import QUEUE_NAME
+
+
+@pytest.fixture(autouse=True)
+def limiter(redis_client, monkeypatch):
+    # Lua scripts are registered against the first client that runs them
+    monkeypatch.setattr(rate_limit, "_token_bucket", None)
+    monkeypatch.setattr(rate_limit, "_sse_acquire", None)
+    monkeypatch.setattr(rate_limit, "RATE_LIMIT_ENABLED", True)
+    return redis_client
+
+
+def request(forwarded: str | None = None, peer: str = "10.0.0.9", **path_params) -> Request:
+    headers = [(b"x-forwarded-for", forwarded.encode())] if forwarded else []
+    return Request({"type": "http", "headers": headers, "client": (peer, 1234), "path_params": path_params})
+
+
+# ───────────── Client IP ─────────────
+
+def test_client_ip_is_the_hop_our_proxy_appended(monkeypatch):
+    monkeypatch.setattr(rate_limit, "TRUSTED_PROXY_COUNT", 1)
+    assert client_ip(request("6.6.6.6, 1.2.3.4")) == "1.2.3.4"  # first hop is client-supplied
+
+
+def test_client_ip_counts_back_past_every_trusted_proxy(monkeypatch):
+    monkeypatch.setattr(rate_limit, "TRUSTED_PROXY_COUNT", 2)
+    assert client_ip(request("6.6.6.6, 1.2.3.4, 10.0.0.1")) == "1.2.3.4"
+    assert client_ip(request("1.2.3.4")) == "1.2.3.4"
+
+
+def test_client_ip_falls_back_to_the_peer(monkeypatch):
+    assert client_ip(request()) == "10.0.0.9"
+    monkeypatch.setattr(rate_limit, "TRUSTED_PROXY_COUNT", 0)
+    assert client_ip(request("1.2.3.4")) == "10.0.0.9"
+
+
+# ───────────── Token bucket ─────────────
+
+def test_bucket_allows_the_burst_then_says_when_to_retry():
+    assert take_token("t", rate_per_min=60, burst=2) == 0
+    assert take_token("t", rate_per_min=60, burst=2) == 0
+    assert 0 < take_token("t", rate_per_min=60, burst=2) <= 1.0
+
+
+def test_buckets_are_independent():
+    assert take_token("a", rate_per_min=60, burst=1) == 0
+    assert take_token("a", rate_per_min=60, burst=1) > 0
+    assert take_token("b", rate_per_min=60, burst=1) == 0
+
+
+def test_bucket_expires_once_it_would_be_full_again(limiter):
+    take_token("t", rate_per_min=60, burst=5)
+    assert 0 < limiter.ttl("ratelimit:t") <= 6
+
+
+def test_rate_limit_dependency_answers_429_with_retry_after():
+    limit = RateLimit("upload", 60, 1)
+    limit(request("1.2.3.4"))
+    with pytest.raises(HTTPException) as e:
+        limit(request("1.2.3.4"))
+    assert e.value.status_code == 429
+    assert e.value.headers["Retry-After"] == "1"
+    limit(request("5.6.7.8"))  # another client has its own bucket
+
+
+def test_rate_limit_per_path_parameter():
+    limit = RateLimit("events", 60, 1, per="job_id")
+    limit(request("1.2.3.4", job_id="a"))
+    limit(request("5.6.7.8", job_id="b"))
+    with pytest.raises(HTTPException):
+        limit(request("5.6.7.8", job_id="a"))
+
+
+def test_rate_limit_fails_open_without_redis(monkeypatch):
+    def redis_down():
+        raise ConnectionError("down")
+
+    monkeypatch.setattr(rate_limit, "get_redis", redis_down)
+    limit = RateLimit("upload", 60, 1)
+    for _ in range(3):
+        limit(request("1.2.3.4"))
+
+
+# ───────────── SSE leases ─────────────
+
+def test_sse_slots_are_capped_per_ip_and_freed_on_release(monkeypatch):
+    monkeypatch.setattr(rate_limit, "SSE_MAX_PER_IP", 2)
+    first = acquire_sse_slot(request("1.2.3.4"))
+    acquire_sse_slot(request("1.2.3.4"))
+    with pytest.raises(HTTPException) as e:
+        acquire_sse_slot(request("1.2.3.4"))
+    assert e.value.status_code == 429
+    acquire_sse_slot(request("5.6.7.8"))
+
+    release_sse_slot(first)
+    acquire_sse_slot(request("1.2.3.4"))
+
+
+def test_sse_slots_are_capped_overall(monkeypatch):
+    monkeypatch.setattr(rate_limit, "SSE_MAX_TOTAL", 2)
+    acquire_sse_slot(request("1.1.1.1"))
+    acquire_sse_slot(request("2.2.2.2"))
+    with pytest.raises(HTTPException):
+        acquire_sse_slot(request("3.3.3.3"))
+
+
+def test_a_lease_nobody_renews_ages_out(limiter, monkeypatch):
+    monkeypatch.setattr(rate_limit, "SSE_MAX_PER_IP", 1)
+    dead = acquire_sse_slot(request("1.2.3.4"))
+    for key in (dead.ip_key, rate_limit.SSE_TOTAL_KEY):  # its process died a while ago
+        limiter.zadd(key, {dead.lease_id: time.time() - 1})
+
+    acquire_sse_slot(request("1.2.3.4"))
+
+
+def test_renewing_pushes_the_expiry_forward_but_never_revives(limiter):
+    lease = acquire_sse_slot(request("1.2.3.4"))
+    limiter.zadd(lease.ip_key, {lease.lease_id: time.time() + 1})
+    renew_sse_slot(lease)
+    assert limiter.zscore(lease.ip_key, lease.lease_id) > time.time() + rate_limit.SSE_LEASE_TTL_SEC - 5
+
+    release_sse_slot(lease)
+    renew_sse_slot(lease)
+    assert limiter.zscore(lease.ip_key, lease.lease_id) is None
+
+
+# ───────────── Backpressure ─────────────
+
+def test_backpressure_rejects_while_the_queue_is_too_deep(limiter, monkeypatch):
+    monkeypatch.setattr(rate_limit, "MAX_QUEUE_DEPTH", 2)
+    QueueBackpressure()()
+    limiter.rpush(QUEUE_NAME, "{}", "{}")
+    with pytest.raises(HTTPException) as e:
+        QueueBackpressure()()
+    assert e.value.status_code == 503
+    assert e.value.headers["Retry-After"] == str(rate_limit.BACKPRESSURE_RETRY_AFTER_SEC)
@@ -0,0 +1,75 @@
+# tests/test_s3_sweeper.py
+from datetime import datetime, timedelta
+import run_s3_sweeper
+from app.models.models import Job, JobOutput
+from run_s3_sweeper import sweep_once
+
+NOW = datetime.utcnow()
+OLD = NOW - timedelta(days=3)
+
+
+def add_job(db, job_id: str, status: str = "queued", created_at: datetime = OLD, enqueued_at: datetime | None = None,
+            completed_at: datetime | None = None, output_path: str | None = None):
+    db.add(Job(
+        id=job_id, upload_id=job_id, email="a@example.com", provider="gmail", size_bytes=100,
+        duration_sec=1.0, input_path=f"{job_id}/clip.mov", status=status, created_at=created_at,
+        enqueued_at=enqueued_at, completed_at=completed_at, output_path=output_path, output_size_bytes=50,
+    ))
+    db.commit()
+
+
+def test_expired_outputs_and_finished_inputs_are_deleted(db, s3):
+    add_job(db, "done", status="done", enqueued_at=OLD, completed_at=OLD, output_path="outputs/done.mp4")
+    db.add(JobOutput(upload_id="done", provider="outlook", output_path="outputs/done_outlook.mp4",
+                     size_bytes=20, created_at=OLD))
+    db.commit()
+
+    assert sweep_once() == 50 + 20 + 100
+    assert set(s3.deleted) == {"outputs/done.mp4", "outputs/done_outlook.mp4", "uploads/done.mp4"}
+
+    db.expire_all()
+    job = db.get(Job, "done")
+    assert job.output_path is None and job.input_deleted_at is not None
+    assert db.query(JobOutput).count() == 0
+
+
+def test_unpaid_uploads_go_but_queued_ones_stay(db, s3):
+    add_job(db, "unpaid")
+    add_job(db, "paid-queued", enqueued_at=OLD)
+    add_job(db, "unpaid-recent", created_at=NOW)
+
+    sweep_once()
+    assert s3.deleted == ["uploads/unpaid.mp4"]
+
+
+def test_dry_run_deletes_nothing(db, s3):
+    add_job(db, "unpaid")
+    assert sweep_once(dry_run=True) == 100
+    assert s3.calls == 0
+    assert db.get(Job, "unpaid").input_deleted_at is None
+
+
+def test_failed_keys_are_retried_next_pass(db, s3):
+    add_job(db, "a")
+    add_job(db, "b")
+    s3.failing = {"uploads/b.mp4"}
+
+    sweep_once()
+    db.expire_all()
+    assert db.get(Job, "a").input_deleted_at is not None
+    assert db.get(Job, "b").input_deleted_at is None
+
+    s3.failing = set()
+    sweep_once()
+    db.expire_all()
+    assert db.get(Job, "b").input_deleted_at is not None
+
+
+def test_deletes_go_out_in_batches(db, s3, monkeypatch):
+    monkeypatch.setattr(run_s3_sweeper, "DELETE_BATCH_MAX_KEYS", 2)
+    for i in range(5):
+        add_job(db, f"unpaid-{i}")
+
+    sweep_once()
+    assert len(s3.deleted) == 5
+    assert s3.calls == 3
@@ -0,0 +1,78 @@
+# tests/test_simulate_queue.py
+import random
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+import pytest
+from app import repo
+from app.models.models import Job, JobArchive
+from simulate_queue import load_arrivals, pct, service_times, simulate
+
+T0 = datetime(2026, 1, 1, 12, 0, 0)
+
+
+def job(at_sec: float, duration: float = 60.0, priority: bool = False, measured_sec: float | None = None) -> dict:
+    return {"upload_id": f"u{at_sec}", "arrived_at": T0 + timedelta(seconds=at_sec), "duration": duration,
+            "size_bytes": 0, "priority": priority, "measured_sec": measured_sec}
+
+
+def run(jobs, services, workers=1, concurrency=1, policy="fifo", contention=0.0, arrival_scale=1.0):
+    return simulate(jobs, services, workers, concurrency, policy, contention, arrival_scale)
+
+
+def test_single_worker_fifo_queues_behind_the_job_in_front():
+    result = run([job(0), job(0), job(0)], [10.0, 10.0, 10.0])
+    assert result["waits"] == [0.0, 10.0, 20.0]
+    assert result["completions"] == [10.0, 20.0, 30.0]
+    assert result["utilization"] == pytest.approx(1.0)
+    assert result["max_depth"] == 2  # the first one started straight away
+
+
+def test_more_workers_remove_the_wait():
+    assert run([job(0), job(0)], [10.0, 10.0], workers=2)["waits"] == [0.0, 0.0]
+
+
+def test_priority_jumps_the_queue_but_never_preempts():
+    jobs = [job(0), job(1), job(2, priority=True)]
+    result = run(jobs, [10.0, 10.0, 10.0], policy="priority")
+    assert result["priority_waits"] == [8.0]
+    assert result["standard_waits"] == [0.0, 19.0]
+
+
+def test_sjf_runs_short_videos_first():
+    jobs = [job(0, duration=1), job(1, duration=600), job(2, duration=5)]
+    assert sorted(run(jobs, [10.0, 100.0, 1.0], policy="sjf")["completions"]) == [9.0, 10.0, 110.0]
+
+
+def test_contention_slows_shared_slots_and_arrival_scale_compresses_time():
+    assert run([job(0)], [10.0], concurrency=2, contention=0.5)["completions"] == [15.0]
+    assert run([job(0), job(100)], [10.0, 10.0], arrival_scale=0.5)["makespan"] == 60.0
+
+
+def test_history_speed_uses_measured_times_and_falls_back_to_ratio():
+    args = SimpleNamespace(speed="history", overhead_sec=5.0, sec_per_media_sec=0.5, jitter=0.0)
+    times = service_times([job(0, measured_sec=42.0), job(1, duration=60.0)], args, random.Random(1))
+    assert times == [42.0, 35.0]
+
+
+def test_pct_is_nearest_rank():
+    assert pct([], 95) == 0.0
+    assert pct([5.0, 1.0, 3.0, 2.0, 4.0], 50) == 3.0
+    assert pct([float(i) for i in range(1, 101)], 95) == 95.0
+
+
+def test_arrivals_come_from_live_and_archived_jobs(db):
+    common = dict(email="a@example.com", provider="gmail", size_bytes=1, duration_sec=30.0, input_path="x")
+    db.add(Job(id="live", upload_id="live", created_at=T0, enqueued_at=T0 + timedelta(seconds=5), **common))
+    db.add(Job(id="unpaid", upload_id="unpaid", created_at=T0, **common))
+    db.add(JobArchive(id="old", upload_id="old", created_at=T0 - timedelta(hours=1), status="done",
+                      price_cents=0, progress=100.0, updated_at=T0, **common))
+    db.commit()
+    repo.add_job_stages(db, ["live"], "dequeued", at=T0 + timedelta(seconds=10))
+    repo.add_job_stages(db, ["live"], "upload_done", at=T0 + timedelta(seconds=70))
+    db.commit()
+
+    jobs = load_arrivals(T0 - timedelta(days=1), T0 + timedelta(days=1))
+    assert [j["upload_id"] for j in jobs] == ["old", "live"]
+    assert jobs[1]["arrived_at"] == T0 + timedelta(seconds=5)  # enqueued_at, not created_at
+    assert jobs[1]["measured_sec"] == 60.0
+    assert jobs[0]["measured_sec"] is None
@@ -0,0 +1,126 @@
+# tests/test_stripe_webhook.py
+import json
+from datetime import datetime, timedelta
+from app import repo
+from app.models.models import Job, StripeEvent
+from app.routes import stripe_webhook
+from app.routes.stripe_webhook import STRIPE_EVENT_MAX_ATTEMPTS, process_pending_stripe_events, process_stripe_event
+from app.utils.redis_utils import QUEUE_NAME
+
+
+def add_job(db, upload_id: str = "up-1", **fields) -> Job:
+    return repo.create_job(
+        db, upload_id=upload_id, filename="clip.mov", email="a@example.com", provider="gmail",
+        size_bytes=1, duration_sec=10.0, price_cents=199, input_path=f"{upload_id}/clip.mov", **fields,
+    )
+
+
+def record_completed(db, event_id: str, upload_id: str = "up-1", **metadata) -> str:
+    event = {
+        "id": event_id,
+        "type": "checkout.session.completed",
+        "data": {"object": {"amount_total": 299, "metadata": {"upload_id": upload_id, **metadata}}},
+    }
+    assert repo.record_stripe_event(db, event_id, event["type"], json.dumps(event))
+    return event_id
+
+
+def event_status(db, event_id: str) -> str:
+    db.expire_all()
+    return db.get(StripeEvent, event_id).status
+
+
+def test_duplicate_event_ids_are_recorded_once(db):
+    record_completed(db, "evt_1")
+    assert not repo.record_stripe_event(db, "evt_1", "checkout.session.completed", "{}")
+
+
+def test_completed_checkout_enqueues_once(db, redis_client):
+    add_job(db)
+    process_stripe_event(record_completed(db, "evt_1"))
+    process_stripe_event(record_completed(db, "evt_2"))  # Stripe resends under a new event ID
+
+    assert redis_client.llen(QUEUE_NAME) == 1
+    assert json.loads(redis_client.lindex(QUEUE_NAME, 0))["upload_id"] == "up-1"
+    assert event_status(db, "evt_1") == event_status(db, "evt_2") == "processed"
+    db.expire_all()
+    job = repo.get_job_by_upload_id(db, "up-1")
+    assert job.enqueued_at is not None and job.price_cents == 299
+
+
+def test_processing_twice_is_a_no_op(db, redis_client):
+    add_job(db)
+    event_id = record_completed(db, "evt_1")
+    process_stripe_event(event_id)
+    process_stripe_event(event_id)
+    assert redis_client.llen(QUEUE_NAME) == 1
+
+
+def test_already_enqueued_legacy_job_is_not_pushed_again(db, redis_client):
+    add_job(db)
+    db.query(Job).update({"enqueued_at": datetime(2026, 1, 1)})  # backfilled by run_db_setup.py
+    db.commit()
+
+    process_stripe_event(record_completed(db, "evt_1"))
+    assert redis_client.llen(QUEUE_NAME) == 0
+
+
+def test_failed_enqueue_clears_the_job_and_retries(db, redis_client, monkeypatch):
+    add_job(db)
+    event_id = record_completed(db, "evt_1")
+    with monkeypatch.context() as m:
+        m.setattr(stripe_webhook, "enqueue_job", lambda **job: False)
+        process_stripe_event(event_id)
+    assert event_status(db, event_id) == "received"
+    assert repo.get_job_by_upload_id(db, "up-1").enqueued_at is None
+
+    assert process_pending_stripe_events() == 1
+    assert event_status(db, event_id) == "processed"
+    assert redis_client.llen(QUEUE_NAME) == 1
+
+
+def test_event_fails_for_good_after_max_attempts(db, redis_client, monkeypatch):
+    add_job(db)
+    event_id = record_completed(db, "evt_1")
+    monkeypatch.setattr(stripe_webhook, "enqueue_job", lambda **job: False)
+
+    for _ in range(STRIPE_EVENT_MAX_ATTEMPTS):
+        process_stripe_event(event_id)
+
+    assert event_status(db, event_id) == "failed"
+    assert db.get(StripeEvent, event_id).attempts == STRIPE_EVENT_MAX_ATTEMPTS
+    assert process_pending_stripe_events() == 0
+
+
+def test_only_stale_claims_can_be_taken_over(db):
+    event_id = record_completed(db, "evt_1")
+    now = datetime.utcnow()
+
+    assert repo.claim_stripe_event(db, event_id, stale_before=now - timedelta(minutes=5))
+    assert repo.claim_stripe_event(db, event_id, stale_before=now - timedelta(minutes=5)) is None
+    assert repo.pending_stripe_event_ids(db, stale_before=now - timedelta(minutes=5)) == []
+
+    later = datetime.utcnow() + timedelta(seconds=1)
+    assert repo.pending_stripe_event_ids(db, stale_before=later) == [event_id]
+    assert repo.claim_stripe_event(db, event_id, stale_before=later).attempts == 2
+
+
+def test_missing_job_gets_a_fallback_row(db, redis_client):
+    process_stripe_event(record_completed(db, "evt_1", upload_id="orphan"))
+    assert repo.get_job_by_upload_id(db, "orphan").enqueued_at is not None
+    assert redis_client.llen(QUEUE_NAME) == 1
+
+
+def test_failed_batch_enqueue_clears_every_job(db, redis_client, monkeypatch):
+    files = [{"upload_id": f"b-{i}", "filename": "clip.mov", "size_bytes": 1, "duration_sec": 5.0} for i in range(3)]
+    batch, _ = repo.create_batch(db, "a@example.com", files)
+    event_id = record_completed(db, "evt_1", upload_id=None, batch_id=batch.id)
+
+    with monkeypatch.context() as m:
+        m.setattr(stripe_webhook, "enqueue_jobs", lambda jobs: False)
+        process_stripe_event(event_id)
+    db.expire_all()
+    assert all(j.enqueued_at is None for j in repo.get_batch_jobs(db, batch.id))
+
+    process_pending_stripe_events()
+    assert redis_client.llen(QUEUE_NAME) == 3
@@ -0,0 +1,56 @@
+# tests/test_token_cache.py
+from app import repo
+from app.utils import token_cache
+from app.utils.token_cache import TokenInfo, lookup_token, redeem_token, release_token
+
+
+def test_exhausted():
+    assert not TokenInfo("CODE", 50, 2, 1).exhausted
+    assert TokenInfo("CODE", 50, 2, 2).exhausted
+
+
+def test_lookup_caches_known_and_unknown_codes(db):
+    repo.create_token(db, "HALF", discount_percent=50, usage_limit=3)
+
+    assert lookup_token(db, "HALF") == TokenInfo("HALF", 50, 3, 0)
+    assert lookup_token(db, "NOPE") is None
+
+    repo.use_token(db, "HALF")  # behind the cache's back
+    assert lookup_token(db, "HALF").usage_count == 0
+    assert "NOPE" in token_cache._cache
+
+
+def test_expired_entries_are_reloaded(db, monkeypatch):
+    repo.create_token(db, "HALF", discount_percent=50, usage_limit=3)
+    lookup_token(db, "HALF")
+    repo.use_token(db, "HALF")
+
+    monkeypatch.setattr(token_cache, "TOKEN_CACHE_SEC", 0)
+    assert lookup_token(db, "HALF").usage_count == 1
+
+
+def test_redeem_refreshes_the_cache_until_exhausted(db):
+    repo.create_token(db, "ONCE", discount_percent=100, usage_limit=1)
+    lookup_token(db, "ONCE")
+
+    assert redeem_token(db, "ONCE") == TokenInfo("ONCE", 100, 1, 1)
+    assert lookup_token(db, "ONCE").exhausted
+    assert redeem_token(db, "ONCE") is None
+
+
+def test_failed_redeem_marks_a_stale_entry_exhausted(db):
+    repo.create_token(db, "ONCE", discount_percent=100, usage_limit=1)
+    lookup_token(db, "ONCE")
+    repo.use_token(db, "ONCE")  # used up by another process
+
+    assert redeem_token(db, "ONCE") is None
+    assert lookup_token(db, "ONCE").exhausted
+
+
+def test_release_gives_the_use_back(db):
+    repo.create_token(db, "ONCE", discount_percent=100, usage_limit=1)
+    redeem_token(db, "ONCE")
+
+    release_token(db, "ONCE")
+    assert not lookup_token(db, "ONCE").exhausted
+    assert redeem_token(db, "ONCE") is not None
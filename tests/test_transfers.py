@@ -0,0 +1,78 @@
+# tests/test_transfers.py
+import pytest
+from app.utils import clients
+from transfers import MAX_PARTS, MB, TransferError, download, part_size, transfer_config, upload
+
+
+class FakeTransferS3:
+    """download_file/upload_file against an in-memory bucket; `short_by` truncates what is stored."""
+
+    def __init__(self):
+        self.objects = {}
+        self.calls = []
+        self.short_by = 0
+
+    def head_object(self, Bucket, Key):
+        return {"ContentLength": len(self.objects[Key])}
+
+    def download_file(self, bucket, key, filename, ExtraArgs=None, Config=None):
+        self.calls.append(("download", ExtraArgs, Config))
+        with open(filename, "wb") as f:
+            f.write(self.objects[key][:len(self.objects[key]) - self.short_by])
+
+    def upload_file(self, filename, bucket, key, ExtraArgs=None, Config=None):
+        self.calls.append(("upload", ExtraArgs, Config))
+        with open(filename, "rb") as f:
+            data = f.read()
+        self.objects[key] = data[:len(data) - self.short_by]
+
+
+@pytest.fixture
+def s3_transfer(monkeypatch):
+    fake = FakeTransferS3()
+    monkeypatch.setitem(clients._clients, "s3_transfer", fake)
+    return fake
+
+
+def test_part_size_grows_to_stay_under_the_part_limit():
+    assert part_size(100 * MB, part_mb=64) == 64 * MB
+    huge = 1000 * 1024 * MB  # 1000 GB at 64 MB parts would need 16,000 parts
+    assert part_size(huge, part_mb=64) > 64 * MB
+    assert huge / part_size(huge, part_mb=64) <= MAX_PARTS
+    assert part_size(huge) % MB == 0
+
+
+def test_transfer_config_uses_one_size_for_threshold_and_parts():
+    config = transfer_config(100 * MB, part_mb=16, concurrency=8)
+    assert config.multipart_threshold == config.multipart_chunksize == 16 * MB
+    assert config.max_concurrency == 8
+
+
+def test_upload_sends_checksums_and_verifies_the_stored_size(s3_transfer, tmp_path):
+    path = tmp_path / "out.mp4"
+    path.write_bytes(b"x" * 1000)
+
+    stats = upload(path, "outputs", "outputs/u1.mp4")
+    assert stats["direction"] == "upload" and stats["bytes"] == 1000
+    _, extra, config = s3_transfer.calls[0]
+    assert extra == {"ChecksumAlgorithm": "CRC32", "ContentType": "video/mp4"}
+    assert config.multipart_chunksize == part_size(1000)
+
+
+def test_download_asks_for_checksums(s3_transfer, tmp_path):
+    s3_transfer.objects["uploads/u1.mp4"] = b"y" * 500
+    stats = download("uploads", "uploads/u1.mp4", tmp_path / "in.mp4")
+    assert stats["bytes"] == 500 and (tmp_path / "in.mp4").read_bytes() == b"y" * 500
+    assert s3_transfer.calls[0][1] == {"ChecksumMode": "ENABLED"}
+
+
+def test_size_mismatch_is_a_transfer_error(s3_transfer, tmp_path):
+    s3_transfer.short_by = 1
+    s3_transfer.objects["uploads/u1.mp4"] = b"y" * 500
+    with pytest.raises(TransferError):
+        download("uploads", "uploads/u1.mp4", tmp_path / "in.mp4")
+
+    path = tmp_path / "out.mp4"
+    path.write_bytes(b"x" * 1000)
+    with pytest.raises(TransferError):
+        upload(path, "outputs", "outputs/u1.mp4")
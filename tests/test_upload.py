@@ -0,0 +1,91 @@
+# tests/test_upload.py
+import asyncio
+from datetime import datetime, timedelta
+import pytest
+from fastapi import HTTPException
+from app import repo
+from app.routes.upload import (
+    MultipartAbortRequest,
+    MultipartCompleteRequest,
+    MultipartPartsRequest,
+    MultipartStartRequest,
+    UploadRequest,
+    cancel_multipart_upload,
+    finish_multipart_upload,
+    presign_multipart_parts,
+    start_multipart_upload,
+    upload_file,
+)
+from app.utils.s3_utils import MULTIPART_THRESHOLD_BYTES, abort_stale_multipart_uploads
+
+BIG = MULTIPART_THRESHOLD_BYTES + 1
+
+
+def upload(size_bytes: int) -> dict:
+    req = UploadRequest(filename="clip.mp4", size_bytes=size_bytes, content_type="video/mp4", duration_sec=5.0)
+    return asyncio.run(upload_file(req))
+
+
+def start(upload_id: str) -> str:
+    return start_multipart_upload(MultipartStartRequest(upload_id=upload_id))["s3_upload_id"]
+
+
+def test_small_file_gets_a_put_url(db, s3, redis_client):
+    resp = upload(10)
+    assert resp["presigned_url"] and resp["multipart"] is False
+
+
+def test_multipart_file_gets_no_put_url(db, s3, redis_client):
+    resp = upload(BIG)
+    assert resp["presigned_url"] is None and resp["multipart"] is True
+
+
+def test_start_records_the_s3_upload_on_the_job(db, s3, redis_client):
+    upload_id = upload(BIG)["upload_id"]
+    s3_upload_id = start(upload_id)
+    assert repo.get_job_by_upload_id(db, upload_id).s3_upload_id == s3_upload_id
+
+    parts = asyncio.run(presign_multipart_parts(
+        MultipartPartsRequest(upload_id=upload_id, s3_upload_id=s3_upload_id, part_numbers=[1, 2])
+    ))["parts"]
+    assert [p["part_number"] for p in parts] == [1, 2]
+
+
+def test_someone_elses_s3_upload_is_rejected(db, s3, redis_client):
+    mine, theirs = upload(BIG)["upload_id"], upload(BIG)["upload_id"]
+    start(mine)
+    their_s3_upload = start(theirs)
+
+    with pytest.raises(HTTPException) as e:
+        asyncio.run(presign_multipart_parts(
+            MultipartPartsRequest(upload_id=mine, s3_upload_id=their_s3_upload, part_numbers=[1])
+        ))
+    assert e.value.status_code == 404
+    with pytest.raises(HTTPException):
+        finish_multipart_upload(MultipartCompleteRequest(
+            upload_id=mine, s3_upload_id=their_s3_upload, parts=[{"part_number": 1, "etag": "x"}]
+        ))
+    with pytest.raises(HTTPException):
+        cancel_multipart_upload(MultipartAbortRequest(upload_id=mine, s3_upload_id=their_s3_upload))
+    assert their_s3_upload in s3.multipart
+
+
+def test_parts_for_an_upload_never_started_are_rejected(db, s3, redis_client):
+    upload_id = upload(BIG)["upload_id"]
+    with pytest.raises(HTTPException) as e:
+        asyncio.run(presign_multipart_parts(
+            MultipartPartsRequest(upload_id=upload_id, s3_upload_id="mpu-made-up", part_numbers=[1])
+        ))
+    assert e.value.status_code == 404
+
+
+def test_only_stale_multipart_uploads_are_aborted(s3):
+    for upload_id in ("old", "new"):
+        s3.create_multipart_upload(Bucket="uploads", Key=f"uploads/{upload_id}.mp4")
+    s3.multipart["mpu-0"]["Initiated"] -= timedelta(days=2)
+    cutoff = datetime.utcnow() - timedelta(hours=24)
+
+    assert abort_stale_multipart_uploads(cutoff, dry_run=True) == 1
+    assert s3.aborted == []
+    assert abort_stale_multipart_uploads(cutoff) == 1
+    assert s3.aborted == ["mpu-0"] and list(s3.multipart) == ["mpu-1"]
@@ -0,0 +1,130 @@
+# worker/bitrate_model.py
+"""
+Self-calibrating safety factor for the worker's bitrate budget.
+
+safe_bitrate_calc() aims an encode at `target_bytes * safety`. Every encode
+records what it asked for (predicted bytes), what it produced and whether
+`-fs` cut it short (encode_outcomes). From that history we learn, per
+provider × resolution band × duration band, how far outputs land from the
+prediction, and pick the largest safety factor that keeps the high quantile
+of outputs under TARGET_FILL of the cap:
+
+    safety = TARGET_FILL / quantile(actual / predicted, OVERSHOOT_QUANTILE)
+
+Hardware and software encoders miss their rate targets by different amounts,
+so the encoder is tried first: groups with too few samples fall back to the
+encoder across providers, then to the encoder-agnostic provider and band
+factors, then to everything, then to DEFAULT_SAFETY. Truncated outputs only tell us the real
+size was above the cap, so they count as TRUNCATED_OVERSHOOT past it.
+Encodes held at the MIN_VIDEO_KBPS floor were asked for more than the budget,
+so their ratio says nothing about the safety factor and they are left out.
+"""
+import os
+import time
+from collections import defaultdict
+
+DEFAULT_SAFETY = 0.90
+MIN_SAFETY = 0.70
+MAX_SAFETY = 0.97
+TARGET_FILL = float(os.getenv("BITRATE_TARGET_FILL", "0.97"))  # of the cap, at the quantile below
+OVERSHOOT_QUANTILE = 0.95
+TRUNCATED_OVERSHOOT = 1.10
+MIN_VIDEO_KBPS = 240
+MIN_SAMPLES = int(os.getenv("BITRATE_MIN_SAMPLES", "20"))
+HISTORY_DAYS = int(os.getenv("BITRATE_HISTORY_DAYS", "30"))
+CALIBRATION_REFRESH_SEC = int(os.getenv("BITRATE_CALIBRATION_REFRESH_SEC", "900"))
+
+RESOLUTION_BANDS = ((640, "sd"), (1280, "hd"), (1920, "fhd"))  # by source long edge
+DURATION_BANDS = ((60, "short"), (300, "medium"), (1200, "long"))  # seconds
+
+
+def resolution_band(width: int | None, height: int | None) -> str:
+    long_edge = max(width or 0, height or 0)
+    for limit, band in RESOLUTION_BANDS:
+        if long_edge <= limit:
+            return band
+    return "uhd"
+
+
+def duration_band(duration: float | None) -> str:
+    for limit, band in DURATION_BANDS:
+        if (duration or 0) <= limit:
+            return band
+    return "very_long"
+
+
+def _quantile(values: list[float], q: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+def _ratio(row: dict) -> float:
+    if row["truncated"]:
+        return row["target_bytes"] / row["predicted_bytes"] * TRUNCATED_OVERSHOOT
+    return row["actual_bytes"] / row["predicted_bytes"]
+
+
+class Calibration:
+    def __init__(self, factors: dict | None = None, samples: int = 0):
+        # keys: (provider, encoder, res, dur) with provider and/or encoder None
+        # for the pooled groups, and (None, None, None, None) for everything
+        self.factors = factors or {}
+        self.samples = samples
+        self.loaded_at = time.time()
+
+    def safety_factor(self, provider: str, width: int | None, height: int | None,
+                      duration: float | None, encoder: str | None = None) -> float:
+        res, dur = resolution_band(width, height), duration_band(duration)
+        keys = [(provider, None, res, dur), (None, None, res, dur), (None, None, None, None)]
+        if encoder:
+            keys[:0] = [(provider, encoder, res, dur), (None, encoder, res, dur)]
+        for key in keys:
+            if key in self.factors:
+                return self.factors[key]
+        return DEFAULT_SAFETY
+
+    def summary(self) -> str:
+        providers = sum(1 for k in self.factors if k[0] is not None)
+        encoders = sum(1 for k in self.factors if k[1] is not None)
+        overall = self.factors.get((None, None, None, None), DEFAULT_SAFETY)
+        return (f"{self.samples} samples, {providers} provider groups, {encoders} encoder groups, "
+                f"overall safety {overall:.3f}")
+
+
+def fit_calibration(rows: list[dict]) -> Calibration:
+    groups = defaultdict(list)
+    for row in rows:
+        if not row["predicted_bytes"] or (row["video_kbps"] or 0) <= MIN_VIDEO_KBPS:
+            continue
+        ratio = _ratio(row)
+        res = resolution_band(row["source_width"], row["source_height"])
+        dur = duration_band(row["duration_sec"])
+        encoder = row.get("encoder")
+        keys = [(row["provider"], None, res, dur), (None, None, res, dur), (None, None, None, None)]
+        if encoder:
+            keys += [(row["provider"], encoder, res, dur), (None, encoder, res, dur)]
+        for key in keys:
+            groups[key].append(ratio)
+
+    factors = {}
+    for key, ratios in groups.items():
+        if len(ratios) < MIN_SAMPLES:
+            continue
+        safety = TARGET_FILL / _quantile(ratios, OVERSHOOT_QUANTILE)
+        factors[key] = round(min(MAX_SAFETY, max(MIN_SAFETY, safety)), 3)
+    return Calibration(factors, len(rows))
+
+
+def load_calibration(conn) -> Calibration:
+    """Fit from the last HISTORY_DAYS of encode_outcomes (psycopg2 RealDictCursor conn)."""
+    with conn.cursor() as cur:
+        cur.execute(
+            """
+            SELECT provider, encoder, target_bytes, predicted_bytes, actual_bytes, truncated, video_kbps,
+                   source_width, source_height, duration_sec
+            FROM encode_outcomes
+            WHERE created_at > NOW() - %s * INTERVAL '1 day'
+            """,
+            (HISTORY_DAYS,),
+        )
+        return fit_calibration(cur.fetchall())
@@ -0,0 +1,207 @@
+# worker/encoders.py
+"""
+Video encoder backends for the worker.
+
+Each backend knows its ffmpeg arguments and two numbers the planner uses:
+  - efficiency: bits it needs for the same quality as libx264 (x264 = 1.0)
+  - cost:       encode seconds per megapixel-frame on this machine
+
+Efficiency is declared (from published codec comparisons at these presets);
+cost starts from a declared guess and is replaced by calibrate_encoders(),
+a few-second micro-benchmark. Its result is cached in Redis per machine
+fingerprint (ffmpeg build, CPU model, vCPU count), so only the first worker
+on a given image + instance type pays for it; ENCODER_CALIBRATION=off skips
+it entirely and keeps the declared costs.
+"""
+import json
+import os
+import platform
+import shutil
+import subprocess
+import time
+from abc import ABC, abstractmethod
+
+FFMPEG_BIN = shutil.which("ffmpeg") or "ffmpeg"
+
+# Comma-separated allow-list, in order of preference on ties
+ENCODER_BACKENDS = os.getenv("ENCODER_BACKENDS", "libx264,libx265,libsvtav1")
+
+CALIBRATION_SIZE = (640, 360)
+CALIBRATION_FPS = 24
+CALIBRATION_SECONDS = 2
+ENCODER_CALIBRATION = os.getenv("ENCODER_CALIBRATION", "cached")  # cached | always | off
+CALIBRATION_CACHE_KEY = "mailsized_encoder_costs"  # hash: fingerprint → JSON {name: cost}
+
+
+class Encoder(ABC):
+    name = ""
+    efficiency = 1.0
+    cost = 0.01
+
+    @abstractmethod
+    def video_args(self, v_kbps: int) -> list[str]:
+        ...
+
+    def estimate_seconds(self, duration: float, fmt: dict) -> float:
+        megapixel_frames = duration * fmt["fps"] * fmt["width"] * fmt["height"] / 1e6
+        return megapixel_frames * self.cost
+
+
+class X264(Encoder):
+    name = "libx264"
+    efficiency = 1.0
+    cost = 0.004
+
+    def video_args(self, v_kbps: int) -> list[str]:
+        return [
+            "-c:v", "libx264",
+            "-preset", "veryfast",
+            "-threads", "1",
+            "-b:v", f"{v_kbps}k",
+            "-maxrate", f"{int(v_kbps*1.5)}k",
+            "-bufsize", f"{int(v_kbps*2)}k",
+        ]
+
+
+class X265(Encoder):
+    name = "libx265"
+    efficiency = 0.7
+    cost = 0.02
+
+    def video_args(self, v_kbps: int) -> list[str]:
+        return [
+            "-c:v", "libx265",
+            "-preset", "faster",
+            "-x265-params", "pools=1:frame-threads=1:log-level=error",
+            "-tag:v", "hvc1",  # lets QuickTime / iOS Mail play it inline
+            "-b:v", f"{v_kbps}k",
+            "-maxrate", f"{int(v_kbps*1.5)}k",
+            "-bufsize", f"{int(v_kbps*2)}k",
+        ]
+
+
+class SvtAv1(Encoder):
+    name = "libsvtav1"
+    efficiency = 0.6
+    cost = 0.015
+
+    def video_args(self, v_kbps: int) -> list[str]:
+        return [
+            "-c:v", "libsvtav1",
+            "-preset", "10",
+            "-svtav1-params", "lp=1",
+            "-b:v", f"{v_kbps}k",
+        ]
+
+
+BACKENDS = {cls.name: cls() for cls in (X264, X265, SvtAv1)}
+DEFAULT_ENCODER = BACKENDS["libx264"]
+
+_available: list[Encoder] | None = None
+
+
+def available_encoders() -> list[Encoder]:
+    """Allowed backends this ffmpeg build can actually run (x264 always kept)."""
+    global _available
+    if _available is None:
+        try:
+            listing = subprocess.run(
+                [FFMPEG_BIN, "-hide_banner", "-encoders"],
+                capture_output=True, text=True, timeout=30,
+            ).stdout
+        except Exception as e:
+            print(f"⚠️ Could not list ffmpeg encoders: {e}")
+            listing = ""
+
+        wanted = [n.strip() for n in ENCODER_BACKENDS.split(",") if n.strip() in BACKENDS]
+        _available = [BACKENDS[n] for n in wanted if f" {n} " in listing]
+        if DEFAULT_ENCODER not in _available:
+            _available.insert(0, DEFAULT_ENCODER)
+    return _available
+
+
+def machine_fingerprint() -> str:
+    """Identifies an image + instance type: ffmpeg build, CPU model, vCPUs."""
+    try:
+        version = subprocess.run(
+            [FFMPEG_BIN, "-hide_banner", "-version"], capture_output=True, text=True, timeout=30,
+        ).stdout.splitlines()[0]
+    except Exception:
+        version = "unknown"
+    cpu_model = platform.processor() or platform.machine()
+    try:
+        with open("/proc/cpuinfo") as f:
+            cpu_model = next(
+                (line.split(":", 1)[1].strip() for line in f if line.startswith("model name")), cpu_model
+            )
+    except OSError:
+        pass
+    return f"{version}|{cpu_model}|{os.cpu_count()}"
+
+
+def calibrate_encoders(cache=None):
+    """
+    Set each backend's cost: from the Redis `cache` when this machine type has
+    been measured before, otherwise by benchmarking (and storing the result).
+    """
+    if ENCODER_CALIBRATION == "off":
+        print("⏱ Encoder calibration off; using declared costs")
+        return
+
+    fingerprint = machine_fingerprint()
+    if cache is not None and ENCODER_CALIBRATION == "cached":
+        try:
+            cached = cache.hget(CALIBRATION_CACHE_KEY, fingerprint)
+            if cached:
+                for name, cost in json.loads(cached).items():
+                    if name in BACKENDS:
+                        BACKENDS[name].cost = cost
+                print(f"⏱ Encoder costs loaded from cache ({fingerprint})")
+                return
+        except Exception as e:
+            print(f"⚠️ Encoder cost cache unavailable: {e}")
+
+    measured = _benchmark_encoders()
+    if cache is not None and measured:
+        try:
+            cache.hset(CALIBRATION_CACHE_KEY, fingerprint, json.dumps(measured))
+        except Exception as e:
+            print(f"⚠️ Could not cache encoder costs: {e}")
+
+
+def _benchmark_encoders() -> dict:
+    """Measure each backend's cost on a short synthetic clip; returns {name: cost}."""
+    width, height = CALIBRATION_SIZE
+    megapixel_frames = CALIBRATION_SECONDS * CALIBRATION_FPS * width * height / 1e6
+    source = f"testsrc2=size={width}x{height}:rate={CALIBRATION_FPS}:duration={CALIBRATION_SECONDS}"
+
+    def timed_run(video_args: list[str]) -> float:
+        cmd = [
+            FFMPEG_BIN, "-hide_banner", "-loglevel", "error",
+            "-f", "lavfi", "-i", source,
+            "-pix_fmt", "yuv420p",
+            *video_args,
+            "-f", "null", "-",
+        ]
+        started = time.perf_counter()
+        subprocess.run(cmd, capture_output=True, timeout=120, check=True)
+        return time.perf_counter() - started
+
+    # ffmpeg start-up and test-pattern generation, subtracted from every backend
+    try:
+        baseline = timed_run([])
+    except Exception as e:
+        print(f"⚠️ Encoder calibration skipped: {e}")
+        return {}
+
+    measured = {}
+    for encoder in available_encoders():
+        try:
+            elapsed = timed_run(encoder.video_args(800))
+        except Exception as e:
+            print(f"⚠️ Calibration failed for {encoder.name}, keeping default cost: {e}")
+            continue
+        encoder.cost = max(elapsed - baseline, 0.01) / megapixel_frames
+        measured[encoder.name] = encoder.cost
+        print(f"⏱ {encoder.name}: {encoder.cost * 1000:.2f} ms per megapixel-frame")
+    return measured
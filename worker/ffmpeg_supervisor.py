@@ -0,0 +1,126 @@
+# worker/ffmpeg_supervisor.py
+"""
+Runs one ffmpeg process under a watchdog.
+
+Both pipes are drained by reader threads, so a chatty stderr can never fill
+its pipe and block ffmpeg. The supervising loop feeds `-progress` lines to a
+callback and kills the process when:
+  - out_time has not advanced for `stall_sec` (stalled)
+  - the run exceeds `wall_budget_sec` (timeout)
+  - the callback raises (e.g. the worker is draining); the exception propagates
+
+Any run that does not exit cleanly raises FfmpegError carrying its
+classification and the stderr tail, which becomes the job's error.
+"""
+import os
+import queue
+import subprocess
+import threading
+import time
+from collections import deque
+
+FFMPEG_STALL_SEC = float(os.getenv("FFMPEG_STALL_SEC", "60"))
+FFMPEG_MIN_BUDGET_SEC = float(os.getenv("FFMPEG_MIN_BUDGET_SEC", "300"))
+FFMPEG_BUDGET_REALTIME = float(os.getenv("FFMPEG_BUDGET_REALTIME", "4"))  # wall seconds per second of video
+STDERR_TAIL_LINES = 40
+
+_EOF = object()
+
+
+class FfmpegError(Exception):
+    """ffmpeg did not finish cleanly; `kind` is failed, stalled or timeout."""
+
+    def __init__(self, kind: str, detail: str, stderr_tail: str = ""):
+        self.kind = kind
+        self.stderr_tail = stderr_tail
+        message = f"ffmpeg {kind}: {detail}"
+        if stderr_tail:
+            message += "\n" + stderr_tail
+        super().__init__(message)
+
+
+def wall_budget(duration: float, estimate_sec: float = 0.0) -> float:
+    """Wall-clock allowance for an encode of `duration` seconds of video."""
+    return max(FFMPEG_MIN_BUDGET_SEC, duration * FFMPEG_BUDGET_REALTIME, estimate_sec * 3)
+
+
+def _pump(stream, sink, end_marker=None):
+    try:
+        for line in iter(stream.readline, ""):
+            sink(line)
+    finally:
+        stream.close()
+        if end_marker is not None:
+            sink(end_marker)
+
+
+def _stop(proc: subprocess.Popen):
+    if proc.poll() is not None:
+        return
+    proc.terminate()
+    try:
+        proc.wait(timeout=5)
+    except subprocess.TimeoutExpired:
+        proc.kill()
+        proc.wait()
+
+
+def supervise_ffmpeg(
+    cmd: list[str],
+    on_line=None,
+    stall_sec: float = FFMPEG_STALL_SEC,
+    wall_budget_sec: float = FFMPEG_MIN_BUDGET_SEC,
+) -> str:
+    """Run `cmd` (which must use `-progress pipe:1`); returns the stderr tail."""
+    proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
+
+    stdout_lines = queue.Queue()
+    stderr_tail = deque(maxlen=STDERR_TAIL_LINES)
+    readers = [
+        threading.Thread(target=_pump, args=(proc.stdout, stdout_lines.put, _EOF), daemon=True),
+        threading.Thread(target=_pump, args=(proc.stderr, stderr_tail.append), daemon=True),
+    ]
+    for reader in readers:
+        reader.start()
+
+    def tail() -> str:
+        return "".join(stderr_tail).strip()
+
+    started = last_advance = time.time()
+    last_out_time = None
+
+    try:
+        while True:
+            try:
+                line = stdout_lines.get(timeout=1)
+            except queue.Empty:
+                line = None
+
+            if line is _EOF:
+                break
+
+            now = time.time()
+            if line is not None:
+                key, _, value = line.strip().partition("=")
+                if key in ("out_time_us", "out_time_ms") and value != last_out_time:
+                    last_out_time, last_advance = value, now
+                if on_line is not None:
+                    on_line(line)
+
+            if now - last_advance > stall_sec:
+                _stop(proc)
+                raise FfmpegError("stalled", f"no progress for {stall_sec:.0f}s", tail())
+            if now - started > wall_budget_sec:
+                _stop(proc)
+                raise FfmpegError("timeout", f"exceeded {wall_budget_sec:.0f}s budget", tail())
+    except BaseException:
+        _stop(proc)
+        raise
+    finally:
+        for reader in readers:
+            reader.join(timeout=5)
+
+    returncode = proc.wait()
+    if returncode != 0:
+        raise FfmpegError("failed", f"exit code {returncode}", tail())
+    return tail()
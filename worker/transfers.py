@@ -0,0 +1,165 @@
+# worker/transfers.py
+"""
+Parallel ranged S3 transfers for the worker.
+
+boto3's defaults (8 MB parts, 10 threads, a 10-connection client) leave most
+of a Fargate task's bandwidth unused on multi-GB files. Here both directions
+run S3_TRANSFER_CONCURRENCY parts at once over the dedicated transfer client,
+whose pool is sized to match, with parts of S3_TRANSFER_PART_MB (grown for
+huge objects so uploads stay under S3's 10,000-part limit).
+
+Integrity:
+  - uploads send a CRC32 per part, which S3 checks on receipt
+  - downloads ask S3 for checksums (validated whenever S3 returns one)
+  - both verify the final size against the object's ContentLength
+
+Every transfer reports bytes/s.
+
+Benchmark against a local S3-compatible stand-in (e.g. MinIO) or a real bucket.
+The pool is sized from S3_TRANSFER_CONCURRENCY, so set it to at least the
+largest --concurrency being compared:
+
+    S3_ENDPOINT_URL=http://localhost:9000 S3_TRANSFER_CONCURRENCY=32 python worker/transfers.py --bucket bench \\
+        --size-mb 2048 --part-mb 16,64 --concurrency 8,16,32
+"""
+import sys
+import os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import argparse
+import math
+import tempfile
+import time
+from pathlib import Path
+from boto3.s3.transfer import TransferConfig
+from app.utils.clients import S3_TRANSFER_CONCURRENCY, get_s3_transfer
+
+S3_TRANSFER_PART_MB = int(os.getenv("S3_TRANSFER_PART_MB", "64"))
+MAX_PARTS = 10_000
+IO_CHUNK_BYTES = 1024 * 1024  # read/write size per part stream; the 256 KB default costs CPU at GB/s
+MB = 1024 * 1024
+
+
+class TransferError(Exception):
+    """A transfer finished but the object does not match what was sent/received."""
+
+
+def part_size(size_bytes: int, part_mb: int = S3_TRANSFER_PART_MB) -> int:
+    return max(part_mb * MB, math.ceil(size_bytes / MAX_PARTS / MB) * MB)
+
+
+def transfer_config(size_bytes: int, part_mb: int = S3_TRANSFER_PART_MB,
+                    concurrency: int = S3_TRANSFER_CONCURRENCY) -> TransferConfig:
+    chunk = part_size(size_bytes, part_mb)
+    return TransferConfig(
+        multipart_threshold=chunk,
+        multipart_chunksize=chunk,
+        max_concurrency=concurrency,
+        io_chunksize=IO_CHUNK_BYTES,
+        use_threads=True,
+    )
+
+
+def _stats(direction: str, key: str, size_bytes: int, started: float) -> dict:
+    seconds = max(time.perf_counter() - started, 1e-6)
+    stats = {
+        "direction": direction,
+        "key": key,
+        "bytes": size_bytes,
+        "seconds": round(seconds, 2),
+        "bytes_per_sec": int(size_bytes / seconds),
+    }
+    arrow = "⬇️" if direction == "download" else "⬆️"
+    print(f"{arrow} {key}: {size_bytes / MB:.1f} MB in {seconds:.1f}s ({size_bytes / MB / seconds:.1f} MB/s)")
+    return stats
+
+
+def download(bucket: str, key: str, path: Path, config: TransferConfig | None = None) -> dict:
+    s3 = get_s3_transfer()
+    size_bytes = s3.head_object(Bucket=bucket, Key=key)["ContentLength"]
+
+    started = time.perf_counter()
+    s3.download_file(
+        bucket, key, str(path),
+        ExtraArgs={"ChecksumMode": "ENABLED"},
+        Config=config or transfer_config(size_bytes),
+    )
+    received = os.path.getsize(path)
+    if received != size_bytes:
+        raise TransferError(f"s3://{bucket}/{key}: downloaded {received} of {size_bytes} bytes")
+    return _stats("download", key, size_bytes, started)
+
+
+def upload(path: Path, bucket: str, key: str, content_type: str = "video/mp4",
+           config: TransferConfig | None = None) -> dict:
+    s3 = get_s3_transfer()
+    size_bytes = os.path.getsize(path)
+
+    started = time.perf_counter()
+    s3.upload_file(
+        str(path), bucket, key,
+        ExtraArgs={"ChecksumAlgorithm": "CRC32", "ContentType": content_type},
+        Config=config or transfer_config(size_bytes),
+    )
+    stored = s3.head_object(Bucket=bucket, Key=key)["ContentLength"]
+    if stored != size_bytes:
+        raise TransferError(f"s3://{bucket}/{key}: stored {stored} of {size_bytes} bytes")
+    return _stats("upload", key, size_bytes, started)
+
+
+# ─────────────── Benchmark ───────────────
+def _random_file(path: Path, size_bytes: int):
+    # incompressible, like encoded video
+    with open(path, "wb") as f:
+        remaining = size_bytes
+        while remaining:
+            chunk = min(remaining, 8 * MB)
+            f.write(os.urandom(chunk))
+            remaining -= chunk
+
+
+def run_benchmark(bucket: str, size_mb: int, part_sizes: list[int], concurrencies: list[int], runs: int):
+    size_bytes = size_mb * MB
+    configs = [("boto3 default", TransferConfig())]
+    configs += [
+        (f"{p} MB × {c}", transfer_config(size_bytes, part_mb=p, concurrency=c))
+        for p in part_sizes for c in concurrencies
+    ]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        source, target = Path(tmp) / "source.bin", Path(tmp) / "target.bin"
+        _random_file(source, size_bytes)
+        key = f"transfer-benchmark/{os.getpid()}.bin"
+
+        results = []
+        for name, config in configs:
+            up, down = [], []
+            for _ in range(runs):
+                up.append(upload(source, bucket, key, "application/octet-stream", config)["bytes_per_sec"])
+                down.append(download(bucket, key, target, config)["bytes_per_sec"])
+                target.unlink()
+            results.append((name, max(up), max(down)))
+        get_s3_transfer().delete_object(Bucket=bucket, Key=key)
+
+    print(f"\n{size_mb} MB object, best of {runs}, pool={get_s3_transfer().meta.config.max_pool_connections}")
+    print(f"{'config':<16} {'upload MB/s':>12} {'download MB/s':>14}")
+    for name, up, down in results:
+        print(f"{name:<16} {up / MB:>12.1f} {down / MB:>14.1f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--bucket", required=True)
+    parser.add_argument("--size-mb", type=int, default=2048)
+    parser.add_argument("--part-mb", default=f"16,{S3_TRANSFER_PART_MB}", help="comma-separated part sizes")
+    parser.add_argument("--concurrency", default=f"8,{S3_TRANSFER_CONCURRENCY}", help="comma-separated thread counts")
+    parser.add_argument("--runs", type=int, default=2)
+    args = parser.parse_args()
+
+    run_benchmark(
+        args.bucket,
+        args.size_mb,
+        [int(v) for v in args.part_mb.split(",")],
+        [int(v) for v in args.concurrency.split(",")],
+        args.runs,
+    )
@@ -7,46 +7,29 @@ sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
 import json
 import re
 import shutil
+import signal
+import socket
+import threading
 import time
-import ssl
 import subprocess
+from datetime import datetime
 from pathlib import Path
-from urllib.parse import urlparse
 from dotenv import load_dotenv
-import boto3
-import redis
 import psycopg2
-from psycopg2.extras import RealDictCursor
-from app.utils.email_utils import send_output_email
+from psycopg2.extras import RealDictCursor, execute_values
+from app.utils.clients import close_all, get_redis, get_s3
+from app.utils.email_utils import send_batch_summary_email, send_output_email
+from app.utils.redis_utils import QUEUE_NAME, WORKERS_KEY
+from app.utils.queue_estimate import DEFAULT_SEC_PER_MEDIA_SEC
+from bitrate_model import CALIBRATION_REFRESH_SEC, DEFAULT_SAFETY, MIN_VIDEO_KBPS, Calibration, load_calibration
+from encoders import available_encoders, calibrate_encoders
+from ffmpeg_supervisor import supervise_ffmpeg, wall_budget
+from transfers import download, upload
 
 # ─────────────── Load environment ───────────────
 load_dotenv()
 
-# ─────────────── Redis ───────────────
-redis_url = urlparse(os.getenv("REDIS_URL", "redis://localhost:6379/0"))
-use_ssl = redis_url.scheme in ("rediss",)
-print(f"🔗 Connecting to Redis at {redis_url.hostname}:{redis_url.port} (SSL={use_ssl})")
-
-try:
-    redis_client = redis.Redis(
-        host=redis_url.hostname,
-        port=redis_url.port or 6379,
-        db=0,
-        ssl=use_ssl,
-        ssl_cert_reqs=ssl.CERT_NONE,
-        socket_connect_timeout=5,
-        socket_timeout=10,
-        retry_on_timeout=True,
-    )
-    redis_client.ping()
-    print("✅ Redis connection successful!")
-except Exception as e:
-    print(f"❌ Redis connection failed: {e}")
-    redis_client = None
-
-
-# ─────────────── AWS Clients ───────────────
-s3 = boto3.client("s3")
+# ─────────────── AWS ───────────────
 UPLOAD_BUCKET = os.getenv("UPLOADS_BUCKET")
 OUTPUT_BUCKET = os.getenv("OUTPUTS_BUCKET")
 
@@ -57,22 +40,199 @@ def get_db_conn():
     return psycopg2.connect(DATABASE_URL, cursor_factory=RealDictCursor)
 
 
+# ─────────────── Stage Timeline ───────────────
+def save_timeline(rows):
+    """Write collected (upload_id, stage, at) rows to job_stages in one INSERT."""
+    if not rows:
+        return
+    try:
+        conn = get_db_conn()
+        with conn.cursor() as cur:
+            execute_values(cur, "INSERT INTO job_stages (upload_id, stage, at) VALUES %s", rows)
+            conn.commit()
+        conn.close()
+    except Exception as e:
+        print(f"⚠️ Failed to save stage timeline: {e}")
+
+
+# ─────────────── Graceful Drain ───────────────
+# Must stay below the container's stopTimeout (ECS SIGKILLs after it)
+WORKER_STOP_TIMEOUT_SEC = float(os.getenv("WORKER_STOP_TIMEOUT_SEC", "30"))
+DRAIN_UPLOAD_MARGIN_SEC = 10  # time kept back for upload + DB update after the encode
+
+shutdown_requested = threading.Event()
+_drain_deadline = None
+
+
+class JobDrained(Exception):
+    """The worker is shutting down and the job must go back to the queue."""
+
+    def __init__(self, reason: str, progress: float = 0.0):
+        super().__init__(reason)
+        self.progress = progress
+
+
+def request_shutdown(signum, frame):
+    global _drain_deadline
+    if not shutdown_requested.is_set():
+        _drain_deadline = time.time() + WORKER_STOP_TIMEOUT_SEC
+        print(f"🛑 Signal {signum}: draining (deadline in {WORKER_STOP_TIMEOUT_SEC:.0f}s), no new jobs")
+    shutdown_requested.set()
+
+
+def fits_before_deadline(seconds_left: float | None) -> bool:
+    """True if work needing `seconds_left` (None = unknown) can finish before SIGKILL."""
+    if not shutdown_requested.is_set():
+        return True
+    if seconds_left is None:
+        return False
+    return time.time() + seconds_left + DRAIN_UPLOAD_MARGIN_SEC < _drain_deadline
+
+
+def requeue_job(job: dict, progress: float, reason: str):
+    """Reset the job to queued and put it back at the front of the queue."""
+    upload_id = job["upload_id"]
+    try:
+        conn = get_db_conn()
+        with conn.cursor() as cur:
+            cur.execute(
+                "UPDATE jobs SET status='queued', progress=0, progress_detail=NULL WHERE upload_id=%s",
+                (upload_id,),
+            )
+            conn.commit()
+        conn.close()
+    except Exception as e:
+        print(f"⚠️ Failed to reset job {upload_id} before requeue: {e}")
+
+    payload = dict(job, requeued=int(job.get("requeued", 0)) + 1, drained_at_progress=round(progress, 1))
+    get_redis().lpush(QUEUE_NAME, json.dumps(payload))
+    print(f"↩️ Requeued job {upload_id} at {progress:.0f}% ({reason})")
+
+
+# ─────────────── Heartbeat (queue estimates) ───────────────
+# The API's queue estimator reads these to predict start/finish times
+WORKER_ID = f"{socket.gethostname()}-{os.getpid()}"
+HEARTBEAT_INTERVAL_SEC = 10
+
+_sec_per_media_sec = None  # EWMA of wall seconds per second of video, whole job
+_last_heartbeat = 0.0
+_busy_until = None  # latest estimate, repeated by the heartbeat thread
+_heartbeat_stop = threading.Event()
+
+
+def heartbeat(busy_until: float | None = None, force: bool = False):
+    global _last_heartbeat, _busy_until
+    _busy_until = busy_until
+    now = time.time()
+    if not force and now - _last_heartbeat < HEARTBEAT_INTERVAL_SEC:
+        return
+    _last_heartbeat = now
+    beat = {"ts": now, "busy_until": busy_until, "sec_per_media_sec": _sec_per_media_sec}
+    try:
+        get_redis().hset(WORKERS_KEY, WORKER_ID, json.dumps(beat))
+    except Exception as e:
+        print(f"⚠️ Heartbeat failed: {e}")
+
+
+def _heartbeat_loop():
+    # Long S3 transfers make no progress callbacks for minutes; without this
+    # the estimator would drop the worker as stale mid-job
+    while not _heartbeat_stop.wait(HEARTBEAT_INTERVAL_SEC):
+        heartbeat(_busy_until, force=True)
+
+
+def start_heartbeat_thread() -> threading.Thread:
+    _heartbeat_stop.clear()
+    thread = threading.Thread(target=_heartbeat_loop, name="heartbeat", daemon=True)
+    thread.start()
+    return thread
+
+
+def record_service_time(seconds: float, duration: float):
+    global _sec_per_media_sec
+    if duration <= 0:
+        return
+    ratio = seconds / duration
+    _sec_per_media_sec = ratio if _sec_per_media_sec is None else 0.7 * _sec_per_media_sec + 0.3 * ratio
+
+
+def leave_fleet():
+    try:
+        get_redis().hdel(WORKERS_KEY, WORKER_ID)
+    except Exception:
+        pass
+
+
 # ─────────────── Folders ───────────────
 WORK_DIR = Path("tmp")
 WORK_DIR.mkdir(exist_ok=True)
 
 FFMPEG_BIN = shutil.which("ffmpeg") or "ffmpeg"
+FFPROBE_BIN = shutil.which("ffprobe") or "ffprobe"
 
 
 # ─────────────── Progress Parser ───────────────
-def percent_from_out_time_ms(line: str, duration: float) -> float:
-    m = re.match(r"out_time_ms=(\d+)", line.strip())
-    if not m or duration <= 0:
-        return 0.0
-
-    ms = int(m.group(1))
-    pct = (ms / 1_000_000.0) / duration * 100.0
-    return min(99.0, pct)
+class ProgressParser:
+    """Collects `-progress` key=value lines; feed() returns each completed block."""
+
+    def __init__(self):
+        self._block = {}
+
+    def feed(self, line: str) -> dict | None:
+        key, sep, value = line.strip().partition("=")
+        if not sep:
+            return None
+        self._block[key] = value.strip()
+        if key != "progress":
+            return None
+        block, self._block = self._block, {}
+        return block
+
+
+def _number(value: str | None) -> float | None:
+    """'1.52x', '812.4kbits/s', '29.97' → float; 'N/A' or missing → None."""
+    m = re.match(r"\s*(-?[\d.]+)", value or "")
+    return float(m.group(1)) if m else None
+
+
+def progress_record(block: dict, duration: float, target_bytes: int, elapsed: float) -> dict:
+    """
+    One structured progress record from a `-progress` block. 100% is kept
+    for "uploaded and done", so encode progress stops at 99. ETA prefers the
+    realtime speed; projected size extrapolates the bytes written so far.
+    """
+    # out_time_ms is really microseconds in ffmpeg's output, like out_time_us
+    out_time_us = _number(block.get("out_time_us")) or _number(block.get("out_time_ms")) or 0.0
+    out_time = max(0.0, out_time_us / 1_000_000.0)
+    fraction = min(1.0, out_time / duration) if duration > 0 else 0.0
+    pct = min(99.0, fraction * 100.0)
+
+    speed = _number(block.get("speed"))
+    size_bytes = int(_number(block.get("total_size")) or 0)
+
+    if speed:
+        eta_sec = max(0.0, duration - out_time) / speed
+    elif pct > 0:
+        eta_sec = elapsed * (100 - pct) / pct
+    else:
+        eta_sec = None
+
+    projected_bytes = int(size_bytes / fraction) if fraction > 0 else None
+
+    return {
+        "percent": round(pct, 2),
+        "out_time_sec": round(out_time, 2),
+        "fps": _number(block.get("fps")),
+        "speed": speed,
+        "bitrate_kbps": _number(block.get("bitrate")),
+        "size_bytes": size_bytes,
+        "target_bytes": target_bytes,
+        "projected_bytes": projected_bytes,
+        # Early projections are dominated by headers and rate-control warm-up
+        "overshoot": bool(projected_bytes and pct >= 10 and projected_bytes > target_bytes),
+        "eta_sec": round(eta_sec, 1) if eta_sec is not None else None,
+        "ended": block.get("progress") == "end",
+    }
 
 
 # ─────────────── Target Size (Option B Safe Limits) ───────────────
@@ -88,19 +248,306 @@ def choose_target(provider: str) -> int:
 
 
 # ─────────────── Stable Bitrate Calc ───────────────
-def safe_bitrate_calc(duration_s: float, target_bytes: int, audio_kbps=96):
+AUDIO_KBPS = 96
+
+
+def safe_bitrate_calc(duration_s: float, target_bytes: int, audio_kbps=AUDIO_KBPS, safety=DEFAULT_SAFETY):
     if duration_s < 5:
         duration_s = 5
     if duration_s > 7200:
         duration_s = 7200
 
-    total_bits = target_bytes * 8 * 0.90
+    total_bits = target_bytes * 8 * safety
     total_kbps = total_bits / duration_s / 1000
 
-    v_kbps = max(240.0, total_kbps - audio_kbps)
+    v_kbps = max(float(MIN_VIDEO_KBPS), total_kbps - audio_kbps)
+    return int(v_kbps)
+
+
+def predicted_bytes(duration_s: float, v_kbps: int, audio_kbps=AUDIO_KBPS) -> int:
+    """Size the encoder is asked for; over target * safety only when the MIN_VIDEO_KBPS floor applies."""
+    return int((v_kbps + audio_kbps) * 1000 / 8 * duration_s)
+
+
+# ─────────────── Bitrate Calibration ───────────────
+calibration = Calibration()
+
+
+def refresh_calibration(force: bool = False):
+    """Re-fit the safety factors from recent outcomes every CALIBRATION_REFRESH_SEC."""
+    global calibration
+    if not force and time.time() - calibration.loaded_at < CALIBRATION_REFRESH_SEC:
+        return
+    try:
+        conn = get_db_conn()
+        try:
+            calibration = load_calibration(conn)
+        finally:
+            conn.close()
+        print(f"📐 Bitrate calibration: {calibration.summary()}")
+    except Exception as e:
+        calibration.loaded_at = time.time()  # keep the current factors; retry next interval
+        print(f"⚠️ Bitrate calibration refresh failed: {e}")
+
+
+def save_encode_outcomes(rows: list[tuple]):
+    if not rows:
+        return
+    try:
+        conn = get_db_conn()
+        with conn.cursor() as cur:
+            execute_values(
+                cur,
+                """
+                INSERT INTO encode_outcomes (
+                    upload_id, provider, encoder, target_bytes, predicted_bytes, actual_bytes,
+                    safety_factor, video_kbps, duration_sec, output_duration_sec, truncated,
+                    source_width, source_height, source_fps, source_kbps,
+                    output_width, output_height, output_fps
+                ) VALUES %s
+                """,
+                rows,
+            )
+            conn.commit()
+        conn.close()
+    except Exception as e:
+        print(f"⚠️ Failed to save encode outcomes: {e}")
+
+
+# ─────────────── Source Probe ───────────────
+def _parse_rate(rate: str) -> float:
+    num, _, den = (rate or "0/1").partition("/")
+    try:
+        return float(num) / float(den or 1)
+    except (ValueError, ZeroDivisionError):
+        return 0.0
+
+
+def probe_video(path) -> dict:
+    """Display width/height, frame rate and duration of the first video stream."""
+    info = {"width": 1920, "height": 1080, "fps": 30.0, "duration": 0.0}
+    try:
+        out = subprocess.run(
+            [
+                FFPROBE_BIN, "-v", "error",
+                "-select_streams", "v:0",
+                "-show_entries",
+                "stream=width,height,avg_frame_rate,r_frame_rate:stream_tags=rotate"
+                ":stream_side_data=rotation:format=duration",
+                "-of", "json",
+                str(path),
+            ],
+            capture_output=True, text=True, timeout=60, check=True,
+        ).stdout
+        data = json.loads(out)
+    except Exception as e:
+        print(f"⚠️ ffprobe failed, assuming {info['width']}x{info['height']}@{info['fps']}: {e}")
+        return info
+
+    stream = (data.get("streams") or [{}])[0]
+    width, height = int(stream.get("width") or 0), int(stream.get("height") or 0)
+
+    # Phone footage is stored landscape with a rotation flag; ffmpeg autorotates
+    rotation = stream.get("tags", {}).get("rotate")
+    for side_data in stream.get("side_data_list", []):
+        rotation = side_data.get("rotation", rotation)
+    if rotation is not None and abs(int(float(rotation))) % 180 == 90:
+        width, height = height, width
+
+    fps = _parse_rate(stream.get("avg_frame_rate")) or _parse_rate(stream.get("r_frame_rate"))
+
+    if width > 0 and height > 0:
+        info["width"], info["height"] = width, height
+    if 0 < fps <= 240:
+        info["fps"] = fps
+    try:
+        info["duration"] = float(data.get("format", {}).get("duration") or 0)
+    except ValueError:
+        pass
+    return info
+
+
+# ─────────────── Resolution / Frame-Rate Ladder ───────────────
+# (long edge px, fps), best first. The first rung that still gets
+# MIN_BITS_PER_PIXEL bits per pixel per frame wins; tight budgets fall to
+# small, low-rate frames, which also makes the encode much cheaper.
+OUTPUT_LADDER = (
+    (1920, 30), (1280, 30), (1280, 24), (960, 24), (854, 24),
+    (640, 24), (640, 20), (480, 20), (480, 15), (426, 15),
+    (320, 15), (320, 12), (320, 10),
+)
+MIN_BITS_PER_PIXEL = 0.05
+
+
+def _even(value: float) -> int:
+    return max(2, int(round(value / 2)) * 2)
 
-    cap = 1280 if v_kbps >= 800 else 854
-    return int(v_kbps), cap
+
+def choose_output_format(v_kbps: int, source: dict) -> dict:
+    """Output width/height/fps for a video bitrate; never upscales or raises fps."""
+    src_w, src_h, src_fps = source["width"], source["height"], source["fps"]
+
+    rung = None
+    for long_edge, fps in OUTPUT_LADDER:
+        scale = min(1.0, long_edge / max(src_w, src_h))
+        width, height = _even(src_w * scale), _even(src_h * scale)
+        fps = min(fps, src_fps)
+        bpp = v_kbps * 1000 / (width * height * fps)
+        rung = {"width": width, "height": height, "fps": fps, "bpp": round(bpp, 3)}
+        if bpp >= MIN_BITS_PER_PIXEL:
+            break
+    return rung
+
+
+# ─────────────── Encoder Planning ───────────────
+# Queue depth at which every job goes to the fastest backend
+QUEUE_PRESSURE_DEPTH = int(os.getenv("QUEUE_PRESSURE_DEPTH", "10"))
+# Encode seconds we are willing to spend per second of video on an idle queue
+ENCODE_BUDGET_REALTIME = float(os.getenv("ENCODE_BUDGET_REALTIME", "1.0"))
+SHORT_VIDEO_SEC = 60
+GOOD_BITS_PER_PIXEL = 0.1  # above this a better codec buys nothing visible
+
+
+def queue_depth() -> int:
+    try:
+        return get_redis().llen(QUEUE_NAME)
+    except Exception:
+        return 0
+
+
+def plan_encode(v_kbps: int, duration: float, source: dict, depth: int):
+    """
+    (encoder, output format) for one job. A backend with efficiency e turns
+    v_kbps into v_kbps / e x264-equivalent bits, so efficient codecs climb
+    the ladder on tight budgets. Short videos and a busy queue take the
+    fastest backend; otherwise the best-looking plan whose estimated encode
+    time fits the budget wins.
+    """
+    plans = []
+    for encoder in available_encoders():
+        fmt = choose_output_format(int(v_kbps / encoder.efficiency), source)
+        plans.append((encoder, fmt, encoder.estimate_seconds(duration, fmt)))
+
+    fastest = min(plans, key=lambda p: p[2])
+    if duration < SHORT_VIDEO_SEC or depth >= QUEUE_PRESSURE_DEPTH:
+        return fastest[0], fastest[1]
+
+    budget = duration * ENCODE_BUDGET_REALTIME * (1 - depth / QUEUE_PRESSURE_DEPTH)
+    affordable = [p for p in plans if p[2] <= max(budget, fastest[2])]
+
+    def quality(plan):
+        _, fmt, seconds = plan
+        return (fmt["width"] * fmt["height"] * fmt["fps"], min(fmt["bpp"], GOOD_BITS_PER_PIXEL), -seconds)
+
+    encoder, fmt, _ = max(affordable, key=quality)
+    return encoder, fmt
+
+
+def output_filters(fmt: dict, source: dict) -> str:
+    """Drop frames before scaling so the scaler only touches frames that are kept."""
+    filters = []
+    if fmt["fps"] < source["fps"] - 0.5:
+        filters.append(f"fps={fmt['fps']:g}")
+    if (fmt["width"], fmt["height"]) != (source["width"], source["height"]):
+        filters.append(f"scale={fmt['width']}:{fmt['height']}")
+    filters.append("format=yuv420p")
+    return ",".join(filters)
+
+
+def plan_targets(upload_id: str, providers: list[str], duration: float, source: dict) -> list[dict]:
+    """One planned output per provider; the first is the job's primary output."""
+    targets, depth = [], queue_depth()
+    for i, provider in enumerate(dict.fromkeys(providers)):
+        target_bytes = choose_target(provider)
+        safety = calibration.safety_factor(provider, source["width"], source["height"], duration)
+        v_kbps = safe_bitrate_calc(duration, target_bytes, safety=safety)
+        encoder, fmt = plan_encode(v_kbps, duration, source, depth)
+        # The backend is picked on the encoder-agnostic budget; its own overshoot history then sets the bitrate
+        encoder_safety = calibration.safety_factor(provider, source["width"], source["height"], duration, encoder.name)
+        if encoder_safety != safety:
+            safety = encoder_safety
+            v_kbps = safe_bitrate_calc(duration, target_bytes, safety=safety)
+            fmt = choose_output_format(int(v_kbps / encoder.efficiency), source)
+        suffix = "" if i == 0 else f"_{provider}"
+        targets.append({
+            "provider": provider,
+            "target_bytes": target_bytes,
+            "safety": safety,
+            "v_kbps": v_kbps,
+            "encoder": encoder,
+            "fmt": fmt,
+            "key": f"outputs/{upload_id}_compressed.mp4" if i == 0 else f"outputs/{upload_id}{suffix}.mp4",
+            "path": WORK_DIR / f"{upload_id}_output{suffix}.mp4",
+        })
+    return targets
+
+
+def build_ffmpeg_cmd(input_path: Path, source: dict, targets: list[dict]) -> list[str]:
+    """
+    One ffmpeg run for every target: the source is decoded once and a split
+    filter graph feeds each output its own fps/scale chain and encoder.
+    """
+    cmd = [
+        FFMPEG_BIN, "-y",
+        "-progress", "pipe:1",
+        "-nostats",
+        "-loglevel", "error",
+        "-i", str(input_path),
+    ]
+    if len(targets) > 1:
+        branches = "".join(f"[s{i}]" for i in range(len(targets)))
+        graph = [f"[0:v:0]split={len(targets)}{branches}"]
+        graph += [f"[s{i}]{output_filters(t['fmt'], source)}[v{i}]" for i, t in enumerate(targets)]
+        cmd += ["-filter_complex", ";".join(graph)]
+
+    for i, t in enumerate(targets):
+        if len(targets) > 1:
+            cmd += ["-map", f"[v{i}]"]
+        else:
+            cmd += ["-map", "0:v:0", "-vf", output_filters(t["fmt"], source)]
+        cmd += [
+            "-map", "0:a:0?",
+            *t["encoder"].video_args(t["v_kbps"]),
+            "-c:a", "aac", "-b:a", "96k",
+            "-fs", str(t["target_bytes"]),
+            str(t["path"]),
+        ]
+    return cmd
+
+
+def encode_outcome_rows(upload_id: str, duration: float, source: dict, source_kbps: int,
+                        targets: list[dict]) -> list[tuple]:
+    """encode_outcomes rows for finished targets; an output shorter than the source was cut by -fs."""
+    rows = []
+    for t in targets:
+        fmt = t["fmt"]
+        output_duration = probe_video(t["path"])["duration"] or None
+        truncated = bool(output_duration) and output_duration < duration - max(1.0, duration * 0.01)
+        rows.append((
+            upload_id, t["provider"], t["encoder"].name, t["target_bytes"],
+            predicted_bytes(duration, t["v_kbps"]), t["path"].stat().st_size,
+            t["safety"], t["v_kbps"], duration, output_duration, truncated,
+            source["width"], source["height"], source["fps"], source_kbps,
+            fmt["width"], fmt["height"], fmt["fps"],
+        ))
+        if truncated:
+            print(f"⚠️ {upload_id} {t['provider']} output truncated at {output_duration:.1f}s of {duration:.1f}s")
+    return rows
+
+
+def save_job_outputs(upload_id: str, outputs: list[tuple]):
+    """Record the extra provider outputs as (provider, key, url, size) rows."""
+    conn = get_db_conn()
+    try:
+        with conn.cursor() as cur:
+            execute_values(
+                cur,
+                "INSERT INTO job_outputs (upload_id, provider, output_path, output_url, size_bytes, created_at) VALUES %s",
+                [(upload_id, *o, datetime.utcnow()) for o in outputs],
+            )
+        conn.commit()
+    finally:
+        conn.close()
 
 
 # ─────────────── Core Compression ───────────────
@@ -109,6 +556,11 @@ def compress_video(job):
     filename = job["filename"]
     duration = job.get("duration_sec", 0)
     provider = job["provider"]
+    batch_id = job.get("batch_id")
+    timeline = [(upload_id, "dequeued", datetime.utcnow())]
+    job_started = time.time()
+    # Rough until the encode is planned: the download alone can take minutes
+    heartbeat(busy_until=job_started + duration * (_sec_per_media_sec or DEFAULT_SEC_PER_MEDIA_SEC), force=True)
 
     # fetch email
     email = job.get("email", "")
@@ -143,85 +595,109 @@ def compress_video(job):
     except:
         pass
 
-    # bitrate logic
-    target_bytes = choose_target(provider)
-    v_kbps, cap = safe_bitrate_calc(duration, target_bytes)
-
     input_key = f"uploads/{upload_id}.mp4"
-    output_key = f"outputs/{upload_id}_compressed.mp4"
-
     input_path = WORK_DIR / f"{upload_id}_input.mp4"
-    output_path = WORK_DIR / f"{upload_id}_output.mp4"
-
-    print(f"🎞 Starting compression @ {v_kbps} kbps cap {cap}px (limit={target_bytes})")
+    targets = []
 
     try:
-        s3.download_file(UPLOAD_BUCKET, input_key, str(input_path))
-
-        vf = f"scale='min({cap},iw)':'-2'"
-
-        cmd = [
-            FFMPEG_BIN, "-y",
-            "-i", str(input_path),
-            "-map", "0:v:0",
-            "-map", "0:a:0?",
-            "-vf", vf,
-            "-c:v", "libx264",
-            "-preset", "veryfast",
-            "-pix_fmt", "yuv420p",
-            "-threads", "1",
-            "-b:v", f"{v_kbps}k",
-            "-maxrate", f"{int(v_kbps*1.5)}k",
-            "-bufsize", f"{int(v_kbps*2)}k",
-            "-c:a", "aac", "-b:a", "96k",
-            "-fs", str(target_bytes),
-            "-progress", "pipe:1",
-            "-nostats",
-            "-loglevel", "error",
-            str(output_path),
-        ]
+        download(UPLOAD_BUCKET, input_key, input_path)
+        timeline.append((upload_id, "download_done", datetime.utcnow()))
+
+        # bitrate logic: budget from the real duration, then size/fps from the budget
+        source = probe_video(input_path)
+        duration = source["duration"] or duration
+        source_kbps = int(input_path.stat().st_size * 8 / 1000 / max(duration, 1))
+        targets = plan_targets(upload_id, [provider, *job.get("extra_providers", [])], duration, source)
+        # -progress total_size only counts the first output, so track that target alone
+        target_bytes = targets[0]["target_bytes"]
+        estimate_sec = sum(t["encoder"].estimate_seconds(duration, t["fmt"]) for t in targets)
+        heartbeat(busy_until=time.time() + estimate_sec + DRAIN_UPLOAD_MARGIN_SEC, force=True)
+
+        if not fits_before_deadline(estimate_sec):
+            raise JobDrained("shutdown before encode")
+
+        for t in targets:
+            fmt = t["fmt"]
+            print(
+                f"🎞 {t['provider']}: {t['encoder'].name} @ {t['v_kbps']} kbps → "
+                f"{fmt['width']}x{fmt['height']}@{fmt['fps']:g} ({fmt['bpp']} x264-equivalent bpp, "
+                f"source {source['width']}x{source['height']}@{source['fps']:.2f}, limit={t['target_bytes']})"
+            )
 
-        proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
+        cmd = build_ffmpeg_cmd(input_path, source, targets)
 
+        encode_started = time.time()
         last_update_time = time.time()
         last_pct = 1
-
-        while True:
-            line = proc.stdout.readline()
-            if not line:
-                break
-
-            pct = percent_from_out_time_ms(line, duration)
+        parser = ProgressParser()
+        warned_overshoot = False
+
+        def on_progress(line: str):
+            nonlocal last_pct, last_update_time, warned_overshoot
+            block = parser.feed(line)
+            if block is None:
+                return
+            record = progress_record(block, duration, target_bytes, time.time() - encode_started)
+            pct = record["percent"]
+
+            if record["eta_sec"] is not None:
+                heartbeat(busy_until=time.time() + record["eta_sec"] + DRAIN_UPLOAD_MARGIN_SEC)
+
+            if shutdown_requested.is_set() and pct > 0:
+                if not fits_before_deadline(record["eta_sec"]):
+                    raise JobDrained(f"shutdown during encode at {pct:.0f}%", pct)
+
+            if record["overshoot"] and not warned_overshoot:
+                warned_overshoot = True
+                print(
+                    f"⚠️ Job {upload_id} projected at {record['projected_bytes']} bytes, "
+                    f"over the {target_bytes} byte target"
+                )
 
             # Update if %
             if pct >= last_pct + 1 or (time.time() - last_update_time) >= 2:
                 last_pct = pct
                 last_update_time = time.time()
 
-                print(f"Progress: {pct:.2f}%")
+                print(f"Progress: {pct:.2f}% speed={record['speed']}x eta={record['eta_sec']}s")
 
                 try:
                     conn = get_db_conn()
                     with conn.cursor() as cur:
                         cur.execute(
-                            "UPDATE jobs SET progress=%s WHERE upload_id=%s",
-                            (pct, upload_id),
+                            "UPDATE jobs SET progress=%s, progress_detail=%s WHERE upload_id=%s",
+                            (pct, json.dumps(record), upload_id),
                         )
                         conn.commit()
                     conn.close()
                 except:
                     pass
 
-        proc.wait()
-
-        # upload final file
-        s3.upload_file(str(output_path), OUTPUT_BUCKET, output_key)
-
-        download_url = s3.generate_presigned_url(
-            "get_object",
-            Params={"Bucket": OUTPUT_BUCKET, "Key": output_key},
-            ExpiresIn=86400,
+        supervise_ffmpeg(
+            cmd,
+            on_line=on_progress,
+            wall_budget_sec=wall_budget(duration, estimate_sec),
         )
+        timeline.append((upload_id, "encode_done", datetime.utcnow()))
+        save_encode_outcomes(encode_outcome_rows(upload_id, duration, source, source_kbps, targets))
+
+        # upload final files
+        links = {}
+        for t in targets:
+            upload(t["path"], OUTPUT_BUCKET, t["key"])
+            links[t["provider"]] = get_s3().generate_presigned_url(
+                "get_object",
+                Params={"Bucket": OUTPUT_BUCKET, "Key": t["key"]},
+                ExpiresIn=86400,
+            )
+        timeline.append((upload_id, "upload_done", datetime.utcnow()))
+
+        primary, extras = targets[0], targets[1:]
+        download_url = links[primary["provider"]]
+        if extras:
+            save_job_outputs(upload_id, [
+                (t["provider"], t["key"], links[t["provider"]], t["path"].stat().st_size) for t in extras
+            ])
 
         # final update
         conn = get_db_conn()
@@ -229,22 +705,34 @@ def compress_video(job):
             cur.execute(
                 """
                 UPDATE jobs SET status='done', progress=100,
-                output_path=%s, output_url=%s, completed_at=NOW()
+                output_path=%s, output_url=%s, output_size_bytes=%s, completed_at=NOW()
                 WHERE upload_id=%s
                 """,
-                (output_key, download_url, upload_id),
+                (primary["key"], download_url, primary["path"].stat().st_size, upload_id),
             )
             conn.commit()
         conn.close()
 
         print("✅ Finished job")
+        record_service_time(time.time() - job_started, duration)
+        heartbeat(force=True)
 
-        if "@" in email:
+        # batch jobs get one summary email once the whole batch is finished
+        if "@" in email and not batch_id:
             try:
-                send_output_email(email, download_url, filename)
+                extra_links = {t["provider"]: links[t["provider"]] for t in extras}
+                if send_output_email(email, download_url, filename, extra_links):
+                    timeline.append((upload_id, "notified", datetime.utcnow()))
             except:
                 pass
 
+    except JobDrained as e:
+        try:
+            requeue_job(job, e.progress, str(e))
+            timeline.append((upload_id, "requeued", datetime.utcnow()))
+        except Exception as requeue_error:
+            print(f"❌ Could not requeue drained job {upload_id}: {requeue_error}")
+
     except Exception as e:
         print(f"❌ Compression Failed: {e}")
 
@@ -263,19 +751,88 @@ def compress_video(job):
     finally:
         try:
             if input_path.exists(): input_path.unlink()
-            if output_path.exists(): output_path.unlink()
+            for t in targets:
+                if t["path"].exists(): t["path"].unlink()
         except:
             pass
 
+        save_timeline(timeline)
+
+        if batch_id:
+            finish_batch_job(batch_id)
+
+
+# ─────────────── Batch Summary ───────────────
+def finish_batch_job(batch_id: str):
+    """Send the batch's single summary email once its last job has finished."""
+    row, items = None, []
+    try:
+        conn = get_db_conn()
+        with conn.cursor() as cur:
+            # Only the worker that finishes the last job wins this UPDATE
+            cur.execute(
+                """
+                UPDATE batches SET status='done', completed_at=NOW(), summary_sent_at=NOW()
+                WHERE id=%s AND summary_sent_at IS NULL
+                AND NOT EXISTS (
+                    SELECT 1 FROM jobs WHERE batch_id=%s AND status NOT IN ('done', 'error')
+                )
+                RETURNING email
+                """,
+                (batch_id, batch_id),
+            )
+            row = cur.fetchone()
+            if row:
+                cur.execute(
+                    """
+                    SELECT upload_id, filename, status, output_url AS download_url
+                    FROM jobs WHERE batch_id=%s ORDER BY created_at, id
+                    """,
+                    (batch_id,),
+                )
+                items = cur.fetchall()
+            conn.commit()
+        conn.close()
+    except Exception as e:
+        print(f"⚠️ Batch summary check failed for {batch_id}: {e}")
+        return
+
+    if row and "@" in (row.get("email") or ""):
+        try:
+            if send_batch_summary_email(row["email"], items):
+                notified_at = datetime.utcnow()
+                save_timeline([(item["upload_id"], "notified", notified_at) for item in items])
+        except Exception as e:
+            print(f"⚠️ Batch summary email failed for {batch_id}: {e}")
+
 
 # ─────────────── SINGLE JOB WORKER ───────────────
 
+def connect_redis():
+    """Ping Redis once at start-up so misconfiguration shows up in the logs."""
+    try:
+        redis_client = get_redis()
+        redis_client.ping()
+        print("✅ Redis connection successful!")
+        return redis_client
+    except Exception as e:
+        print(f"❌ Redis connection failed: {e}")
+        return None
+
+
 def run_worker():
     print("🚀 Worker started (SINGLE-JOB MODE)")
+    signal.signal(signal.SIGTERM, request_shutdown)
+    redis_client = connect_redis()
+    calibrate_encoders(cache=redis_client)
+    refresh_calibration(force=True)
+    heartbeat_thread = start_heartbeat_thread()
 
-    while True:
+    while not shutdown_requested.is_set():
         try:
-            job_data = redis_client.blpop("mailsized_jobs", timeout=3)
+            heartbeat()
+            refresh_calibration()
+            job_data = redis_client.blpop(QUEUE_NAME, timeout=3)
             if not job_data:
                 time.sleep(1)
                 continue
@@ -283,6 +840,12 @@ def run_worker():
             _, payload = job_data
             job = json.loads(payload)
 
+            # Popped while the signal arrived: give it straight back untouched
+            if shutdown_requested.is_set():
+                redis_client.lpush(QUEUE_NAME, payload)
+                print(f"↩️ Returned job {job['upload_id']} to the queue (shutting down)")
+                break
+
             print(f"📥 Picked job {job['upload_id']}")
             compress_video(job)
 
@@ -290,9 +853,16 @@ def run_worker():
             print(f"⚠ Worker loop error: {e}")
             time.sleep(2)
 
+    _heartbeat_stop.set()
+    heartbeat_thread.join(timeout=5)
+    leave_fleet()
+    print("👋 Worker drained, exiting")
+
 
 if __name__ == "__main__":
     try:
         run_worker()
     except KeyboardInterrupt:
         print("🛑 Stopped by user")
+    finally:
+        close_all()